@@ -12,7 +12,7 @@ sys.path.append(os.getcwd())
 
 from database import settings, Base
 # Import models so they are registered with Base.metadata
-from models import User, Strategy, Subscription 
+from models import User, Strategy, Subscription, Signal, SignalOutbox
 # ---------------------------------------
 
 # this is the Alembic Config object, which provides
@@ -0,0 +1,37 @@
+"""strategy version and updated_at for change-driven sync
+
+Revision ID: 3f9c1a7d2b01
+Revises: 
+Create Date: 2026-10-18 10:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3f9c1a7d2b01'
+down_revision: Union[str, None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # 表由 admin 启动时的 create_all 创建；全新数据库上表还不存在，create_all 会直接带上新列
+    inspector = sa.inspect(op.get_bind())
+    if 'strategies' not in inspector.get_table_names():
+        return
+    columns = {column['name'] for column in inspector.get_columns('strategies')}
+    if 'updated_at' not in columns:
+        op.add_column('strategies', sa.Column('updated_at', sa.DateTime(), nullable=True, server_default=sa.func.now()))
+        op.create_index('ix_strategies_updated_at', 'strategies', ['updated_at'])
+    if 'version' not in columns:
+        op.add_column('strategies', sa.Column('version', sa.Integer(), nullable=False, server_default='1'))
+
+
+def downgrade() -> None:
+    op.drop_index('ix_strategies_updated_at', table_name='strategies')
+    op.drop_column('strategies', 'version')
+    op.drop_column('strategies', 'updated_at')
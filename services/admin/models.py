@@ -1,6 +1,8 @@
-from sqlalchemy import Column, Integer, String, Boolean, ForeignKey, Float, DateTime, Text
+from sqlalchemy import Column, Integer, String, Boolean, ForeignKey, Float, DateTime, Text, Index
+from sqlalchemy import event, text
 from sqlalchemy.orm import relationship
 from database import Base
+import json
 from datetime import datetime
 from pytz import timezone
 
@@ -33,6 +35,10 @@ class Strategy(Base):
     config_json = Column(Text, default="{}") # Store strategy parameters as JSON string
     is_active = Column(Boolean, default=True)
     created_at = Column(DateTime, default=lambda: datetime.now(CN_TZ).replace(tzinfo=None))
+    updated_at = Column(DateTime, default=lambda: datetime.now(CN_TZ).replace(tzinfo=None), onupdate=lambda: datetime.now(CN_TZ).replace(tzinfo=None), index=True)
+    version = Column(Integer, nullable=False, default=1)  # 每次更新自动 +1，引擎据此判断配置是否变化
+
+    __mapper_args__ = {"version_id_col": version}
 
     def __str__(self):
         return self.name
@@ -74,3 +80,34 @@ class Signal(Base):
     reason = Column(String, nullable=True) # e.g., "RSI < 30"
     
     strategy = relationship("Strategy")
+
+class SignalOutbox(Base):
+    """信号发件箱：与 Signal 在同一事务中写入，由引擎的 OutboxRelay 批量转发到 Redis Stream"""
+    __tablename__ = "signal_outbox"
+
+    id = Column(Integer, primary_key=True)
+    signal_id = Column(Integer, ForeignKey("signals.id"))
+    idempotency_key = Column(String(64), unique=True, nullable=False)  # 消费端按此去重（至少一次投递）
+    payload = Column(Text, nullable=False)  # JSON 消息体
+    created_at = Column(DateTime, default=lambda: datetime.now(CN_TZ).replace(tzinfo=None))
+    published_at = Column(DateTime, nullable=True)  # 为空表示尚未转发
+
+    __table_args__ = (
+        # 只索引未转发的行，中继每次只扫描这一小部分
+        Index("ix_signal_outbox_unpublished", "id", postgresql_where=published_at.is_(None), sqlite_where=published_at.is_(None)),
+    )
+
+# ==================== 策略变更通知 ====================
+# 策略的增删改在同一事务中发送 NOTIFY（提交后才送达），策略引擎 LISTEN 该频道只拉取变化的行
+STRATEGY_CHANGES_CHANNEL = "strategy_changes"
+
+def _notify_strategy_change(op):
+    def listener(mapper, connection, target):
+        if connection.dialect.name != "postgresql":
+            return
+        payload = json.dumps({"id": target.id, "op": op, "version": target.version})
+        connection.execute(text("SELECT pg_notify(:channel, :payload)"), {"channel": STRATEGY_CHANGES_CHANNEL, "payload": payload})
+    return listener
+
+for _op in ("insert", "update", "delete"):
+    event.listen(Strategy, f"after_{_op}", _notify_strategy_change(_op))
@@ -4,6 +4,11 @@ class Settings(BaseSettings):
     BOT_TOKEN: str
     ADMIN_API_URL: str
     REDIS_URL: str
+    SIGNAL_STREAM: str = "strategy_signals_stream"  # 引擎发件箱中继写入的信号 Stream
+    SIGNAL_CONSUMER_GROUP: str = "bot"  # 消费组名，多个 bot 副本共享同一消费组
+    SIGNAL_CONSUMER_NAME: str = "bot-1"  # 组内消费者名，重新部署后保持不变才能接着处理自己未确认的消息；多副本时每个副本各用一个固定名字
+    SIGNAL_CLAIM_IDLE_MS: int = 60000  # 组内其他消费者读取后超过此时间仍未确认的消息由本消费者认领（例如已下线的旧副本）
+    SIGNAL_CLAIM_INTERVAL: int = 30  # 检查可认领消息的间隔（秒）
 
     class Config:
         env_file = ".env"
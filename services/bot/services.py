@@ -3,39 +3,106 @@ import logging
 import json
 import asyncio
 import redis.asyncio as redis
+from redis.exceptions import ResponseError
 from config import settings
 from aiogram import Bot
 
 logger = logging.getLogger(__name__)
 
 class SignalListener:
+    """
+    通过 Redis Stream 消费组接收信号（由引擎的发件箱中继写入）。
+    消费组记录已确认的位置，重启后从上次位置继续，并先重新处理自己未确认的消息；
+    消费者名来自配置而不是主机名，重新部署的容器沿用同一个名字。其他消费者（例如改名或缩容后不再运行的副本）
+    读取后长时间未确认的消息，定期用 XAUTOCLAIM 认领过来处理，部署期间不丢信号。
+    投递是至少一次，按 idempotency_key 去重，避免同一信号重复推送给用户。
+    """
+
     def __init__(self, bot: Bot):
         self.bot = bot
         self.redis = None
-        self.pubsub = None
+        self.consumer = settings.SIGNAL_CONSUMER_NAME
 
     async def start(self):
-        """Start listening to Redis channels"""
+        """Start consuming the signal stream"""
         try:
             self.redis = redis.from_url(settings.REDIS_URL)
-            self.pubsub = self.redis.pubsub()
-            await self.pubsub.subscribe('strategy_signals')
-            logger.info("Subscribed to Redis channel: strategy_signals")
+            try:
+                # 消费组首次创建时从最新位置开始，之后由 Redis 记录每个消费组的进度
+                await self.redis.xgroup_create(settings.SIGNAL_STREAM, settings.SIGNAL_CONSUMER_GROUP, id='$', mkstream=True)
+                logger.info(f"Created consumer group {settings.SIGNAL_CONSUMER_GROUP} on stream {settings.SIGNAL_STREAM}")
+            except ResponseError as e:
+                if 'BUSYGROUP' not in str(e):
+                    raise
+            logger.info(f"Consuming Redis stream: {settings.SIGNAL_STREAM} as {settings.SIGNAL_CONSUMER_GROUP}/{self.consumer}")
 
             # Start the listening loop
             asyncio.create_task(self._listen_loop())
         except Exception as e:
             logger.error(f"Failed to connect to Redis: {e}")
 
+    async def _claim_idle(self):
+        """认领组内闲置超过 SIGNAL_CLAIM_IDLE_MS 的待确认消息并处理，返回认领的条数"""
+        claimed = 0
+        start_id = '0-0'
+        while True:
+            next_id, entries = (await self.redis.xautoclaim(
+                settings.SIGNAL_STREAM, settings.SIGNAL_CONSUMER_GROUP, self.consumer,
+                settings.SIGNAL_CLAIM_IDLE_MS, start_id=start_id, count=50
+            ))[:2]
+            for message_id, fields in entries:
+                # Redis 6.2 中已被 MAXLEN 裁剪掉的消息返回空项（7.0 起直接从待确认列表中删除）
+                if message_id is None:
+                    continue
+                claimed += 1
+                await self._process_entry(message_id, fields)
+            if next_id in (b'0-0', '0-0'):
+                break
+            start_id = next_id
+        if claimed:
+            logger.info(f"Claimed {claimed} idle signals from other consumers of {settings.SIGNAL_CONSUMER_GROUP}")
+        return claimed
+
     async def _listen_loop(self):
-        """Infinite loop to process messages"""
-        try:
-            async for message in self.pubsub.listen():
-                if message['type'] == 'message':
-                    await self._handle_message(message['data'])
-        except Exception as e:
-            logger.error(f"Error in Redis listener loop: {e}")
-            # Reconnect logic could go here
+        """
+        Infinite loop to process messages; 先处理重启前未确认的消息（ID 0），再读取新消息（>），
+        每 SIGNAL_CLAIM_INTERVAL 秒认领一次其他消费者闲置的消息。
+        """
+        last_id = '0'
+        loop = asyncio.get_running_loop()
+        next_claim = loop.time()
+        while True:
+            try:
+                if loop.time() >= next_claim:
+                    next_claim = loop.time() + settings.SIGNAL_CLAIM_INTERVAL
+                    await self._claim_idle()
+                response = await self.redis.xreadgroup(
+                    settings.SIGNAL_CONSUMER_GROUP, self.consumer,
+                    {settings.SIGNAL_STREAM: last_id}, count=50, block=5000
+                )
+                entries = response[0][1] if response else []
+                if last_id == '0' and not entries:
+                    last_id = '>'
+                    continue
+                for message_id, fields in entries:
+                    await self._process_entry(message_id, fields)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Error in Redis stream listener loop: {e}")
+                await asyncio.sleep(5)
+
+    async def _process_entry(self, message_id, fields):
+        """按幂等键去重后处理并确认一条消息"""
+        key = fields.get(b'key', b'').decode()
+        dedup_key = f"signal_delivered:{key}"
+        if key and await self.redis.exists(dedup_key):
+            logger.info(f"Skipping already delivered signal {key}")
+        else:
+            await self._handle_message(fields[b'data'])
+            if key:
+                await self.redis.set(dedup_key, 1, ex=7 * 24 * 3600)
+        await self.redis.xack(settings.SIGNAL_STREAM, settings.SIGNAL_CONSUMER_GROUP, message_id)
 
     async def _handle_message(self, data):
         """Process a signal message"""
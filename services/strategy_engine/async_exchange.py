@@ -0,0 +1,175 @@
+import asyncio
+import time
+import logging
+import ccxt.async_support as ccxt_async
+import ccxt.pro as ccxt_pro
+from config import settings
+from exchange import EXCHANGE_DEFAULT_TYPES, build_exchange_config
+from candle_store import CandleStore
+from market_cache import MarketMetadataCache
+from history_store import open_history_store
+from rate_limiter import create_rate_limiter, endpoint_weight, retry_after_seconds
+from market_source import ExchangeStreamSource, ReplaySource
+from metrics import exchange_request_seconds
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncCandleStore(CandleStore):
+    """CandleStore 的 asyncio 版本：同一市场的并发请求通过 asyncio.Lock 合并为一次增量拉取"""
+
+    def __init__(self, exchange_manager, capacity: int = 500, history=None):
+        super().__init__(exchange_manager, capacity, history)
+        self._async_locks = {}  # {(exchange, symbol, timeframe): asyncio.Lock}
+
+    async def get_window(self, symbol: str, timeframe: str = '1h', limit: int = 100, exchange_name: str = 'binance'):
+        """返回最近 limit 根 K 线（只读 Candles）"""
+        lock = self._async_locks.setdefault((exchange_name, symbol, timeframe), asyncio.Lock())
+        async with lock:
+            buf = self._get_buffer(exchange_name, symbol, timeframe, limit)
+            fetch_limit, since = self._plan_sync(buf, timeframe)
+            rows = await self.exchange_manager.get_ohlcv(
+                symbol, timeframe, limit=fetch_limit, since=since, exchange_name=exchange_name
+            )
+            if not self._apply_sync(buf, rows, since, (exchange_name, symbol, timeframe)) and len(buf) == 0:
+                return None
+            return buf.window(limit)
+
+    def push(self, exchange_name: str, symbol: str, timeframe: str, rows):
+        """推送模式：把数据源推来的 K 线直接合并进缓冲区（不访问交易所）"""
+        buf = self._get_buffer(exchange_name, symbol, timeframe, self.capacity)
+        buf.merge(rows)
+        self._persist_closed((exchange_name, symbol, timeframe), buf)
+
+    def get_buffered_window(self, exchange_name: str, symbol: str, timeframe: str, limit: int):
+        """推送模式：只读取缓冲区中已有的 K 线，不触发拉取"""
+        buf = self._get_buffer(exchange_name, symbol, timeframe, limit)
+        return buf.window(limit)
+
+    async def get_ohlcv(self, symbol: str, timeframe: str = '1h', limit: int = 100, exchange_name: str = 'binance'):
+        window = await self.get_window(symbol, timeframe, limit, exchange_name)
+        return window.to_numpy().tolist() if window is not None else None
+
+
+class AsyncExchangeManager:
+    """
+    基于 ccxt.async_support 的交易所管理器：
+    每个交易所一个异步客户端（共享一个 HTTP 会话），并用信号量限制每个交易所的并发请求数。
+    rate_limiter 传入同步 ExchangeManager 的限流器时，两者（包括走同步管理器的历史补数）共用同一份权重预算。
+    """
+
+    def __init__(self, max_concurrency: int = 20, rate_limiter=None):
+        self.exchanges = {}  # {exchange_name: async exchange_instance}
+        self.max_concurrency = max_concurrency
+        self._semaphores = {}  # {exchange_name: asyncio.Semaphore}
+        self.stream_exchanges = {}  # {exchange_name: ccxt.pro 实例}，推送模式下按需创建
+        self.history_store = open_history_store(settings.HISTORY_STORE_DIR) if settings.HISTORY_STORE_DIR else None
+        self.candle_store = AsyncCandleStore(self, capacity=settings.CANDLE_BUFFER_SIZE, history=self.history_store)
+        self.market_cache = MarketMetadataCache(settings.MARKET_CACHE_DIR, settings.MARKET_CACHE_TTL)
+        self._refresh_tasks = []
+        self.rate_limiter = rate_limiter if rate_limiter is not None else create_rate_limiter()
+
+    async def _init_exchange(self, exchange_name: str):
+        started = time.monotonic()
+        config, has_credentials = build_exchange_config(exchange_name)
+        exch = getattr(ccxt_async, exchange_name)(config)
+        cached = self.market_cache.load(exchange_name)
+        try:
+            if cached:
+                self.market_cache.apply(exch, cached)
+            else:
+                await exch.load_markets()
+                self.market_cache.save(exchange_name, exch)
+        except Exception as e:
+            logger.error(f"❌ Failed to connect to {exchange_name} (async): {e}", exc_info=True)
+            await exch.close()
+            return
+        self.exchanges[exchange_name] = exch
+        self._semaphores[exchange_name] = asyncio.Semaphore(self.max_concurrency)
+        source = 'cached markets' if cached else 'fresh markets'
+        logger.info(f"✅ Successfully connected to {exchange_name} (async, {'authenticated' if has_credentials else 'public mode'}, {source}, {time.monotonic() - started:.2f}s)")
+        if cached and cached['stale']:
+            self._refresh_tasks.append(asyncio.create_task(self._refresh_markets(exchange_name, exch)))
+
+    async def _refresh_markets(self, exchange_name: str, exch):
+        """后台重新加载过期的市场元数据并写回缓存"""
+        try:
+            await exch.load_markets(reload=True)
+            self.market_cache.save(exchange_name, exch)
+            logger.info(f"🔄 Refreshed market metadata for {exchange_name}")
+        except Exception as e:
+            logger.warning(f"Background market refresh failed for {exchange_name}: {e}")
+
+    async def init(self):
+        """并发初始化所有交易所"""
+        await asyncio.gather(*(self._init_exchange(name) for name in EXCHANGE_DEFAULT_TYPES))
+        if not self.exchanges:
+            logger.critical("❌❌❌ CRITICAL: No exchanges initialized! Check logs above for errors.")
+        else:
+            logger.info(f"📊 Initialized async exchanges: {list(self.exchanges.keys())}")
+
+    def get_exchange(self, exchange_name: str = 'binance'):
+        """获取指定交易所实例"""
+        return self.exchanges.get(exchange_name)
+
+    async def _call(self, exchange_name: str, method: str, *args, **kwargs):
+        exch = self.get_exchange(exchange_name)
+        if not exch:
+            logger.warning(f"Exchange {exchange_name} not available")
+            return None
+        await self.rate_limiter.acquire_async(exchange_name, endpoint_weight(exchange_name, method, kwargs.get('limit')))
+        async with self._semaphores[exchange_name]:
+            started = time.perf_counter()
+            try:
+                return await getattr(exch, method)(*args, **kwargs)
+            except ccxt_async.DDoSProtection:
+                self.rate_limiter.penalize(exchange_name, retry_after_seconds(exch.last_response_headers))
+                raise
+            finally:
+                exchange_request_seconds(exchange_name, method).observe(time.perf_counter() - started)
+                self.rate_limiter.observe(exchange_name, exch.last_response_headers)
+
+    async def get_ohlcv(self, symbol: str, timeframe: str = '1h', limit: int = 100, exchange_name: str = 'binance', since: int = None):
+        """从指定交易所获取K线数据（since 为毫秒时间戳，用于增量拉取）"""
+        try:
+            return await self._call(exchange_name, 'fetch_ohlcv', symbol, timeframe, since=since, limit=limit)
+        except Exception as e:
+            logger.error(f"Error fetching OHLCV {symbol} from {exchange_name}: {e}")
+            return None
+
+    async def get_server_time(self, exchange_name: str = 'binance'):
+        """获取交易所服务器时间（毫秒）"""
+        try:
+            return await self._call(exchange_name, 'fetch_time')
+        except Exception as e:
+            logger.error(f"Error fetching server time from {exchange_name}: {e}")
+            return None
+
+    def get_stream_exchange(self, exchange_name: str = 'binance'):
+        """获取（按需创建）websocket 推送客户端"""
+        exch = self.stream_exchanges.get(exchange_name)
+        if exch is None and exchange_name in EXCHANGE_DEFAULT_TYPES:
+            config, _ = build_exchange_config(exchange_name)
+            exch = self.stream_exchanges[exchange_name] = getattr(ccxt_pro, exchange_name)(config)
+        return exch
+
+    def create_market_data_source(self, kind: str, replay_url: str = None):
+        """创建推送式行情数据源：stream（交易所 websocket）或 replay（本地回放服务）"""
+        if kind == 'replay':
+            return ReplaySource(replay_url)
+        if kind == 'stream':
+            return ExchangeStreamSource(self)
+        raise ValueError(f"Unknown market data source: {kind}")
+
+    def list_exchanges(self):
+        """列出所有已连接的交易所"""
+        return list(self.exchanges.keys())
+
+    async def close(self):
+        """关闭所有异步客户端的 HTTP 会话"""
+        for task in self._refresh_tasks:
+            task.cancel()
+        clients = list(self.exchanges.values()) + list(self.stream_exchanges.values())
+        await asyncio.gather(*(exch.close() for exch in clients), return_exceptions=True)
+        self.exchanges.clear()
+        self.stream_exchanges.clear()
@@ -0,0 +1,115 @@
+import time
+import logging
+import threading
+from candle_store import timeframe_to_ms
+
+logger = logging.getLogger(__name__)
+
+# 超过 1 天的周期（周线、月线）开盘时间不按固定间隔对齐，不做缺口检测
+MAX_BACKFILL_TIMEFRAME_MS = 86400 * 1000
+
+
+class HistoryBackfill:
+    """
+    本地历史的缺口检测与补数：
+    定期扫描引擎正在使用的每个市场最近 lookback_days 天的历史，找出既没有数据、也没有核实过的区间，
+    用 fetch_ohlcv(since=...) 分页补齐（请求经过 ExchangeManager，与实时行情共用限流预算；
+    异步模式下 AsyncExchangeManager 与同步管理器共用同一个 RateLimiter），
+    每页返回后把 [since, 本页最后一根] 标记为已核实——其中仍缺的 K 线是交易所本身没有的，不再反复补拉。
+    每轮最多请求 max_pages 页，避免补数挤占实时行情的请求额度。
+    """
+
+    def __init__(self, exchange_manager, history_store, markets_fn, interval: float = 300.0,
+                 lookback_days: int = 30, page_limit: int = 1000, max_pages: int = 20):
+        self.exchange_manager = exchange_manager
+        self.history_store = history_store
+        self.markets_fn = markets_fn  # 返回需要补数的 [(exchange, symbol, timeframe)]
+        self.interval = interval
+        self.lookback_days = lookback_days
+        self.page_limit = page_limit
+        self.max_pages = max_pages
+        self._stop = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+        self.stats = {'rounds': 0, 'pages': 0, 'candles': 0, 'fetch_errors': 0, 'open_gaps': 0}
+
+    def start(self):
+        if self._thread is None and self.history_store is not None:
+            self._thread = threading.Thread(target=self._run, name='history-backfill', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.run_once()
+            except Exception as e:
+                logger.error(f"History backfill round failed: {e}", exc_info=True)
+            self._stop.wait(self.interval)
+
+    def run_once(self, now_ms: int = None):
+        """补一轮，返回本轮请求的页数"""
+        now_ms = int(time.time() * 1000) if now_ms is None else now_ms
+        pages = 0
+        open_gaps = 0
+        for market in sorted(set(self.markets_fn())):
+            tf_ms = timeframe_to_ms(market[2])
+            if tf_ms > MAX_BACKFILL_TIMEFRAME_MS:
+                continue
+            last_closed = now_ms // tf_ms * tf_ms - tf_ms
+            start = last_closed - self.lookback_days * 86400 * 1000
+            for gap_start, gap_end in self.history_store.gaps(*market, start, last_closed):
+                if pages >= self.max_pages:
+                    open_gaps += 1
+                    continue
+                used, done = self._fill(market, gap_start, gap_end, self.max_pages - pages)
+                pages += used
+                open_gaps += not done
+        with self._lock:
+            self.stats['rounds'] += 1
+            self.stats['pages'] += pages
+            self.stats['open_gaps'] = open_gaps
+        return pages
+
+    def _fill(self, market, gap_start: int, gap_end: int, page_budget: int):
+        """分页补齐 [gap_start, gap_end]，返回 (请求页数, 是否补完)"""
+        exchange_name, symbol, timeframe = market
+        tf_ms = timeframe_to_ms(timeframe)
+        label = ':'.join(market)
+        since = gap_start
+        pages = 0
+        filled = 0
+        while since <= gap_end:
+            if pages >= page_budget:
+                return pages, False
+            rows = self.exchange_manager.get_ohlcv(symbol, timeframe, limit=self.page_limit,
+                                                   exchange_name=exchange_name, since=since)
+            pages += 1
+            if rows is None:
+                with self._lock:
+                    self.stats['fetch_errors'] += 1
+                logger.warning(f"Backfill of {label} from {since} failed, will retry next round")
+                return pages, False
+            rows = [row for row in rows if row[0] >= since]
+            if not rows:
+                # 交易所在 since 之后没有数据（例如尚未上线），整个缺口标记为已核实
+                self.history_store.mark_verified(*market, since, gap_end)
+                break
+            candles = [row for row in rows if row[0] <= gap_end]
+            if candles:
+                self.history_store.append(*market, candles)
+                filled += len(candles)
+                with self._lock:
+                    self.stats['candles'] += len(candles)
+            page_end = min(int(rows[-1][0]), gap_end)
+            self.history_store.mark_verified(*market, since, page_end)
+            since = page_end + tf_ms
+        if filled:
+            logger.info(f"🩹 Backfilled {filled} candles of {label} in {pages} pages")
+        return pages, True
+
+    def get_stats(self):
+        with self._lock:
+            return dict(self.stats)
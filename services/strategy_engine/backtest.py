@@ -0,0 +1,169 @@
+"""
+离线回测：用本地 K 线历史（HistoryStore 目录，或 replay_server.py record 录制的 CSV）重放历史，
+上线前检验策略和参数，不访问网络。
+
+向量化:       python backtest.py candles.csv --type rsi --config '{"rsi_period": 21}'
+对照逐事件:   python backtest.py candles.csv --type btc_5down --check
+本地历史:     python backtest.py history --type rsi --config '{"symbol": "ETH/USDT"}'
+
+tick 模型与推送模式、回放服务一致：每根 K 线收盘时执行一次策略，未完成 K 线取下一根的开盘价。
+向量化路径调用策略的 backtest_signals()；逐事件路径把每个 tick 的窗口交给真实的 on_tick()（注入 IndicatorEngine，
+与线上配置相同），--check 时两者必须产生完全相同的信号；tests/test_backtest.py 在随机行情上自动做同样的对照。
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+import time
+import numpy as np
+from candles import Candles
+from history_store import HistoryStore
+from indicator_engine import IndicatorEngine
+from replay_server import load_candles
+from strategies.registry import strategy_registry
+
+logger = logging.getLogger('backtest')
+
+
+def forming_candle(ohlcv, t: int, price: float):
+    """tick t 时正在形成的 K 线：刚开盘，当前价为 price"""
+    open_price = ohlcv[t, 1]
+    return [ohlcv[t, 0], open_price, max(open_price, price), min(open_price, price), price, 0.0]
+
+
+def create_strategy(strategy_type: str, config: dict, signal_callback=None):
+    strategy_class, config = strategy_registry.resolve(f"backtest:{strategy_type}", dict(config, type=strategy_type))
+    strategy = strategy_class(
+        strategy_id=0,
+        name=f"backtest:{strategy_type}",
+        config=config,
+        exchange=None,
+        signal_callback=signal_callback or (lambda signal_data: None)
+    )
+    requirements = strategy.get_data_requirements()
+    if len(requirements) != 1:
+        raise ValueError(f"Backtest supports single-market strategies, {strategy_class.__name__} needs {len(requirements)} markets")
+    return strategy, requirements[0]
+
+
+def run_vectorized(strategy_type: str, config: dict, ohlcv, prices):
+    """向量化回测，返回 [(t, side, price, reason)]"""
+    strategy, _ = create_strategy(strategy_type, config)
+    return strategy.backtest_signals(ohlcv, prices)
+
+
+def run_events(strategy_type: str, config: dict, ohlcv, prices):
+    """逐事件回测（参考实现）：每个 tick 构造只读 Candles 窗口并调用 on_tick，返回 [(t, side, price, reason)]"""
+    signals = []
+    tick = [None]
+    strategy, req = create_strategy(
+        strategy_type, config,
+        lambda signal_data: signals.append((tick[0], signal_data['side'], signal_data['price'], signal_data['reason']))
+    )
+    strategy.indicator_engine = IndicatorEngine()
+    strategy.start()
+    for t in range(req.lookback - 1, len(ohlcv)):
+        window = ohlcv[t - req.lookback + 1:t + 1].copy()
+        window[-1] = forming_candle(ohlcv, t, prices[t])
+        tick[0] = t
+        strategy.on_tick({req.market: Candles.from_rows(window)})
+    strategy.stop()
+    return signals
+
+
+def evaluate(signals, prices, horizon: int):
+    """按信号方向持有 horizon 个 tick 的收益（用 tick 时的当前价进出），不计手续费"""
+    returns = []
+    for t, side, price, _ in signals:
+        if t + horizon < len(prices):
+            ret = prices[t + horizon] / price - 1
+            returns.append(ret if side == "BUY" else -ret)
+    returns = np.asarray(returns)
+    return {
+        'signals': len(signals),
+        'buys': sum(1 for s in signals if s[1] == "BUY"),
+        'sells': sum(1 for s in signals if s[1] == "SELL"),
+        'evaluated': len(returns),
+        'win_rate': round(float((returns > 0).mean()), 4) if len(returns) else None,
+        'avg_return': round(float(returns.mean()), 6) if len(returns) else None,
+    }
+
+
+def first_mismatch(expected, actual):
+    """两组信号第一处不同的位置，完全相同时返回 None"""
+    for i, (a, b) in enumerate(zip(expected, actual)):
+        if a != b:
+            return i
+    return None if len(expected) == len(actual) else min(len(expected), len(actual))
+
+
+def load_market(path: str, market):
+    """读取单个市场的全部 K 线：path 为目录时从 HistoryStore 读取（内存映射），否则读取录制的 CSV"""
+    if os.path.isdir(path):
+        store = HistoryStore(path)
+        ohlcv = store.read(*market)
+        if not len(ohlcv):
+            raise ValueError(f"{':'.join(market)} not found in history store {path}")
+        gaps = store.gaps(*market, int(ohlcv[0, 0]), int(ohlcv[-1, 0]))
+        if gaps:
+            logger.warning(f"⚠️ {':'.join(market)} has {len(gaps)} unverified gaps in history, e.g. {gaps[0]}; results may be distorted")
+        return ohlcv
+    markets = load_candles(path)
+    if market not in markets:
+        raise ValueError(f"{':'.join(market)} not found in {path}, available: {[':'.join(m) for m in markets]}")
+    return np.asarray(markets[market], dtype=np.float64)
+
+
+def backtest(path: str, strategy_type: str, config: dict, check: bool = False, horizon: int = 24):
+    _, req = create_strategy(strategy_type, config)
+    ohlcv = load_market(path, req.market)
+    ohlcv = ohlcv[np.unique(ohlcv[:, 0], return_index=True)[1]]  # 按时间排序并去掉重复 K 线
+    prices = ohlcv[:, 1].copy()  # tick t 时的当前价 = K 线 t 的开盘价
+
+    started = time.perf_counter()
+    signals = run_vectorized(strategy_type, config, ohlcv, prices)
+    result = {
+        'market': ':'.join(req.market),
+        'candles': len(ohlcv),
+        'vectorized_ms': round((time.perf_counter() - started) * 1000, 2),
+        **evaluate(signals, prices, horizon),
+    }
+
+    if check:
+        started = time.perf_counter()
+        reference = run_events(strategy_type, config, ohlcv, prices)
+        result['event_ms'] = round((time.perf_counter() - started) * 1000, 2)
+        mismatch = first_mismatch(reference, signals)
+        result['match'] = mismatch is None
+        if mismatch is not None:
+            logger.error(
+                f"❌ Signal mismatch at #{mismatch}: event={reference[mismatch] if mismatch < len(reference) else None} "
+                f"vectorized={signals[mismatch] if mismatch < len(signals) else None}"
+            )
+    return result, signals
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline strategy backtest on recorded candles")
+    parser.add_argument('file', help='history store directory, or CSV recorded by replay_server.py record')
+    parser.add_argument('--type', required=True, help='strategy type, e.g. rsi, btc_5down')
+    parser.add_argument('--config', default='{}', help='strategy config_json')
+    parser.add_argument('--check', action='store_true', help='also run the event-by-event reference and compare signals')
+    parser.add_argument('--horizon', type=int, default=24, help='ticks to hold each signal when evaluating returns')
+    parser.add_argument('--signals', action='store_true', help='print every signal')
+    args = parser.parse_args()
+
+    # 策略每个 tick 都打 INFO 日志，回测时只保留警告和错误
+    logging.getLogger('strategies').setLevel(logging.WARNING)
+    result, signals = backtest(args.file, args.type, json.loads(args.config), args.check, args.horizon)
+    if args.signals:
+        for t, side, price, reason in signals:
+            print(f"{t}\t{side}\t{price}\t{reason}")
+    print(json.dumps(result, ensure_ascii=False, indent=2))
+    if args.check and not result['match']:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
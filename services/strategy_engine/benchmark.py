@@ -0,0 +1,317 @@
+"""
+引擎吞吐基准：用确定性的假交易所和模拟时钟驱动真实的主循环逻辑——CandleScheduler 按 K 线收盘唤醒，
+main.run_round 挑选到期策略、经 TickPlanner 拉取、在 StrategyWorkerPool 中执行 run_tick——
+逐级增加策略数量，输出 ticks/s、每个策略 tick 的延迟 p50/p99（从收盘唤醒到该策略执行完毕）、
+每轮拉取次数、CPU 与 RSS，结果写成 JSON 便于比较不同版本。
+
+合成行情:    python benchmark.py --scales 10,100,1000,10000 --rounds 30 --output bench.json
+录制行情:    python benchmark.py --data candles.csv --latency 0.05 --error-rate 0.02
+
+调度器在模拟时钟上"睡眠"时直接把时钟推进到下一次收盘 + settle_delay，远快于真实时间；
+交易所延迟（--latency）是真实的 sleep，用来模拟网络等待对线程池的占用。
+"""
+import os
+
+# 基准不连接数据库、不落盘历史，只复用主循环的组件
+os.environ.setdefault('DATABASE_URL', 'sqlite://')
+os.environ.setdefault('HISTORY_STORE_DIR', '')
+
+import argparse
+import json
+import logging
+import random
+import resource
+import subprocess
+import sys
+import threading
+import time
+import numpy as np
+from candle_store import CandleStore, timeframe_to_ms
+from indicator_engine import IndicatorEngine
+from scheduler import CandleScheduler
+from tick_planner import TickPlanner
+from worker_pool import StrategyWorkerPool
+from strategies.registry import strategy_registry
+from cache_manager import CacheManager
+from main import get_active_markets, run_round, run_tick
+
+logger = logging.getLogger('benchmark')
+
+TIMEFRAMES = ['1m', '5m', '15m', '1h']
+
+
+class SimulatedClock:
+    """可手动推进的时钟，time() 与 time.time() 一样返回秒"""
+
+    def __init__(self, start_ms: int):
+        self._now = start_ms / 1000
+        self._lock = threading.Lock()
+
+    def time(self):
+        with self._lock:
+            return self._now
+
+    def advance(self, seconds: float):
+        with self._lock:
+            self._now += seconds
+
+
+def synthetic_candles(market, timeframe: str, start: int, end: int):
+    """确定性的合成 K 线：[start, end] 内按周期对齐的每根 K 线，价格只取决于市场和开盘时间"""
+    tf_ms = timeframe_to_ms(timeframe)
+    timestamps = np.arange(-(-start // tf_ms) * tf_ms, end + 1, tf_ms, dtype=np.float64)
+    if not len(timestamps):
+        return []
+    seed = sum(map(ord, ':'.join(market))) % 997
+    i = timestamps / 60000
+    noise = np.modf(np.sin(i * 12.9898 + seed) * 43758.5453)[0]  # [-1, 1) 的伪随机数
+    closes = 100 * np.exp(0.05 * np.sin(i / 700 + seed) + 0.02 * np.sin(i / 90 + 2 * seed) + 0.004 * noise)
+    opens = closes * (1 - 0.002 * np.modf(np.sin(i * 78.233 + seed) * 12543.853)[0])
+    highs = np.maximum(opens, closes) * 1.001
+    lows = np.minimum(opens, closes) * 0.999
+    return np.column_stack([timestamps, opens, highs, lows, closes, np.ones(len(timestamps))]).tolist()
+
+
+class FakeExchangeManager:
+    """
+    与 ExchangeManager 接口相同的假交易所：按模拟时钟返回截至当前的 K 线（最后一根为未完成 K 线），
+    可配置请求延迟与失败率（失败时与真实实现一样返回 None），随机数种子固定，结果可复现。
+    recorded 为 {(exchange, symbol, timeframe): [[ts, o, h, l, c, v], ...]} 时回放录制数据，否则生成合成数据。
+    """
+
+    def __init__(self, clock: SimulatedClock, latency: float = 0.0, error_rate: float = 0.0,
+                 seed: int = 42, recorded: dict = None, capacity: int = 500):
+        self.clock = clock
+        self.latency = latency
+        self.error_rate = error_rate
+        self.recorded = recorded
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self.stats = {'calls': 0, 'errors': 0, 'candles': 0}
+        self.candle_store = CandleStore(self, capacity=capacity, clock=clock.time)
+
+    def get_ohlcv(self, symbol: str, timeframe: str = '1h', limit: int = 100, exchange_name: str = 'binance', since: int = None):
+        with self._lock:
+            self.stats['calls'] += 1
+            failed = self._rng.random() < self.error_rate
+        if self.latency:
+            time.sleep(self.latency)
+        if failed:
+            with self._lock:
+                self.stats['errors'] += 1
+            return None
+
+        market = (exchange_name, symbol, timeframe)
+        tf_ms = timeframe_to_ms(timeframe)
+        now_ms = int(self.clock.time() * 1000)
+        forming_ts = now_ms // tf_ms * tf_ms
+        if self.recorded is not None:
+            rows = [row for row in self.recorded.get(market, []) if row[0] <= forming_ts]
+            rows = rows[-limit:] if since is None else [row for row in rows if row[0] >= since][:limit]
+        else:
+            start = since if since is not None else forming_ts - (limit - 1) * tf_ms
+            rows = synthetic_candles(market, timeframe, start, min(forming_ts, start + (limit - 1) * tf_ms))
+        with self._lock:
+            self.stats['candles'] += len(rows)
+        return rows
+
+    def get_server_time(self, exchange_name: str = 'binance'):
+        return int(self.clock.time() * 1000)
+
+    def get_stats(self):
+        with self._lock:
+            return dict(self.stats)
+
+
+def build_strategies(count: int, markets, exchange):
+    """按 RSI / 5 连阴交替、在 markets 上轮流分配，创建 count 个策略"""
+    strategies = {}
+    signals = [0]
+
+    def on_signal(signal_data):
+        signals[0] += 1
+
+    for i in range(count):
+        exchange_name, symbol, timeframe = markets[i % len(markets)]
+        config = {'exchange': exchange_name, 'symbol': symbol, 'timeframe': timeframe}
+        if i % 2 == 0:
+            config.update(type='rsi', rsi_period=7 + (i // 2) % 22)
+        else:
+            config.update(type='btc_5down')
+        strategy_class, config = strategy_registry.resolve(f"bench-{i}", config)
+        strategy = strategy_class(strategy_id=i, name=f"bench-{i}", config=config, exchange=exchange, signal_callback=on_signal)
+        strategies[i] = {'instance': strategy, 'config_raw': json.dumps(config)}
+    return strategies, signals
+
+
+def _rss_bytes():
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError):
+        return None
+
+
+def _percentile(values, q):
+    return round(float(np.percentile(values, q)) * 1000, 3) if values else None
+
+
+def run_scale(count: int, args, recorded=None):
+    """用 count 个策略跑 args.rounds 轮，返回该规模的统计"""
+    if recorded:
+        markets = sorted(recorded)
+        # 从每个市场都已有一整个缓冲区历史的时间点开始
+        start_ms = max(rows[0][0] + args.buffer * timeframe_to_ms(market[2]) for market, rows in recorded.items())
+    else:
+        markets = [('binance', f"SYM{i}/USDT", TIMEFRAMES[i % len(TIMEFRAMES)]) for i in range(args.symbols)]
+        start_ms = 1_700_000_000_000 // 3600000 * 3600000
+    clock = SimulatedClock(start_ms)
+    exchange = FakeExchangeManager(clock, args.latency, args.error_rate, args.seed, recorded, args.buffer)
+    indicator_engine = IndicatorEngine()
+    planner = TickPlanner(exchange.candle_store, CacheManager(clock=clock.time), indicator_engine, max_workers=args.fetch_workers)
+    pool = StrategyWorkerPool(max_workers=args.workers, soft_timeout=args.hard_timeout, hard_timeout=args.hard_timeout)
+    scheduler = CandleScheduler(exchange, settle_delay=args.settle_delay, clock=clock.time, sleep=clock.advance)
+    running, signals = build_strategies(count, markets, exchange)
+    for s_entry in running.values():
+        s_entry['instance'].indicator_engine = indicator_engine
+        s_entry['instance'].start()
+
+    # 每个策略 tick 的 (从本轮唤醒到执行完毕, on_tick 本身) 耗时，由工作线程追加
+    tick_times = []
+    round_started = [0.0]
+
+    def timed_tick(strategy, market_data):
+        started = time.perf_counter()
+        try:
+            run_tick(strategy, market_data)
+        finally:
+            finished = time.perf_counter()
+            tick_times.append((finished - round_started[0], finished - started))
+
+    def run(due_markets):
+        round_started[0] = time.perf_counter()
+        return run_round(running, due_markets, planner, pool, timed_tick)
+
+    # 首轮：所有策略执行一次，同时完成各市场的整窗拉取（单独统计，不计入稳态）
+    started = time.perf_counter()
+    run(None)
+    seed_ms = round((time.perf_counter() - started) * 1000, 3)
+    tick_times.clear()
+
+    round_latencies, ticks, fetches = [], 0, []
+    simulated_started = clock.time()
+    usage_before = resource.getrusage(resource.RUSAGE_SELF)
+    wall_started = time.perf_counter()
+    for _ in range(args.rounds):
+        # 与主循环相同：睡眠到下一次 K 线收盘 + settle_delay（模拟时钟下立即返回），只执行刚收盘周期的策略
+        due_markets = scheduler.wait(get_active_markets(running), max_wait=args.max_wait)
+        calls_before = exchange.get_stats()['calls']
+        started = time.perf_counter()
+        executed = run(due_markets)
+        if executed:
+            round_latencies.append(time.perf_counter() - started)
+            fetches.append(exchange.get_stats()['calls'] - calls_before)
+            ticks += executed
+    wall = time.perf_counter() - wall_started
+    usage_after = resource.getrusage(resource.RUSAGE_SELF)
+    pool.shutdown()
+
+    rss = _rss_bytes()
+    cpu = (usage_after.ru_utime - usage_before.ru_utime) + (usage_after.ru_stime - usage_before.ru_stime)
+    exchange_stats = exchange.get_stats()
+    tick_latencies = [latency for latency, _ in tick_times]
+    on_tick_times = [duration for _, duration in tick_times]
+    return {
+        'strategies': count,
+        'markets': len(markets),
+        'rounds': len(round_latencies),
+        'ticks': ticks,
+        'ticks_per_sec': round(ticks / wall, 1) if wall else None,
+        'tick_latency_ms': {
+            'p50': _percentile(tick_latencies, 50),
+            'p99': _percentile(tick_latencies, 99),
+            'max': _percentile(tick_latencies, 100),
+        },
+        'on_tick_ms': {
+            'p50': _percentile(on_tick_times, 50),
+            'p99': _percentile(on_tick_times, 99),
+        },
+        'round_latency_ms': {
+            'p50': _percentile(round_latencies, 50),
+            'p99': _percentile(round_latencies, 99),
+        },
+        'seed_round_ms': seed_ms,
+        'fetches_per_round': round(float(np.mean(fetches)), 2) if fetches else 0,
+        'exchange_errors': exchange_stats['errors'],
+        'signals': signals[0],
+        'cpu_seconds': round(cpu, 3),
+        'cpu_percent': round(cpu / wall * 100, 1) if wall else None,
+        'rss_mb': round(rss / 2 ** 20, 1) if rss else None,
+        'max_rss_mb': round(usage_after.ru_maxrss / 1024, 1),
+        'simulated_seconds': round(clock.time() - simulated_started, 3),
+        'wall_seconds': round(wall, 3),
+    }
+
+
+def _git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], stderr=subprocess.DEVNULL, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Strategy engine throughput benchmark with a fake exchange and simulated clock")
+    parser.add_argument('--scales', default='10,100,1000,10000', help='comma separated strategy counts')
+    parser.add_argument('--rounds', type=int, default=30, help='scheduler wake-ups (candle closes) per scale')
+    parser.add_argument('--settle-delay', type=float, default=2.0, help='seconds after a candle close to wake up (SCHEDULER_SETTLE_DELAY)')
+    parser.add_argument('--max-wait', type=float, default=3600.0, help='longest scheduler sleep without a candle close')
+    parser.add_argument('--symbols', type=int, default=100, help='synthetic markets shared by the strategies')
+    parser.add_argument('--data', help='CSV recorded by replay_server.py record, instead of synthetic candles')
+    parser.add_argument('--latency', type=float, default=0.0, help='fake exchange latency per request (seconds)')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='fraction of fake exchange requests that fail')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--workers', type=int, default=10, help='strategy worker threads (ENGINE_WORKERS)')
+    parser.add_argument('--fetch-workers', type=int, default=10, help='market data fetch threads')
+    parser.add_argument('--hard-timeout', type=float, default=600.0, help='per-round hard deadline of the worker pool')
+    parser.add_argument('--buffer', type=int, default=500, help='candle buffer capacity (CANDLE_BUFFER_SIZE)')
+    parser.add_argument('--output', help='write JSON results to this file (default: stdout)')
+    args = parser.parse_args()
+
+    # 策略与 TickPlanner 每轮都打 INFO 日志，基准中只保留警告和错误
+    logging.getLogger().setLevel(logging.WARNING)
+
+    recorded = None
+    if args.data:
+        from replay_server import load_candles
+        recorded = load_candles(args.data)
+
+    results = []
+    for count in [int(n) for n in args.scales.split(',')]:
+        result = run_scale(count, args, recorded)
+        results.append(result)
+        print(
+            f"{count:>6} strategies: {result['ticks_per_sec']} ticks/s, tick latency p50 {result['tick_latency_ms']['p50']}ms, "
+            f"p99 {result['tick_latency_ms']['p99']}ms, {result['fetches_per_round']} fetches/round, "
+            f"CPU {result['cpu_percent']}%, RSS {result['rss_mb']}MB",
+            file=sys.stderr
+        )
+
+    report = {
+        'benchmark': 'strategy_engine_throughput',
+        'created_at': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+        'git_commit': _git_commit(),
+        'python': sys.version.split()[0],
+        'params': {k: v for k, v in vars(args).items() if k != 'output'},
+        'results': results,
+    }
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output)
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
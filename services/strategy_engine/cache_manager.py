@@ -0,0 +1,209 @@
+import sys
+import time
+import heapq
+import itertools
+import logging
+import threading
+from collections import OrderedDict
+import numpy as np
+from candles import Candles, OHLCV_COLUMNS
+from metrics import cache_requests, cache_evictions
+
+logger = logging.getLogger(__name__)
+
+# 每个缓存条目的固定开销估算（键元组、条目对象、OrderedDict 节点与过期堆中的一项）
+ENTRY_OVERHEAD = 200
+
+
+def estimate_size(value, _depth: int = 0) -> int:
+    """
+    估算缓存值占用的字节数：ndarray / Candles 按 nbytes（视图同样按其覆盖的数据计），
+    list / tuple 按首个元素的大小乘以长度（K 线行等同构数据），dict 逐项累加，其他对象用 sys.getsizeof。
+    只用于预算，不追求精确。
+    """
+    if isinstance(value, np.ndarray):
+        return value.nbytes + 112
+    if isinstance(value, Candles):
+        return value.nbytes + 112 * len(OHLCV_COLUMNS)
+    if isinstance(value, (bytes, str)):
+        return sys.getsizeof(value)
+    if _depth < 3:
+        if isinstance(value, (list, tuple)):
+            return sys.getsizeof(value) + (len(value) * estimate_size(value[0], _depth + 1) if value else 0)
+        if isinstance(value, dict):
+            return sys.getsizeof(value) + sum(
+                estimate_size(k, _depth + 1) + estimate_size(v, _depth + 1) for k, v in value.items()
+            )
+    return sys.getsizeof(value)
+
+
+class _Entry:
+    __slots__ = ('value', 'size', 'expires_at')
+
+    def __init__(self, value, size: int, expires_at: float):
+        self.value = value
+        self.size = size
+        self.expires_at = expires_at
+
+
+class _InFlight:
+    """一次正在进行中的缓存加载，后到的调用者在 event 上等待结果"""
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+
+
+class CacheManager:
+    """
+    线程安全的 TTL + LRU 缓存，按字节预算限制总大小：
+    - 条目按 (cache_type, exchange, symbol, timeframe) 索引，每个 cache_type 有自己的 TTL；未登记 TTL 的类型不缓存
+    - 过期：按到期时间维护最小堆，每次访问只弹出已到期的堆顶（惰性删除被覆盖的旧项），均摊 O(1)，不再全量扫描
+    - 容量：总字节数（ndarray 按 nbytes 估算）超过 max_bytes 时按最近最少使用淘汰
+    - get_or_fetch 对同一个键的并发未命中只加载一次，其余线程等待并共享结果
+    """
+
+    def __init__(self, ttls: dict = None, max_bytes: int = 256 * 2 ** 20, clock=time.time):
+        self.clock = clock  # 当前时间（秒），基准测试中替换为模拟时钟
+        self.ttls = dict(ttls) if ttls is not None else {'market_data': 30}  # {cache_type: 秒}
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()  # {key: _Entry}，按最近使用排序（最旧在前）
+        self._expiry = []  # [(expires_at, seq, key)] 最小堆，条目被覆盖或淘汰后留下的旧项在弹出时跳过
+        self._seq = itertools.count()  # 到期时间相同时按写入顺序排列，避免比较键
+        self._bytes = 0
+        self._lock = threading.RLock()
+        self._inflight = {}  # {key: _InFlight}
+        # hits: 直接命中; misses: 实际加载; coalesced: 等待其他线程加载结果
+        # expired / evicted: 因过期 / 超出字节预算删除; rejected: 单个值超过整个预算，不缓存
+        self.stats = {'hits': 0, 'misses': 0, 'coalesced': 0, 'expired': 0, 'evicted': 0, 'rejected': 0}
+
+    @staticmethod
+    def _make_key(cache_type: str, exchange: str, symbol: str, timeframe: str = None):
+        return (cache_type, exchange, symbol, timeframe)
+
+    def _remove(self, key):
+        entry = self._entries.pop(key)
+        self._bytes -= entry.size
+        return entry
+
+    def _expire(self, now: float):
+        """弹出所有已到期的堆顶（调用方持有锁）"""
+        expiry = self._expiry
+        while expiry and expiry[0][0] <= now:
+            expires_at, _, key = heapq.heappop(expiry)
+            entry = self._entries.get(key)
+            if entry is not None and entry.expires_at == expires_at:
+                self._remove(key)
+                self.stats['expired'] += 1
+                cache_evictions(key[0], 'expired').inc()
+        # 同一批键反复覆盖时旧堆项只在到期后才弹出，数量超过条目数的数倍时重建一次
+        if len(expiry) > 4 * len(self._entries) + 1024:
+            self._expiry = [(entry.expires_at, next(self._seq), key) for key, entry in self._entries.items()]
+            heapq.heapify(self._expiry)
+
+    def _evict_lru(self):
+        """淘汰最近最少使用的条目直到回到字节预算内（调用方持有锁）"""
+        while self._bytes > self.max_bytes and self._entries:
+            key, entry = self._entries.popitem(last=False)
+            self._bytes -= entry.size
+            self.stats['evicted'] += 1
+            cache_evictions(key[0], 'lru').inc()
+
+    def get_cache(self, cache_type: str, exchange: str, symbol: str, timeframe: str = None):
+        """获取缓存，不存在或已过期返回 None"""
+        if cache_type not in self.ttls:
+            return None
+        key = self._make_key(cache_type, exchange, symbol, timeframe)
+        with self._lock:
+            now = self.clock()
+            self._expire(now)
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            self._entries.move_to_end(key)
+            return entry.value
+
+    def set_cache(self, cache_type: str, exchange: str, symbol: str, value, timeframe: str = None):
+        """写入缓存（覆盖同键的旧值并重新计时），超出字节预算时淘汰最近最少使用的条目"""
+        ttl = self.ttls.get(cache_type)
+        if ttl is None:
+            return
+        key = self._make_key(cache_type, exchange, symbol, timeframe)
+        size = estimate_size(value) + ENTRY_OVERHEAD
+        with self._lock:
+            now = self.clock()
+            self._expire(now)
+            if key in self._entries:
+                self._remove(key)
+            if size > self.max_bytes:
+                self.stats['rejected'] += 1
+                logger.warning(f"Cache value for {':'.join(str(k) for k in key if k)} is {size} bytes, larger than the whole budget ({self.max_bytes}), not cached")
+                return
+            entry = _Entry(value, size, now + ttl)
+            self._entries[key] = entry
+            self._bytes += size
+            heapq.heappush(self._expiry, (entry.expires_at, next(self._seq), key))
+            self._evict_lru()
+
+    def get_or_fetch(self, cache_type: str, exchange: str, symbol: str, fetch_fn, timeframe: str = None):
+        """
+        获取缓存，未命中时调用 fetch_fn 加载并写入缓存。
+        同一个键同时只有一个线程执行 fetch_fn，其余线程等待并共享其结果。
+        """
+        if cache_type not in self.ttls:
+            return fetch_fn()
+        key = self._make_key(cache_type, exchange, symbol, timeframe)
+
+        with self._lock:
+            value = self.get_cache(cache_type, exchange, symbol, timeframe)
+            if value is not None:
+                self.stats['hits'] += 1
+                cache_requests(cache_type, 'hit').inc()
+                return value
+            call = self._inflight.get(key)
+            is_leader = call is None
+            if is_leader:
+                call = _InFlight()
+                self._inflight[key] = call
+                self.stats['misses'] += 1
+                cache_requests(cache_type, 'miss').inc()
+            else:
+                self.stats['coalesced'] += 1
+                cache_requests(cache_type, 'coalesced').inc()
+
+        if not is_leader:
+            call.event.wait()
+            return call.result
+
+        try:
+            call.result = fetch_fn()
+            if call.result is not None:
+                self.set_cache(cache_type, exchange, symbol, call.result, timeframe)
+        finally:
+            with self._lock:
+                del self._inflight[key]
+            call.event.set()
+        return call.result
+
+    def clear_expired(self):
+        """清理已到期的条目（每次读写时也会顺带清理，这里只是让空闲时的内存及时释放）"""
+        with self._lock:
+            self._expire(self.clock())
+
+    def __len__(self):
+        return len(self._entries)
+
+    @property
+    def bytes(self):
+        return self._bytes
+
+    def get_stats(self):
+        """条目数、估算字节数、各类型条目数与命中/淘汰计数"""
+        with self._lock:
+            by_type = {}
+            for cache_type, *_ in self._entries:
+                by_type[cache_type] = by_type.get(cache_type, 0) + 1
+            stats = dict(self.stats)
+            stats.update(entries=len(self._entries), bytes=self._bytes, max_bytes=self.max_bytes, by_type=by_type)
+        lookups = stats['hits'] + stats['misses'] + stats['coalesced']
+        stats['hit_ratio'] = stats['hits'] / lookups if lookups else 0.0
+        return stats
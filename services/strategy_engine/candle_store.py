@@ -0,0 +1,254 @@
+import threading
+import time
+import logging
+import ccxt
+import numpy as np
+from candles import Candles, OHLCV_COLUMNS
+
+logger = logging.getLogger(__name__)
+
+
+def timeframe_to_ms(timeframe: str) -> int:
+    """将 '1m' / '1h' / '1d' 等周期转换为毫秒"""
+    return int(ccxt.Exchange.parse_timeframe(timeframe) * 1000)
+
+
+class CandleBuffer:
+    """固定容量的 K 线环形缓冲区，按时间顺序保存最近 capacity 根 K 线（按列存储，取窗口时各列连续）"""
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self._data = np.zeros((len(OHLCV_COLUMNS), capacity), dtype=np.float64)
+        self._start = 0  # 最旧一根 K 线所在的位置
+        self._size = 0
+        self.version = 0  # 每次数据变化自增，供上层判断是否需要重算
+        self.last_sync = 0.0
+        self.persisted_ts = None  # 已写入本地历史的最后一根已完成 K 线时间戳
+        self.backfill_pending = False  # 扩容后尚未补齐更早的 K 线，下次同步整窗拉取并与已有数据合并
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return self._size
+
+    @property
+    def last_timestamp(self):
+        """最后一根（可能仍在形成中的）K 线时间戳"""
+        if self._size == 0:
+            return None
+        return int(self._data[0, (self._start + self._size - 1) % self.capacity])
+
+    def reset(self):
+        self._start = 0
+        self._size = 0
+        self.persisted_ts = None
+        self.version += 1
+
+    def _append(self, row):
+        idx = (self._start + self._size) % self.capacity
+        self._data[:, idx] = row
+        if self._size < self.capacity:
+            self._size += 1
+        else:
+            # 缓冲区已满，覆盖最旧的一根
+            self._start = (self._start + 1) % self.capacity
+
+    def merge(self, rows):
+        """
+        合并交易所返回的 K 线：
+        - 时间戳与最后一根相同 -> 原地替换（未完成 K 线的最新状态）
+        - 时间戳更新 -> 追加
+        - 更旧的 K 线 -> 忽略
+        返回是否有数据变化
+        """
+        if not rows:
+            return False
+        changed = False
+        for row in np.asarray(rows, dtype=np.float64):
+            last_ts = self.last_timestamp
+            ts = int(row[0])
+            if last_ts is not None and ts == last_ts:
+                self._data[:, (self._start + self._size - 1) % self.capacity] = row
+                changed = True
+            elif last_ts is None or ts > last_ts:
+                self._append(row)
+                changed = True
+        if changed:
+            self.version += 1
+        return changed
+
+    def grow(self, capacity: int):
+        """扩大容量：按时间顺序复制已有的 K 线，保留 persisted_ts，并标记需要补齐更早的 K 线"""
+        if capacity <= self.capacity:
+            return
+        data = np.zeros((len(OHLCV_COLUMNS), capacity), dtype=np.float64)
+        data[:, :self._size] = self.tail_columns(self._size)
+        self._data = data
+        self._start = 0
+        self.capacity = capacity
+        self.backfill_pending = self._size > 0
+
+    def merge_history(self, rows):
+        """
+        合并包含更早 K 线的整窗数据（扩容后补齐历史）：与已有 K 线按时间戳取并集，
+        相同时间戳以 rows（新拉取的）为准，保留最近 capacity 根。返回是否有数据变化
+        """
+        rows = np.asarray(rows, dtype=np.float64).reshape(-1, len(OHLCV_COLUMNS))
+        if not len(rows):
+            return False
+        combined = np.concatenate([self.tail(self._size), rows])
+        # 反转后 np.unique 取到的是每个时间戳最后出现的行（rows 优先），结果按时间排序
+        _, first = np.unique(combined[::-1, 0], return_index=True)
+        combined = combined[len(combined) - 1 - first][-self.capacity:]
+        self._data[:, :len(combined)] = combined.T
+        self._start = 0
+        self._size = len(combined)
+        self.version += 1
+        return True
+
+    def tail_columns(self, n: int):
+        """按时间顺序返回最近 n 根 K 线的 (6, n) 副本，每列连续"""
+        n = min(n, self._size)
+        idx = (self._start + np.arange(self._size - n, self._size)) % self.capacity
+        return self._data.take(idx, axis=1)
+
+    def tail(self, n: int):
+        """按时间顺序返回最近 n 根 K 线的 (n, 6) 行（副本）"""
+        return self.tail_columns(n).T
+
+    def window(self, n: int):
+        """最近 n 根 K 线的只读 Candles"""
+        return Candles.from_columns(self.tail_columns(n))
+
+
+class CandleStore:
+    """
+    按 (exchange, symbol, timeframe) 维护的增量 K 线存储。
+    首次访问时整窗拉取一次，之后只用 since 参数拉取最后一根之后的新 K 线，
+    并原地替换仍在形成中的最后一根。
+    """
+
+    def __init__(self, exchange_manager, capacity: int = 500, history=None, clock=time.time):
+        self.exchange_manager = exchange_manager
+        self.capacity = capacity
+        self.history = history  # HistoryStore，新完成的 K 线追加写入本地历史
+        self.clock = clock  # 当前时间（秒），基准测试中替换为模拟时钟
+        self._buffers = {}  # {(exchange, symbol, timeframe): CandleBuffer}
+        self._lock = threading.Lock()
+
+    def _get_buffer(self, exchange_name: str, symbol: str, timeframe: str, limit: int):
+        key = (exchange_name, symbol, timeframe)
+        with self._lock:
+            buf = self._buffers.get(key)
+            if buf is None:
+                buf = self._buffers[key] = CandleBuffer(max(self.capacity, limit))
+        if buf.capacity < limit:
+            # 需要更长的窗口：原地扩容，已有的 K 线与写入历史的进度保留，下次同步只补齐更早的部分
+            with buf.lock:
+                buf.grow(limit)
+        return buf
+
+    def _plan_sync(self, buf: CandleBuffer, timeframe: str):
+        """计算本次同步的拉取参数，返回 (limit, since)；since 为 None 表示整窗重新拉取"""
+        now_ms = int(self.clock() * 1000)
+        tf_ms = timeframe_to_ms(timeframe)
+        last_ts = buf.last_timestamp
+
+        # 空缓冲区、扩容后需要补齐更早的 K 线，或断档超过整个缓冲区：整窗拉取
+        if last_ts is None or buf.backfill_pending or (now_ms - last_ts) // tf_ms >= buf.capacity:
+            return buf.capacity, None
+        # 增量拉取：从最后一根（可能未完成）开始，只取缺失的几根
+        return int((now_ms - last_ts) // tf_ms + 2), last_ts
+
+    def _apply_sync(self, buf: CandleBuffer, rows, since, market):
+        """把拉取结果合并进缓冲区，返回是否成功"""
+        if since is None:
+            if not rows:
+                return False
+            if buf.backfill_pending and int(rows[0][0]) <= buf.last_timestamp <= int(rows[-1][0]):
+                # 扩容后补齐：新窗口与已有数据重叠，合并而不是丢弃已有数据
+                buf.merge_history(rows)
+                logger.info(f"Extended {':'.join(market)} to {len(buf)} candles after growing the buffer")
+            else:
+                buf.reset()
+                buf.merge(rows)
+                logger.info(f"Seeded {len(buf)} candles for {':'.join(market)}")
+            buf.backfill_pending = False
+        else:
+            if rows is None:
+                return False
+            buf.merge(rows)
+        buf.last_sync = self.clock()
+        self._persist_closed(market, buf)
+        return True
+
+    def _persist_closed(self, market, buf: CandleBuffer):
+        """把缓冲区中新完成的 K 线（最后一根之前、上次写入之后的）追加到本地历史，失败不影响行情"""
+        if self.history is None or len(buf) < 2:
+            return
+        rows = buf.tail(len(buf))[:-1]
+        if buf.persisted_ts is not None:
+            rows = rows[rows[:, 0] > buf.persisted_ts]
+        if not len(rows):
+            return
+        try:
+            self.history.append(*market, rows)
+            buf.persisted_ts = int(rows[-1, 0])
+        except Exception as e:
+            logger.error(f"Failed to append {len(rows)} candles of {':'.join(market)} to history: {e}")
+
+    def _sync(self, buf: CandleBuffer, symbol: str, timeframe: str, exchange_name: str):
+        """从交易所同步缓冲区，返回是否成功"""
+        limit, since = self._plan_sync(buf, timeframe)
+        rows = self.exchange_manager.get_ohlcv(symbol, timeframe, limit=limit, since=since, exchange_name=exchange_name)
+        return self._apply_sync(buf, rows, since, (exchange_name, symbol, timeframe))
+
+    def get_window(self, symbol: str, timeframe: str = '1h', limit: int = 100, exchange_name: str = 'binance'):
+        """返回最近 limit 根 K 线（只读 Candles），可在多个策略间共享"""
+        buf = self._get_buffer(exchange_name, symbol, timeframe, limit)
+        with buf.lock:
+            if not self._sync(buf, symbol, timeframe, exchange_name) and len(buf) == 0:
+                return None
+            return buf.window(limit)
+
+    def get_ohlcv(self, symbol: str, timeframe: str = '1h', limit: int = 100, exchange_name: str = 'binance'):
+        """返回最近 limit 根 K 线（list of lists，格式与 ExchangeManager.get_ohlcv 相同）"""
+        window = self.get_window(symbol, timeframe, limit, exchange_name)
+        return window.to_numpy().tolist() if window is not None else None
+
+    def snapshot(self, markets=None, tail: int = 200):
+        """导出各市场最近 tail 根 K 线 {(exchange, symbol, timeframe): [[ts, o, h, l, c, v], ...]}，用于热重启"""
+        with self._lock:
+            items = [(key, buf) for key, buf in self._buffers.items() if markets is None or key in markets]
+        snapshot = {}
+        for key, buf in items:
+            with buf.lock:
+                if len(buf):
+                    snapshot[key] = buf.tail(tail).tolist()
+        return snapshot
+
+    def restore(self, exchange_name: str, symbol: str, timeframe: str, rows):
+        """用快照预填空缓冲区，之后只需从快照最后一根开始增量拉取；缓冲区已有数据时不覆盖"""
+        if not rows:
+            return False
+        buf = self._get_buffer(exchange_name, symbol, timeframe, len(rows))
+        with buf.lock:
+            if len(buf):
+                return False
+            buf.merge(rows)
+        logger.info(f"♻️ Restored {len(rows)} candles for {exchange_name}:{symbol}:{timeframe} from checkpoint")
+        return True
+
+    def markets(self):
+        """当前缓冲的所有市场 [(exchange, symbol, timeframe)]"""
+        with self._lock:
+            return list(self._buffers)
+
+    def get_stats(self):
+        """获取存储统计"""
+        with self._lock:
+            buffers = list(self._buffers.values())
+        return {
+            'markets': len(buffers),
+            'candles': sum(len(b) for b in buffers),
+            'bytes': sum(b._data.nbytes for b in buffers),
+        }
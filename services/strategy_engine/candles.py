@@ -0,0 +1,89 @@
+from typing import NamedTuple
+import numpy as np
+
+# OHLCV 列顺序，与 ccxt fetch_ohlcv 返回一致
+OHLCV_COLUMNS = ['timestamp', 'open', 'high', 'low', 'close', 'volume']
+
+
+class Candle(NamedTuple):
+    """单根 K 线"""
+    timestamp: int
+    open: float
+    high: float
+    low: float
+    close: float
+    volume: float
+
+
+class Candles:
+    """
+    只读的 K 线序列，交给策略的行情窗口：
+    - 每列是一段连续的 NumPy 数组（timestamp 为 int64，其余为 float64），按列读取不需要转换或复制
+    - 切片（candles[-10:]、closed()）返回共享同一块内存的新 Candles，不复制数据
+    - 最后一根通常是仍在形成中的 K 线，last_closed() / forming() 取出单根
+    每次拉取每个市场只构造一次，所有策略共享，因此对象与各列都不可修改。
+    """
+
+    __slots__ = OHLCV_COLUMNS + ['_frame']
+
+    def __init__(self, timestamp, open, high, low, close, volume):
+        for name, column in zip(OHLCV_COLUMNS, (timestamp, open, high, low, close, volume)):
+            column.flags.writeable = False
+            object.__setattr__(self, name, column)
+        object.__setattr__(self, '_frame', None)
+
+    @classmethod
+    def from_columns(cls, values):
+        """由 (6, n) 的 float64 数组构造（每行一列，行内连续），OHLCV 列直接引用其中的行"""
+        values = np.ascontiguousarray(values, dtype=np.float64)
+        return cls(values[0].astype(np.int64), values[1], values[2], values[3], values[4], values[5])
+
+    @classmethod
+    def from_rows(cls, rows):
+        """由 (n, 6) 的行（ccxt 返回的 list of lists 或 ndarray）构造"""
+        rows = np.asarray(rows, dtype=np.float64).reshape(-1, len(OHLCV_COLUMNS))
+        return cls.from_columns(rows.T)
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"{type(self).__name__} is immutable")
+
+    def __len__(self):
+        return len(self.timestamp)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return Candles(*(getattr(self, name)[index] for name in OHLCV_COLUMNS))
+        return Candle(int(self.timestamp[index]), *(float(getattr(self, name)[index]) for name in OHLCV_COLUMNS[1:]))
+
+    def __repr__(self):
+        if not len(self):
+            return "Candles(0)"
+        return f"Candles({len(self)}, {self.timestamp[0]} ~ {self.timestamp[-1]})"
+
+    def closed(self):
+        """去掉最后一根（未完成）K 线后的已完成部分（视图）"""
+        return self[:-1]
+
+    def last_closed(self):
+        """最后一根已完成的 K 线（倒数第二根），不足两根时返回 None"""
+        return self[-2] if len(self) >= 2 else None
+
+    def forming(self):
+        """最后一根（仍在形成中的）K 线，为空时返回 None"""
+        return self[-1] if len(self) else None
+
+    @property
+    def nbytes(self):
+        return sum(getattr(self, name).nbytes for name in OHLCV_COLUMNS)
+
+    def to_numpy(self):
+        """(n, 6) 的 float64 行数组（复制），列顺序见 OHLCV_COLUMNS"""
+        return np.column_stack([getattr(self, name) for name in OHLCV_COLUMNS]).astype(np.float64)
+
+    def to_pandas(self):
+        """转换为 DataFrame（首次调用时才导入 pandas 并构造，之后复用；各列不复制，同样只读）"""
+        if self._frame is None:
+            import pandas as pd
+            frame = pd.DataFrame({name: getattr(self, name) for name in OHLCV_COLUMNS}, copy=False)
+            object.__setattr__(self, '_frame', frame)
+        return self._frame
@@ -15,6 +15,60 @@ class Settings(BaseSettings):
     # ========== Common ==========
     REDIS_URL: str = "redis://redis:6379/0"
     PROXY_URL: str = ""
+    MARKET_CACHE_DIR: str = ".cache"  # 交易所市场元数据缓存目录
+    MARKET_CACHE_TTL: int = 6 * 3600  # 市场元数据缓存有效期（秒），过期后先用旧数据启动再后台刷新
+    EXCHANGE_INIT_RETRY_INTERVAL: int = 30  # 交易所初始化失败后多少秒内不再重试
+    RATE_LIMIT_BACKEND: str = "local"  # local: 进程内令牌桶; redis: 所有引擎副本通过 Redis 共享请求权重预算
+    RATE_LIMIT_SAFETY: float = 0.8  # 只使用交易所权重上限的这一比例，给其他客户端留余量
+
+    # ========== Market Data ==========
+    CANDLE_BUFFER_SIZE: int = 500  # 每个 (exchange, symbol, timeframe) 环形缓冲区保留的 K 线数量
+    MARKET_DATA_CACHE_TTL: int = 30  # 行情窗口缓存有效期（秒）
+    CACHE_MAX_BYTES: int = 256 * 2 ** 20  # 行情窗口缓存的字节预算（按 K 线数组的 nbytes 估算），超出时按 LRU 淘汰
+    HISTORY_STORE_DIR: str = "history"  # 已完成 K 线的本地历史存储目录（按 交易所/交易对/周期/月 分区），为空则不落盘
+    HISTORY_BACKFILL_INTERVAL: int = 300  # 本地历史缺口检测与补数的间隔（秒）
+    HISTORY_BACKFILL_DAYS: int = 30  # 检查并补齐最近多少天的历史
+    HISTORY_BACKFILL_PAGE_LIMIT: int = 1000  # 补数时每次 fetch_ohlcv 的 K 线数量
+    HISTORY_BACKFILL_MAX_PAGES: int = 20  # 每轮最多请求的页数，避免挤占实时行情的限流额度
+
+    # ========== Scheduler ==========
+    SCHEDULER_SETTLE_DELAY: float = 2.0  # K 线收盘后等待交易所落盘的秒数
+    STRATEGY_SYNC_INTERVAL: int = 60  # 无 LISTEN 或监听断开时，最长多少秒唤醒一次轮询数据库中的策略配置
+    STRATEGY_RECONCILE_INTERVAL: int = 900  # 有变更通知时，全量核对策略表的间隔（秒）
+    STATE_CHECKPOINT_INTERVAL: float = 5.0  # 策略执行后保存状态检查点的最小间隔（秒），退出时总会保存
+    STATE_CANDLE_TAIL: int = 200  # 检查点中每个市场保留的最近 K 线数量
+    CLOCK_SYNC_INTERVAL: int = 3600  # 交易所服务器时间校准间隔（秒）
+
+    # ========== Workers ==========
+    ENGINE_MODE: str = "threaded"  # threaded: 线程池 + 同步 ccxt; async: asyncio + ccxt.async_support; stream: K 线推送驱动
+    EXCHANGE_MAX_CONCURRENCY: int = 20  # asyncio 模式下每个交易所的最大并发请求数
+    MARKET_DATA_SOURCE: str = "stream"  # stream 模式的数据源: stream（交易所 websocket）或 replay（本地回放服务）
+    REPLAY_URL: str = "ws://localhost:8765"  # 本地回放服务地址（replay_server.py）
+    ENGINE_WORKERS: int = 10  # 常驻策略线程数
+    TICK_SOFT_TIMEOUT: float = 20.0  # 单个策略 on_tick 软截止（秒），超过只告警；也是每轮行情拉取的截止，超过的市场本轮跳过
+    TICK_HARD_TIMEOUT: float = 50.0  # 硬截止（秒），超过后主循环不再等待，策略结束前跳过后续轮次
+
+    # ========== Signals ==========
+    SIGNAL_QUEUE_SIZE: int = 10000  # 信号写后队列容量，满时阻塞策略线程
+    SIGNAL_BATCH_SIZE: int = 200  # 每批最多写入的信号数
+    SIGNAL_FLUSH_INTERVAL: float = 0.2  # 攒批最长等待时间（秒）
+    SIGNAL_RETRY_DELAY: float = 1.0  # 数据库不可用时信号重试的初始退避（秒），每次翻倍，最长 30 秒
+    SIGNAL_MAX_RETRIES: int = 5  # 重试次数用完仍写不进数据库的信号直接发布到 Redis Stream
+    SIGNAL_STREAM: str = "strategy_signals_stream"  # 信号转发的 Redis Stream
+    SIGNAL_STREAM_MAXLEN: int = 100000  # Stream 保留的最大消息数（近似裁剪）
+    OUTBOX_POLL_INTERVAL: float = 1.0  # 发件箱中继的轮询间隔（秒），有新信号时会被立即唤醒
+    OUTBOX_RETENTION_HOURS: int = 72  # 已转发的发件箱记录保留时长
+
+    # ========== Sharding ==========
+    SHARDING_ENABLED: bool = False  # 多副本部署时开启：按 (exchange, symbol) 一致性哈希把策略分配到各引擎节点
+    SHARD_NODE_ID: str = ""  # 节点 ID，留空时使用 hostname-pid
+    SHARD_HEARTBEAT_INTERVAL: float = 5.0  # 心跳间隔（秒）
+    SHARD_NODE_TTL: float = 15.0  # 超过该时间没有心跳的节点视为下线
+    SHARD_VNODES: int = 128  # 每个节点在哈希环上的虚拟节点数
+
+    # ========== Observability ==========
+    METRICS_PORT: int = 9102  # Prometheus /metrics 端点端口，0 为不启动
+    LOG_SAMPLE_EVERY: int = 100  # 每个 tick 的例行日志降为 DEBUG，且每个策略/计划每 N 条只输出一条
 
     class Config:
         env_file = ".env"
@@ -1,112 +1,183 @@
 import ccxt
+import time
+import threading
 from config import settings
+from candle_store import CandleStore
+from market_cache import MarketMetadataCache
+from history_store import open_history_store
+from rate_limiter import create_rate_limiter, endpoint_weight, retry_after_seconds
+from metrics import exchange_request_seconds
 import logging
 
 logger = logging.getLogger(__name__)
 
+# 各交易所的默认合约类型
+EXCHANGE_DEFAULT_TYPES = {
+    'binance': 'future',  # Default to futures trading
+    'bitget': 'swap',  # Bitget 使用 swap
+}
+
+def build_exchange_config(exchange_name: str):
+    """
+    构建 ccxt 客户端配置（同步与 asyncio 客户端共用）。
+    返回 (config, has_credentials)
+    """
+    config = {
+        # 限流由 ExchangeManager 的共享 RateLimiter 按请求权重统一控制，不再使用 ccxt 的单客户端节流
+        'enableRateLimit': False,
+        'options': {
+            'defaultType': EXCHANGE_DEFAULT_TYPES[exchange_name],
+        }
+    }
+
+    # 只有当密钥存在且非空时才添加认证
+    if exchange_name == 'binance':
+        has_credentials = bool(
+            settings.BINANCE_API_KEY and 
+            settings.BINANCE_SECRET_KEY and 
+            settings.BINANCE_API_KEY.strip() and 
+            settings.BINANCE_SECRET_KEY.strip()
+        )
+        if has_credentials:
+            config['apiKey'] = settings.BINANCE_API_KEY
+            config['secret'] = settings.BINANCE_SECRET_KEY
+    else:
+        has_credentials = bool(
+            settings.BITGET_API_KEY and 
+            settings.BITGET_SECRET_KEY and 
+            settings.BITGET_PASSPHRASE and
+            settings.BITGET_API_KEY.strip() and 
+            settings.BITGET_SECRET_KEY.strip() and
+            settings.BITGET_PASSPHRASE.strip()
+        )
+        if has_credentials:
+            config['apiKey'] = settings.BITGET_API_KEY
+            config['secret'] = settings.BITGET_SECRET_KEY
+            config['password'] = settings.BITGET_PASSPHRASE
+
+    if settings.PROXY_URL:
+        config['proxies'] = {
+            'http': settings.PROXY_URL,
+            'https': settings.PROXY_URL,
+        }
+    return config, has_credentials
+
 class ExchangeManager:
+    """
+    同步 ccxt 交易所管理器。
+    交易所客户端按需（首次使用时）初始化，warm_up() 可在后台并行预热；
+    load_markets 的结果缓存在本地文件中，重启时直接复用，过期后在后台刷新。
+    """
+
     def __init__(self):
         self.exchanges = {}  # {exchange_name: exchange_instance}
         self.primary_exchange = None  # 默认交易所
-        self._init_exchanges()
+        self._init_locks = {name: threading.Lock() for name in EXCHANGE_DEFAULT_TYPES}
+        self._retry_at = {}  # {exchange_name: 初始化失败后允许重试的时间}
+        self.init_durations = {}  # {exchange_name: 初始化耗时（秒）}
+        self.market_cache = MarketMetadataCache(settings.MARKET_CACHE_DIR, settings.MARKET_CACHE_TTL)
+        # 所有线程共享的请求权重限流（RATE_LIMIT_BACKEND=redis 时所有引擎进程共享）
+        self.rate_limiter = create_rate_limiter()
+        # 增量 K 线存储（环形缓冲区），策略通过它读取 K 线而不是每次整窗拉取
+        self.history_store = open_history_store(settings.HISTORY_STORE_DIR) if settings.HISTORY_STORE_DIR else None
+        self.candle_store = CandleStore(self, capacity=settings.CANDLE_BUFFER_SIZE, history=self.history_store)
+
+    def _init_exchange(self, exchange_name: str):
+        """初始化单个交易所（同一交易所的并发调用只初始化一次），失败时返回 None"""
+        with self._init_locks[exchange_name]:
+            if exchange_name in self.exchanges:
+                return self.exchanges[exchange_name]
+            if time.time() < self._retry_at.get(exchange_name, 0):
+                return None
 
-    def _init_exchanges(self):
-        """初始化所有配置的交易所"""
-        
-        # ==================== Binance ====================
+            started = time.monotonic()
+            try:
+                config, has_credentials = build_exchange_config(exchange_name)
+                if has_credentials:
+                    logger.info(f"Initializing {exchange_name} with API keys")
+                else:
+                    logger.warning(f"{exchange_name} credentials not found. Initializing in public mode (read-only).")
+                if settings.PROXY_URL:
+                    logger.info(f"Using Proxy for {exchange_name}: {settings.PROXY_URL}")
+
+                exch = getattr(ccxt, exchange_name)(config)
+                cached = self.market_cache.load(exchange_name)
+                if cached:
+                    self.market_cache.apply(exch, cached)
+                else:
+                    exch.load_markets()
+                    self.market_cache.save(exchange_name, exch)
+            except Exception as e:
+                self._retry_at[exchange_name] = time.time() + settings.EXCHANGE_INIT_RETRY_INTERVAL
+                logger.error(f"❌ Failed to connect to {exchange_name}: {e}", exc_info=True)
+                return None
+
+            self.exchanges[exchange_name] = exch
+            if exchange_name == 'binance':
+                self.primary_exchange = exch  # 设置为主交易所
+            self.init_durations[exchange_name] = time.monotonic() - started
+            source = 'cached markets' if cached else 'fresh markets'
+            mode = 'authenticated' if has_credentials else 'public mode'
+            logger.info(f"✅ Successfully connected to {exchange_name} ({mode}, {source}, {self.init_durations[exchange_name]:.2f}s)")
+
+            if cached and cached['stale']:
+                threading.Thread(
+                    target=self._refresh_markets, args=(exchange_name, exch),
+                    name=f'markets-refresh-{exchange_name}', daemon=True
+                ).start()
+            return exch
+
+    def _refresh_markets(self, exchange_name: str, exch):
+        """后台重新加载过期的市场元数据并写回缓存"""
         try:
-            config = {
-                'enableRateLimit': True,
-                'options': {
-                    'defaultType': 'future',  # Default to futures trading
-                }
-            }
-            
-            # 只有当密钥存在且非空时才添加认证
-            has_credentials = (
-                settings.BINANCE_API_KEY and 
-                settings.BINANCE_SECRET_KEY and 
-                settings.BINANCE_API_KEY.strip() and 
-                settings.BINANCE_SECRET_KEY.strip()
-            )
-            
-            if has_credentials:
-                config['apiKey'] = settings.BINANCE_API_KEY
-                config['secret'] = settings.BINANCE_SECRET_KEY
-                logger.info("Initializing Binance with API keys")
-            else:
-                logger.warning("Binance API Key/Secret not found. Initializing in public mode (read-only).")
-
-            if settings.PROXY_URL:
-                config['proxies'] = {
-                    'http': settings.PROXY_URL,
-                    'https': settings.PROXY_URL,
-                }
-                logger.info(f"Using Proxy for Binance: {settings.PROXY_URL}")
-
-            binance = ccxt.binance(config)
-            binance.load_markets()
-            self.exchanges['binance'] = binance
-            self.primary_exchange = binance  # 设置为主交易所
-            logger.info("✅ Successfully connected to Binance (Public Mode)" if not has_credentials else "✅ Successfully connected to Binance Futures")
+            exch.load_markets(reload=True)
+            self.market_cache.save(exchange_name, exch)
+            logger.info(f"🔄 Refreshed market metadata for {exchange_name}")
         except Exception as e:
-            logger.error(f"❌ Failed to connect to Binance: {e}", exc_info=True)
-        
-        # ==================== Bitget ====================
-        try:
-            config = {
-                'enableRateLimit': True,
-                'options': {
-                    'defaultType': 'swap',  # Bitget 使用 swap
-                }
-            }
-            
-            # 只有当密钥存在且非空时才添加认证
-            has_credentials = (
-                settings.BITGET_API_KEY and 
-                settings.BITGET_SECRET_KEY and 
-                settings.BITGET_PASSPHRASE and
-                settings.BITGET_API_KEY.strip() and 
-                settings.BITGET_SECRET_KEY.strip() and
-                settings.BITGET_PASSPHRASE.strip()
-            )
-            
-            if has_credentials:
-                config['apiKey'] = settings.BITGET_API_KEY
-                config['secret'] = settings.BITGET_SECRET_KEY
-                config['password'] = settings.BITGET_PASSPHRASE
-                logger.info("Initializing Bitget with API keys")
+            logger.warning(f"Background market refresh failed for {exchange_name}: {e}")
+
+    def warm_up(self, wait: bool = False):
+        """在后台线程中并行初始化所有交易所；wait=True 时等待全部完成"""
+        threads = [
+            threading.Thread(target=self._init_exchange, args=(name,), name=f'exchange-init-{name}', daemon=True)
+            for name in EXCHANGE_DEFAULT_TYPES if name not in self.exchanges
+        ]
+        for thread in threads:
+            thread.start()
+        if wait:
+            for thread in threads:
+                thread.join()
+            if not self.exchanges:
+                logger.critical("❌❌❌ CRITICAL: No exchanges initialized! Check logs above for errors.")
             else:
-                logger.warning("Bitget credentials not found. Initializing in public mode (read-only).")
-
-            if settings.PROXY_URL:
-                config['proxies'] = {
-                    'http': settings.PROXY_URL,
-                    'https': settings.PROXY_URL,
-                }
-                logger.info(f"Using Proxy for Bitget: {settings.PROXY_URL}")
-
-            bitget = ccxt.bitget(config)
-            bitget.load_markets()
-            self.exchanges['bitget'] = bitget
-            logger.info("✅ Successfully connected to Bitget (Public Mode)" if not has_credentials else "✅ Successfully connected to Bitget Futures")
-        except Exception as e:
-            logger.error(f"❌ Failed to connect to Bitget: {e}", exc_info=True)
-        
-        # 检查是否至少有一个交易所可用
-        if not self.exchanges:
-            logger.critical("❌❌❌ CRITICAL: No exchanges initialized! Check logs above for errors.")
-        else:
-            logger.info(f"📊 Initialized exchanges: {list(self.exchanges.keys())}")
+                logger.info(f"📊 Initialized exchanges: {list(self.exchanges.keys())}")
+        return threads
 
     def get_exchange(self, exchange_name: str = 'binance'):
-        """获取指定交易所实例"""
-        return self.exchanges.get(exchange_name, self.primary_exchange)
+        """获取指定交易所实例（首次使用时初始化），未知交易所返回主交易所"""
+        if exchange_name not in EXCHANGE_DEFAULT_TYPES:
+            exchange_name = 'binance'
+        return self.exchanges.get(exchange_name) or self._init_exchange(exchange_name) or self.primary_exchange
 
     @property
     def exchange(self):
         """向后兼容：返回主交易所"""
-        return self.primary_exchange
+        return self.get_exchange('binance')
+
+    def _call(self, exch, method: str, *args, **kwargs):
+        """经共享限流器排队后调用交易所接口，并用响应头校准已用权重"""
+        weight = endpoint_weight(exch.id, method, kwargs.get('limit'))
+        self.rate_limiter.acquire(exch.id, weight)
+        started = time.perf_counter()
+        try:
+            return getattr(exch, method)(*args, **kwargs)
+        except ccxt.DDoSProtection:
+            # 429/418：按 Retry-After（没有则 60 秒）暂停该交易所的所有请求
+            self.rate_limiter.penalize(exch.id, retry_after_seconds(exch.last_response_headers))
+            raise
+        finally:
+            exchange_request_seconds(exch.id, method).observe(time.perf_counter() - started)
+            self.rate_limiter.observe(exch.id, exch.last_response_headers)
 
     def get_ticker(self, symbol: str, exchange_name: str = 'binance'):
         """从指定交易所获取行情"""
@@ -115,23 +186,34 @@ class ExchangeManager:
             logger.warning(f"Exchange {exchange_name} not available")
             return None
         try:
-            return exch.fetch_ticker(symbol)
+            return self._call(exch, 'fetch_ticker', symbol)
         except Exception as e:
             logger.error(f"Error fetching ticker {symbol} from {exchange_name}: {e}")
             return None
 
-    def get_ohlcv(self, symbol: str, timeframe: str = '1h', limit: int = 100, exchange_name: str = 'binance'):
-        """从指定交易所获取K线数据"""
+    def get_ohlcv(self, symbol: str, timeframe: str = '1h', limit: int = 100, exchange_name: str = 'binance', since: int = None):
+        """从指定交易所获取K线数据（since 为毫秒时间戳，用于增量拉取）"""
         exch = self.get_exchange(exchange_name)
         if not exch:
             logger.warning(f"Exchange {exchange_name} not available")
             return None
         try:
-            return exch.fetch_ohlcv(symbol, timeframe, limit=limit)
+            return self._call(exch, 'fetch_ohlcv', symbol, timeframe, since=since, limit=limit)
         except Exception as e:
             logger.error(f"Error fetching OHLCV {symbol} from {exchange_name}: {e}")
             return None
 
+    def get_server_time(self, exchange_name: str = 'binance'):
+        """获取交易所服务器时间（毫秒），用于按交易所时钟对齐 K 线收盘"""
+        exch = self.get_exchange(exchange_name)
+        if not exch:
+            return None
+        try:
+            return self._call(exch, 'fetch_time')
+        except Exception as e:
+            logger.error(f"Error fetching server time from {exchange_name}: {e}")
+            return None
+
     def get_balance(self, exchange_name: str = 'binance'):
         """从指定交易所获取余额"""
         exch = self.get_exchange(exchange_name)
@@ -139,7 +221,7 @@ class ExchangeManager:
             logger.warning(f"Exchange {exchange_name} not available")
             return None
         try:
-            return exch.fetch_balance()
+            return self._call(exch, 'fetch_balance')
         except Exception as e:
             logger.error(f"Error fetching balance from {exchange_name}: {e}")
             return None
@@ -0,0 +1,245 @@
+import os
+import json
+import logging
+import threading
+from datetime import datetime, timezone
+import numpy as np
+from candle_store import OHLCV_COLUMNS, timeframe_to_ms
+
+logger = logging.getLogger(__name__)
+
+
+def _month_start_ms(ts_ms: int) -> int:
+    dt = datetime.fromtimestamp(ts_ms / 1000, tz=timezone.utc)
+    return int(datetime(dt.year, dt.month, 1, tzinfo=timezone.utc).timestamp() * 1000)
+
+
+def _next_month_ms(month_start: int) -> int:
+    dt = datetime.fromtimestamp(month_start / 1000, tz=timezone.utc)
+    year, month = (dt.year + 1, 1) if dt.month == 12 else (dt.year, dt.month + 1)
+    return int(datetime(year, month, 1, tzinfo=timezone.utc).timestamp() * 1000)
+
+
+def _month_name(month_start: int) -> str:
+    return datetime.fromtimestamp(month_start / 1000, tz=timezone.utc).strftime('%Y-%m')
+
+
+def merge_ranges(ranges, step: int):
+    """合并 [start, end] 区间（闭区间，单位为 K 线开盘时间），相差正好一根 K 线的区间视为连续"""
+    merged = []
+    for start, end in sorted(ranges):
+        if merged and start <= merged[-1][1] + step:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+    return merged
+
+
+class HistoryStore:
+    """
+    本地历史 K 线存储，按 exchange/symbol/timeframe/月份 分区：
+    - 每个月一个 .npy 文件，形状 (该月最多 K 线数, 6)，按列存储（fortran_order），读取单列只触及该列的数据；
+      每根 K 线的位置由开盘时间决定，写入是幂等的原地赋值，未写入的位置 timestamp 为 0（文件可稀疏）
+    - index.json 记录已覆盖的时间区间和已向交易所核实过的区间，数据先落盘再更新索引，索引中的区间一定可读
+    - 读取用 np.load(mmap_mode='r')，不解析、不整文件复制，单月内的区间直接返回内存映射视图
+    """
+
+    def __init__(self, root: str):
+        self.root = root
+        self._locks = {}  # {market: threading.Lock}
+        self._writers = {}  # {market: (month_start, 可写 memmap)}，每个市场只保留当前写入的月份
+        self._lock = threading.Lock()
+        self.stats = {'appended': 0}
+
+    def _market_dir(self, exchange_name: str, symbol: str, timeframe: str):
+        safe_symbol = symbol.replace('/', '-').replace(':', '_')
+        return os.path.join(self.root, exchange_name, safe_symbol, timeframe)
+
+    def _month_path(self, market, month_start: int):
+        return os.path.join(self._market_dir(*market), f"{_month_name(month_start)}.npy")
+
+    def _month_capacity(self, month_start: int, tf_ms: int):
+        return -(-(_next_month_ms(month_start) - month_start) // tf_ms)
+
+    def _get_lock(self, market):
+        with self._lock:
+            return self._locks.setdefault(market, threading.Lock())
+
+    # ---------- 索引 ----------
+
+    def _index_path(self, market):
+        return os.path.join(self._market_dir(*market), 'index.json')
+
+    def _load_index(self, market):
+        """
+        {'ranges': 有数据的区间, 'verified': 已向交易所核实过的区间（含交易所本身没有数据的空洞）}，
+        区间均为 [start, end] 闭区间，单位为 K 线开盘时间（毫秒）
+        """
+        try:
+            with open(self._index_path(market)) as f:
+                index = json.load(f)
+        except FileNotFoundError:
+            index = {'timeframe': market[2], 'ranges': []}
+        index.setdefault('verified', [])
+        return index
+
+    def _save_index(self, market, index):
+        path = self._index_path(market)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(index, f)
+        os.replace(tmp_path, path)
+
+    def coverage(self, exchange_name: str, symbol: str, timeframe: str):
+        """已覆盖的时间区间 [[start, end], ...]（闭区间，K 线开盘时间，毫秒）"""
+        return self._load_index((exchange_name, symbol, timeframe))['ranges']
+
+    def gaps(self, exchange_name: str, symbol: str, timeframe: str, start: int, end: int):
+        """[start, end] 内既没有数据、也没有核实过的区间 [[gap_start, gap_end], ...]（按周期对齐的开盘时间）"""
+        market = (exchange_name, symbol, timeframe)
+        tf_ms = timeframe_to_ms(timeframe)
+        index = self._load_index(market)
+        known = merge_ranges(index['ranges'] + index['verified'], tf_ms)
+        cursor = -(-start // tf_ms) * tf_ms
+        end = end // tf_ms * tf_ms
+        gaps = []
+        for range_start, range_end in known:
+            if range_end < cursor:
+                continue
+            if range_start > end:
+                break
+            if range_start > cursor:
+                gaps.append([cursor, min(range_start - tf_ms, end)])
+            cursor = max(cursor, range_end + tf_ms)
+        if cursor <= end:
+            gaps.append([cursor, end])
+        return gaps
+
+    def mark_verified(self, exchange_name: str, symbol: str, timeframe: str, start: int, end: int):
+        """记录 [start, end] 已向交易所核实：其中缺少的 K 线是交易所本身没有的，不再补拉"""
+        market = (exchange_name, symbol, timeframe)
+        with self._get_lock(market):
+            index = self._load_index(market)
+            index['verified'] = merge_ranges(index['verified'] + [[int(start), int(end)]], timeframe_to_ms(timeframe))
+            self._save_index(market, index)
+
+    # ---------- 写入 ----------
+
+    def _open_for_write(self, market, month_start: int, tf_ms: int):
+        """返回该月文件的可写内存映射；每个市场只保持当前写入的月份打开（调用方持有该市场的锁）"""
+        current = self._writers.get(market)
+        if current and current[0] == month_start:
+            return current[1]
+        path = self._month_path(market, month_start)
+        if os.path.exists(path):
+            mm = np.load(path, mmap_mode='r+')
+        else:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            mm = np.lib.format.open_memmap(
+                path, mode='w+', dtype=np.float64,
+                shape=(self._month_capacity(month_start, tf_ms), len(OHLCV_COLUMNS)), fortran_order=True
+            )
+        with self._lock:
+            self._writers[market] = (month_start, mm)
+        if current:
+            current[1].flush()
+        return mm
+
+    def append(self, exchange_name: str, symbol: str, timeframe: str, rows):
+        """写入已完成的 K 线（可乱序、可重复，相同开盘时间的覆盖），返回写入条数"""
+        rows = np.asarray(rows, dtype=np.float64)
+        if rows.size == 0:
+            return 0
+        market = (exchange_name, symbol, timeframe)
+        tf_ms = timeframe_to_ms(timeframe)
+        timestamps = rows[:, 0].astype(np.int64)
+        with self._get_lock(market):
+            month_starts = timestamps.astype('datetime64[ms]').astype('datetime64[M]').astype('datetime64[ms]').astype(np.int64)
+            for month_start in np.unique(month_starts):
+                idx = month_starts == month_start
+                mm = self._open_for_write(market, int(month_start), tf_ms)
+                mm[(timestamps[idx] - month_start) // tf_ms] = rows[idx]
+                mm.flush()
+            index = self._load_index(market)
+            index['ranges'] = merge_ranges(index['ranges'] + [[int(ts), int(ts)] for ts in np.unique(timestamps)], tf_ms)
+            self._save_index(market, index)
+        with self._lock:
+            self.stats['appended'] += len(rows)
+        return len(rows)
+
+    # ---------- 读取 ----------
+
+    def iter_months(self, exchange_name: str, symbol: str, timeframe: str, start: int = None, end: int = None):
+        """
+        按月产出 [start, end) 范围内的只读内存映射视图（零复制），形状 (n, 6)；
+        未写入的位置 timestamp 为 0，需要时由调用方过滤。
+        位置与 append() 一样按 (开盘时间 - 月初) // 周期 向下取整，周线、3 日线等不与月初对齐的周期，
+        首尾位置上的 K 线可能落在范围外，按开盘时间裁掉（仍是视图）。
+        """
+        market = (exchange_name, symbol, timeframe)
+        ranges = self.coverage(*market)
+        if not ranges:
+            return
+        tf_ms = timeframe_to_ms(timeframe)
+        start = ranges[0][0] if start is None else start
+        end = ranges[-1][1] + tf_ms if end is None else end
+        month_start = _month_start_ms(start)
+        while month_start < end:
+            next_month = _next_month_ms(month_start)
+            path = self._month_path(market, month_start)
+            if os.path.exists(path):
+                mm = np.load(path, mmap_mode='r')
+                lo = max(0, (start - month_start) // tf_ms)
+                hi = min(len(mm), -(-(min(end, next_month) - month_start) // tf_ms))
+                if hi > lo and mm[lo, 0] < start:
+                    lo += 1
+                if hi > lo and mm[hi - 1, 0] >= end:
+                    hi -= 1
+                if hi > lo:
+                    yield mm[lo:hi]
+            month_start = next_month
+
+    def read(self, exchange_name: str, symbol: str, timeframe: str, start: int = None, end: int = None):
+        """
+        读取 [start, end) 范围内的 K 线 (n, 6)，去掉未写入的位置。
+        范围在单个月内且没有空位时直接返回内存映射视图，跨月时只复制所请求的范围。
+        """
+        parts = []
+        for view in self.iter_months(exchange_name, symbol, timeframe, start, end):
+            filled = view[:, 0] != 0
+            parts.append(view if filled.all() else view[filled])
+        if not parts:
+            return np.empty((0, len(OHLCV_COLUMNS)))
+        return parts[0] if len(parts) == 1 else np.concatenate(parts)
+
+    def markets(self):
+        """本地已有历史的市场 [(exchange, symbol_dir, timeframe)]"""
+        found = []
+        for dirpath, _, filenames in os.walk(self.root):
+            if 'index.json' in filenames:
+                found.append(tuple(os.path.relpath(dirpath, self.root).split(os.sep)))
+        return sorted(found)
+
+    def close(self):
+        with self._lock:
+            for _, mm in self._writers.values():
+                mm.flush()
+            self._writers.clear()
+
+    def get_stats(self):
+        with self._lock:
+            return {'open_files': len(self._writers), **self.stats}
+
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def open_history_store(root: str):
+    """同一目录在进程内共用一个 HistoryStore，同步/异步交易所管理器与补数服务写同一份索引时共享锁"""
+    with _stores_lock:
+        store = _stores.get(root)
+        if store is None:
+            store = _stores[root] = HistoryStore(root)
+        return store
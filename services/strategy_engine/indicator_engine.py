@@ -0,0 +1,257 @@
+import time
+import threading
+import logging
+import numpy as np
+from strategies.indicators import WilderRsi
+from metrics import cache_requests, indicator_compute_seconds
+
+logger = logging.getLogger(__name__)
+
+
+class RsiAccumulator:
+    """Wilder RSI（params = (period,)）"""
+
+    def __init__(self, period: int):
+        self.rsi = WilderRsi(int(period))
+
+    def extend(self, closed):
+        for close in closed.close:
+            self.rsi.update(close)
+
+    @property
+    def value(self):
+        return self.rsi.value
+
+    def peek(self, candle):
+        return self.rsi.peek(candle.close)
+
+    def get_state(self):
+        return self.rsi.get_state()
+
+    def set_state(self, state) -> bool:
+        return self.rsi.set_state(state)
+
+    @classmethod
+    def warm_up_batch(cls, params_list, closed):
+        accumulators = []
+        for rsi in WilderRsi.warm_up_batch(closed.close, [int(period) for period, in params_list]):
+            accumulator = cls.__new__(cls)
+            accumulator.rsi = rsi
+            accumulators.append(accumulator)
+        return accumulators
+
+
+# 指标名 -> 流式累加器工厂 factory(*params)。累加器需实现：
+#   extend(closed): 按时间顺序推入新收盘的 K 线（Candles）
+#   value:          最后一根已完成 K 线处的指标值
+#   peek(candle):   以未完成 K 线（Candle）的当前价格计算临时值，不修改状态
+# 可选 warm_up_batch(params_list, closed)：用同一段 K 线一次预热多组参数（如 wilder_rsi_batch 的周期方向向量化），
+# 返回与 params_list 顺序一致的累加器，结果须与逐个 extend 相同
+# 可选 get_state() / set_state(state) -> bool：可 JSON 序列化的快照，用于策略状态检查点（见 IndicatorEngine.get_series_state）
+INDICATORS = {
+    'rsi': RsiAccumulator,
+}
+
+
+class _Entry:
+    __slots__ = ('lock', 'accumulator', 'last_ts', 'forming', 'forming_value')
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.accumulator = None
+        self.last_ts = None  # 累加器已推进到的最后一根已完成 K 线时间戳
+        self.forming = None  # 上次计算临时值时的未完成 K 线
+        self.forming_value = None
+
+
+class IndicatorEngine:
+    """
+    全引擎共享的指标缓存，按 (exchange, symbol, timeframe, 最后一根已完成 K 线时间戳, 指标, 参数) 取值：
+    - 每个 (market, 指标, 参数) 保存一个流式累加器，版本为它已推进到的已完成 K 线时间戳；
+      无论多少个策略、策略类请求同一个键，每根 K 线收盘后只计算一次
+    - 新 K 线收盘时只把窗口中比缓存版本新的已完成 K 线推入累加器（增量延伸，O(新 K 线数)），
+      首次请求或窗口与缓存版本之间断档时用窗口内的已完成 K 线重新预热
+    - 需要预热时，同一 (market, 指标) 上其他已登记、尚未预热的参数用同一段 K 线一次批量预热
+    - 未完成 K 线处的值由累加器 peek 得出，按该 K 线的最新状态缓存
+    指标值从首次预热起逐根延伸，不随各策略的窗口长度变化；回测中对应的向量化实现见各策略的 backtest_signals()。
+    """
+
+    def __init__(self):
+        self._entries = {}  # {(market, name, params): _Entry}
+        self._lock = threading.Lock()
+        # warmups: 预热的序列数，其中 batched 个是随同一 (market, 指标) 上其他参数的请求一起批量预热的
+        self.stats = {'hits': 0, 'extended': 0, 'warmups': 0, 'batched': 0, 'stale': 0}
+
+    def set_requirements(self, requirements):
+        """由主循环每轮调用：登记所有运行中策略需要的指标（预热时据此批量处理同一序列的各组参数），丢弃已无策略使用的累加器"""
+        keys = {(req.market, req.name, tuple(req.params)) for req in requirements}
+        with self._lock:
+            for key in list(self._entries):
+                if key not in keys:
+                    del self._entries[key]
+            for key in keys:
+                if key not in self._entries:
+                    self._entries[key] = _Entry()
+
+    def _get_entry(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                entry = self._entries[key] = _Entry()
+            return entry
+
+    def _count(self, stat: str, result: str):
+        with self._lock:
+            self.stats[stat] += 1
+        cache_requests('indicator', result).inc()
+
+    def _warm_up(self, name: str, params_list, closed):
+        """用 closed 预热 params_list 中的每组参数，返回对应的累加器列表"""
+        started = time.perf_counter()
+        factory = INDICATORS[name]
+        warm_up_batch = getattr(factory, 'warm_up_batch', None)
+        if warm_up_batch is not None:
+            accumulators = warm_up_batch(params_list, closed)
+        else:
+            accumulators = []
+            for params in params_list:
+                accumulator = factory(*params)
+                accumulator.extend(closed)
+                accumulators.append(accumulator)
+        indicator_compute_seconds(name).observe(time.perf_counter() - started)
+        return accumulators
+
+    def _claim_siblings(self, market, name: str, params: tuple):
+        """
+        同一 (market, 指标) 上其他已登记但尚未预热的参数，返回 [(params, entry)]，各 entry 的锁已由本线程持有。
+        只尝试非阻塞加锁，正被其他线程使用的跳过（由它自己预热），不会死锁。
+        断档的参数不在此列：它们的策略窗口可能更长，由各自请求时按自己的窗口重新预热。
+        """
+        with self._lock:
+            candidates = [
+                (key[2], entry) for key, entry in self._entries.items()
+                if key[0] == market and key[1] == name and key[2] != params
+            ]
+        siblings = []
+        for sibling_params, sibling in candidates:
+            if not sibling.lock.acquire(blocking=False):
+                continue
+            if sibling.accumulator is None:
+                siblings.append((sibling_params, sibling))
+            else:
+                sibling.lock.release()
+        return siblings
+
+    def _advance(self, entry: _Entry, market, name: str, params: tuple, candles):
+        """
+        返回推进到 candles 最后一根已完成 K 线的累加器（调用方持有 entry.lock）。
+        窗口比缓存版本旧时（例如落后的数据）临时计算并返回 (累加器, False)，不覆盖缓存。
+        """
+        closed_ts = candles.timestamp[:-1]
+        last_ts = int(closed_ts[-1])
+        if entry.accumulator is not None:
+            if entry.last_ts == last_ts:
+                self._count('hits', 'hit')
+                return entry.accumulator, True
+            if entry.last_ts > last_ts:
+                self._count('stale', 'stale')
+                return self._warm_up(name, [params], candles.closed())[0], False
+            pos = int(np.searchsorted(closed_ts, entry.last_ts))
+            if pos < len(closed_ts) and closed_ts[pos] == entry.last_ts:
+                started = time.perf_counter()
+                entry.accumulator.extend(candles[pos + 1:-1])
+                indicator_compute_seconds(name).observe(time.perf_counter() - started)
+                entry.last_ts = last_ts
+                self._count('extended', 'extended')
+                return entry.accumulator, True
+        # 首次请求，或缓存版本已不在窗口内（断档）：用窗口重新预热，同一序列上其他尚未预热的参数一并批量预热
+        siblings = self._claim_siblings(market, name, params)
+        targets = [(params, entry)] + siblings
+        try:
+            accumulators = self._warm_up(name, [p for p, _ in targets], candles.closed())
+            for (_, target), accumulator in zip(targets, accumulators):
+                target.accumulator = accumulator
+                target.last_ts = last_ts
+                target.forming = None
+        finally:
+            for _, sibling in siblings:
+                sibling.lock.release()
+        with self._lock:
+            self.stats['warmups'] += len(targets)
+            self.stats['batched'] += len(siblings)
+        cache_requests('indicator', 'warmup').inc()
+        return entry.accumulator, True
+
+    def get(self, market, name: str, params: tuple, candles):
+        """
+        candles（最后一根为未完成 K 线）末尾处的 name(params) 指标值；
+        K 线不足（没有已完成 K 线或累加器尚未就绪）时为 NaN。
+        """
+        if len(candles) < 2:
+            return float('nan')
+        params = tuple(params)
+        entry = self._get_entry((market, name, params))
+        forming = candles[-1]
+        with entry.lock:
+            accumulator, cached = self._advance(entry, market, name, params, candles)
+            if not cached:
+                return accumulator.peek(forming)
+            if entry.forming != forming:
+                entry.forming = forming
+                entry.forming_value = accumulator.peek(forming)
+            return entry.forming_value
+
+    def get_closed(self, market, name: str, params: tuple, candles):
+        """最后一根已完成 K 线处的 name(params) 指标值"""
+        if len(candles) < 2:
+            return float('nan')
+        params = tuple(params)
+        entry = self._get_entry((market, name, params))
+        with entry.lock:
+            accumulator, _ = self._advance(entry, market, name, params, candles)
+            return accumulator.value
+
+    def get_series_state(self, market, name: str, params: tuple):
+        """
+        (market, 指标, 参数) 累加器的可 JSON 序列化快照 {'name', 'params', 'last_ts', 'state'}，
+        由使用它的策略写入自己的状态检查点；尚未预热或累加器不支持快照时返回 None
+        """
+        params = tuple(params)
+        with self._lock:
+            entry = self._entries.get((market, name, params))
+        if entry is None:
+            return None
+        with entry.lock:
+            accumulator = entry.accumulator
+            if accumulator is None or not hasattr(accumulator, 'get_state'):
+                return None
+            return {'name': name, 'params': list(params), 'last_ts': int(entry.last_ts), 'state': accumulator.get_state()}
+
+    def restore_series(self, market, name: str, params: tuple, snapshot) -> bool:
+        """
+        用 get_series_state() 的快照恢复尚未预热的累加器，返回是否恢复。
+        已在运行的累加器（其他策略已在使用同一序列）不覆盖；快照的指标或参数与请求不同时忽略。
+        恢复后下一个窗口包含 last_ts 时增量延伸，否则（停机期间断档）仍按窗口重新预热。
+        """
+        params = tuple(params)
+        if not snapshot or snapshot.get('name') != name or tuple(snapshot.get('params') or ()) != params:
+            return False
+        factory = INDICATORS.get(name)
+        if factory is None or not hasattr(factory, 'set_state'):
+            return False
+        entry = self._get_entry((market, name, params))
+        with entry.lock:
+            if entry.accumulator is not None:
+                return False
+            accumulator = factory(*params)
+            if not accumulator.set_state(snapshot.get('state')):
+                return False
+            entry.accumulator = accumulator
+            entry.last_ts = int(snapshot['last_ts'])
+            entry.forming = None
+        return True
+
+    def get_stats(self):
+        """获取指标缓存统计：series 为登记的 (market, 指标, 参数) 数"""
+        with self._lock:
+            return {'series': len(self._entries), **self.stats}
@@ -1,19 +1,36 @@
 import time
+
+ENGINE_STARTED_AT = time.monotonic()  # 用于统计冷启动到首个 tick 的耗时
+
+import asyncio
 import logging
 import sys
 import json
 import redis
 from sqlalchemy import text
-from database import SessionLocal
+from database import SessionLocal, engine as db_engine
 from exchange import exchange_manager
 from config import settings
-from models import Signal
 import models
-from strategies.rsi_strategy import RsiStrategy, set_cache_manager as set_rsi_cache_manager
-from strategies.btc_5down_strategy import BtcFiveDownStrategy, set_cache_manager as set_btc_cache_manager
-from concurrent.futures import ThreadPoolExecutor, as_completed
-import threading
-from functools import lru_cache
+from strategies.registry import strategy_registry, UnknownStrategyError
+from strategies.base import BaseStrategy, StrategyConfigError
+from tick_planner import TickPlanner
+from indicator_engine import IndicatorEngine
+from scheduler import CandleScheduler
+from worker_pool import StrategyWorkerPool
+from async_exchange import AsyncExchangeManager
+from sharding import ShardCoordinator, strategy_shard_key
+from signal_sink import SignalSink
+from outbox_relay import OutboxRelay
+from strategy_sync import StrategyChangeListener
+from state_store import StrategyStateStore
+from backfill import HistoryBackfill
+from metrics import CACHE_BYTES, CACHE_ENTRIES, loop_lag_seconds, on_tick_seconds, start_metrics
+from cache_manager import CacheManager
+from candle_store import timeframe_to_ms
+import functools
+import atexit
+import signal
 
 # Configure logging
 logging.basicConfig(
@@ -23,97 +40,26 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-# ==================== 缓存配置 ====================
-class CacheManager:
-    """管理各类缓存，减少重复数据访问，支持多交易所"""
-    def __init__(self):
-        # {exchange:symbol: data}  例如: "binance:BTC/USDT": ohlcv_data
-        self.market_data_cache = {}  
-        self.strategy_config_cache = {}  # {strategy_id: config_dict}
-        self.cache_ttl = {
-            'market_data': 30,  # 市场数据缓存 30 秒
-            'strategy_config': 300,  # 策略配置缓存 5 分钟
-        }
-        self.last_cache_update = {
-            'market_data': {},
-            'strategy_config': {},
-        }
-    
-    def _make_cache_key(self, exchange: str, symbol: str, timeframe: str = None):
-        """生成缓存键，支持多交易所"""
-        if timeframe:
-            return f"{exchange}:{symbol}:{timeframe}"
-        return f"{exchange}:{symbol}"
-    
-    def get_cache(self, cache_type: str, exchange: str, symbol: str, timeframe: str = None):
-        """获取缓存，如果过期则返回None"""
-        if cache_type == 'market_data':
-            cache = self.market_data_cache
-            last_update = self.last_cache_update['market_data']
-            ttl = self.cache_ttl['market_data']
-            key = self._make_cache_key(exchange, symbol, timeframe)
-        elif cache_type == 'strategy_config':
-            cache = self.strategy_config_cache
-            last_update = self.last_cache_update['strategy_config']
-            ttl = self.cache_ttl['strategy_config']
-            key = f"{exchange}:{symbol}" if exchange else symbol
-        else:
-            return None
-        
-        if key in cache:
-            if time.time() - last_update.get(key, 0) < ttl:
-                return cache[key]
-            else:
-                # 缓存过期，删除
-                del cache[key]
-                if key in last_update:
-                    del last_update[key]
-        
-        return None
-    
-    def set_cache(self, cache_type: str, exchange: str, symbol: str, value, timeframe: str = None):
-        """设置缓存"""
-        if cache_type == 'market_data':
-            cache = self.market_data_cache
-            last_update = self.last_cache_update['market_data']
-            key = self._make_cache_key(exchange, symbol, timeframe)
-        elif cache_type == 'strategy_config':
-            cache = self.strategy_config_cache
-            last_update = self.last_cache_update['strategy_config']
-            key = f"{exchange}:{symbol}" if exchange else symbol
-        else:
-            return
-        
-        cache[key] = value
-        last_update[key] = time.time()
-    
-    def clear_expired(self):
-        """清理过期缓存"""
-        current_time = time.time()
-        
-        # 清理市场数据缓存
-        for key in list(self.market_data_cache.keys()):
-            if current_time - self.last_cache_update['market_data'].get(key, 0) >= self.cache_ttl['market_data']:
-                del self.market_data_cache[key]
-                if key in self.last_cache_update['market_data']:
-                    del self.last_cache_update['market_data'][key]
-        
-        # 清理策略配置缓存
-        for key in list(self.strategy_config_cache.keys()):
-            if current_time - self.last_cache_update['strategy_config'].get(key, 0) >= self.cache_ttl['strategy_config']:
-                del self.strategy_config_cache[key]
-                if key in self.last_cache_update['strategy_config']:
-                    del self.last_cache_update['strategy_config'][key]
-    
-    def get_cache_size(self):
-        """获取缓存大小统计"""
-        return {
-            'market_data': len(self.market_data_cache),
-            'strategy_config': len(self.strategy_config_cache),
-            'total': len(self.market_data_cache) + len(self.strategy_config_cache)
-        }
-
-cache_manager = CacheManager()
+# 行情窗口缓存：TTL + LRU，按字节预算限制总大小
+cache_manager = CacheManager(
+    ttls={'market_data': settings.MARKET_DATA_CACHE_TTL},
+    max_bytes=settings.CACHE_MAX_BYTES
+)
+CACHE_ENTRIES.set_function(lambda: len(cache_manager))
+CACHE_BYTES.set_function(lambda: cache_manager.bytes)
+indicator_engine = IndicatorEngine()
+# 行情拉取与单个策略 tick 共用软截止预算：超过的市场本轮跳过，不拖住主循环
+tick_planner = TickPlanner(exchange_manager.candle_store, cache_manager, indicator_engine, fetch_timeout=settings.TICK_SOFT_TIMEOUT)
+scheduler = CandleScheduler(
+    exchange_manager,
+    settle_delay=settings.SCHEDULER_SETTLE_DELAY,
+    clock_sync_interval=settings.CLOCK_SYNC_INTERVAL
+)
+worker_pool = StrategyWorkerPool(
+    max_workers=settings.ENGINE_WORKERS,
+    soft_timeout=settings.TICK_SOFT_TIMEOUT,
+    hard_timeout=settings.TICK_HARD_TIMEOUT
+)
 
 # Redis Connection
 try:
@@ -123,54 +69,128 @@ except Exception as e:
     logger.error(f"Failed to connect to Redis: {e}")
     redis_client = None
 
+# 策略状态检查点：定期和退出时保存到 Redis，启动策略时恢复
+state_store = StrategyStateStore(redis_client, candle_tail=settings.STATE_CANDLE_TAIL)
+engine_candle_store = exchange_manager.candle_store  # 当前引擎模式使用的 K 线存储，异步模式启动时替换
+_last_checkpoint = 0.0
+
+# 本地历史补数：定期检查引擎正在使用的市场的历史缺口并分页补齐（回放模式下没有需要补数的市场）
+history_backfill = HistoryBackfill(
+    exchange_manager,
+    exchange_manager.history_store,
+    lambda: engine_candle_store.markets() if engine_candle_store is not None else [],
+    interval=settings.HISTORY_BACKFILL_INTERVAL,
+    lookback_days=settings.HISTORY_BACKFILL_DAYS,
+    page_limit=settings.HISTORY_BACKFILL_PAGE_LIMIT,
+    max_pages=settings.HISTORY_BACKFILL_MAX_PAGES
+)
+
+# 策略变更监听：admin 修改策略时通过 NOTIFY 唤醒主循环，只拉取变化的行
+strategy_listener = StrategyChangeListener(db_engine)
+
+# 信号发件箱中继：把已提交的信号批量转发到 Redis Stream（至少一次投递，消费端按幂等键去重）
+outbox_relay = OutboxRelay(
+    SessionLocal,
+    redis_client,
+    stream=settings.SIGNAL_STREAM,
+    maxlen=settings.SIGNAL_STREAM_MAXLEN,
+    poll_interval=settings.OUTBOX_POLL_INTERVAL,
+    retention_hours=settings.OUTBOX_RETENTION_HOURS
+)
+
+# 信号写后队列：Signal 与发件箱同一事务批量落库，数据库不可用时退避重试，仍失败的直接发布；进程退出时写完队列
+signal_sink = SignalSink(
+    SessionLocal,
+    outbox_relay,
+    max_queue=settings.SIGNAL_QUEUE_SIZE,
+    batch_size=settings.SIGNAL_BATCH_SIZE,
+    flush_interval=settings.SIGNAL_FLUSH_INTERVAL,
+    retry_delay=settings.SIGNAL_RETRY_DELAY,
+    max_retries=settings.SIGNAL_MAX_RETRIES
+)
+# atexit 后注册先执行：先写完信号队列，再转发剩余的发件箱记录
+atexit.register(outbox_relay.stop)
+atexit.register(signal_sink.stop)
+
+# 多副本分片：只运行一致性哈希分配给本节点的策略
+shard_coordinator = None
+if settings.SHARDING_ENABLED and redis_client:
+    shard_coordinator = ShardCoordinator(
+        redis_client,
+        node_id=settings.SHARD_NODE_ID or None,
+        heartbeat_interval=settings.SHARD_HEARTBEAT_INTERVAL,
+        node_ttl=settings.SHARD_NODE_TTL,
+        vnodes=settings.SHARD_VNODES,
+        on_change=strategy_listener.event.set
+    )
+
 def handle_signal(signal_data):
     """
     Callback function to handle signals generated by strategies.
-    1. Save to Database
-    2. Publish to Redis
+    信号放入写后队列，由 signal_sink 与发件箱同一事务批量写入数据库，再由 outbox_relay 转发到 Redis Stream，不阻塞策略线程。
     """
     logger.info(f"Processing Signal: {signal_data}")
-    
-    # 1. Save to Database
-    db = SessionLocal()
+    signal_sink.submit(signal_data)
+
+def run_tick(strategy, market_data):
+    """在策略线程中执行一次 on_tick，按策略类记录耗时"""
+    started = time.perf_counter()
     try:
-        signal = Signal(
-            strategy_id=signal_data['strategy_id'],
-            symbol=signal_data['symbol'],
-            side=signal_data['side'],
-            price=signal_data['price'],
-            reason=signal_data['reason']
-        )
-        db.add(signal)
-        db.commit()
-        logger.info(f"Signal saved to DB: ID {signal.id}")
-    except Exception as e:
-        logger.error(f"Failed to save signal to DB: {e}")
+        strategy.on_tick(market_data)
     finally:
-        db.close()
+        on_tick_seconds(type(strategy).__name__).observe(time.perf_counter() - started)
 
-    # 2. Publish to Redis
-    if redis_client:
-        try:
-            redis_client.publish('strategy_signals', json.dumps(signal_data))
-            logger.info("Signal published to Redis channel 'strategy_signals'")
-        except Exception as e:
-            logger.error(f"Failed to publish signal to Redis: {e}")
+async def run_tick_async(strategy, handler, *args):
+    """执行一次异步入口（on_tick_async / on_candle_close），按策略类记录耗时（同步策略含等待线程的时间）"""
+    started = time.perf_counter()
+    try:
+        await handler(*args)
+    finally:
+        on_tick_seconds(type(strategy).__name__).observe(time.perf_counter() - started)
 
-def _start_strategy(s_db, running_strategies):
+def run_round(running_strategies, due_markets, planner=None, pool=None, tick=run_tick):
+    """
+    执行一轮：挑选时间周期刚刚收盘的策略，按所有运行中策略登记指标需求，每个市场只按最大回看长度拉取一次，
+    再在常驻线程池中并发执行 tick(strategy, market_data)。返回本轮执行的策略数。
+    planner / pool 默认为模块级的 tick_planner / worker_pool，基准测试传入自己的实例。
+    """
+    planner = planner or tick_planner
+    pool = pool or worker_pool
+    due_strategies = get_due_strategies(running_strategies, due_markets)
+    if not due_strategies:
+        return 0
+    # 指标缓存按所有运行中策略登记，未到期周期的累加器保留到下次收盘
+    planner.plan_indicators([s_entry['instance'] for s_entry in running_strategies.values()])
+    market_data = planner.prepare([s_entry['instance'] for s_entry in due_strategies.values()])
+    # 每个策略有软/硬截止时间，单个策略卡住不会拖住主循环
+    pool.run({
+        strategy_id: functools.partial(tick, s_entry['instance'], market_data)
+        for strategy_id, s_entry in due_strategies.items()
+    })
+    return len(due_strategies)
+
+def restore_candles(strategy):
+    """用检查点中的 K 线尾部预填策略用到的空缓冲区，重启后只需增量拉取"""
+    if engine_candle_store is None:
+        return
+    markets = {req.market for req in strategy.get_data_requirements()}
+    for market, rows in state_store.load_candles(markets).items():
+        engine_candle_store.restore(*market, rows)
+
+def checkpoint_state(running_strategies, force: bool = False):
+    """保存策略状态检查点（两次之间至少间隔 STATE_CHECKPOINT_INTERVAL 秒，force 时立即保存）"""
+    global _last_checkpoint
+    if not force and time.monotonic() - _last_checkpoint < settings.STATE_CHECKPOINT_INTERVAL:
+        return
+    _last_checkpoint = time.monotonic()
+    state_store.save(running_strategies, engine_candle_store)
+
+def _start_strategy(s_db, running_strategies, state=None):
+    """创建并启动策略；state 为修改配置时旧实例的状态，为空时从检查点恢复"""
     try:
-        config = json.loads(s_db.config_json)
-        
-        # Map strategy names to classes
-        strategy_classes = {
-            'RSI Strategy': RsiStrategy,
-            'BTC 5连阴策略': BtcFiveDownStrategy,
-            'btc_5down': BtcFiveDownStrategy,
-        }
-        
-        # 获取策略类，默认使用 RsiStrategy
-        strategy_class = strategy_classes.get(s_db.name, RsiStrategy)
-        
+        # 按 config_json 中的 type（旧数据按名称）查找策略类并校验配置，未知类型直接报错，不再默认跑 RSI
+        strategy_class, config = strategy_registry.resolve(s_db.name, json.loads(s_db.config_json))
+
         strategy = strategy_class(
             strategy_id=s_db.id,
             name=s_db.name,
@@ -178,40 +198,233 @@ def _start_strategy(s_db, running_strategies):
             exchange=exchange_manager,
             signal_callback=handle_signal
         )
-        
-        # 为策略初始化缓存管理器
-        if strategy_class == RsiStrategy:
-            set_rsi_cache_manager(cache_manager)
-        elif strategy_class == BtcFiveDownStrategy:
-            set_btc_cache_manager(cache_manager)
+        strategy.indicator_engine = indicator_engine
+
+        if state is None:
+            state = state_store.load(s_db.id, strategy_class.__name__)
+            restore_candles(strategy)
+        if state:
+            strategy.restore_state(state)
+
         strategy.start()
         running_strategies[s_db.id] = {
             'instance': strategy,
-            'config_raw': s_db.config_json
+            'config_raw': s_db.config_json,
+            'version': s_db.version
         }
         logger.info(f"Started strategy: {s_db.name} (ID: {s_db.id}) using {strategy_class.__name__}")
+    except (UnknownStrategyError, StrategyConfigError) as e:
+        logger.error(f"❌ Strategy {s_db.name} (ID: {s_db.id}) not started: {e}")
     except Exception as e:
         logger.error(f"Failed to start strategy {s_db.name}: {e}", exc_info=True)
 
-def main():
-    logger.info("Strategy Engine Starting...")
-    # 1. Test Database Connection
+def _owns_strategy(s_db):
+    """策略是否应在本节点运行：已激活，且（开启分片时）分配给本节点"""
+    if not s_db.is_active:
+        return False
+    # 分给其他节点的策略视为未激活：本节点不启动，已在运行的（例如新节点加入后迁走的）会被停止
+    return not shard_coordinator or shard_coordinator.owns(strategy_shard_key(s_db.config_json, s_db.id))
+
+def _stop_strategy(s_id, running_strategies, handoff: bool = False):
+    """
+    停止策略。handoff=True 表示策略迁移到了其他节点：先保存状态供新节点恢复；
+    否则（停用或删除）清除其检查点。
+    """
+    if handoff:
+        logger.info(f"Strategy {s_id} moved to another shard. Stopping...")
+        state_store.save({s_id: running_strategies[s_id]}, engine_candle_store)
+    else:
+        logger.info(f"Strategy {s_id} deactivated or removed. Stopping...")
+        state_store.delete(s_id)
+    running_strategies[s_id]['instance'].stop()
+    del running_strategies[s_id]
+
+def _apply_strategy_row(s_db, running_strategies):
+    """按数据库中的一行启动、重启或停止对应策略"""
+    if not _owns_strategy(s_db):
+        if s_db.id in running_strategies:
+            _stop_strategy(s_db.id, running_strategies, handoff=s_db.is_active)
+        return
+
+    # Check if new
+    if s_db.id not in running_strategies:
+        logger.info(f"Found new strategy: {s_db.name}")
+        _start_strategy(s_db, running_strategies)
+
+    # Check if config changed
+    elif running_strategies[s_db.id]['version'] != s_db.version or running_strategies[s_db.id]['config_raw'] != s_db.config_json:
+        logger.info(f"Configuration changed for {s_db.name}. Restarting...")
+        old_strategy = running_strategies[s_db.id]['instance']
+        old_strategy.stop()
+        # 沿用旧实例的状态（去重标记、指标累加器），新实例按新配置自行判断哪些部分仍然有效
+        _start_strategy(s_db, running_strategies, state=old_strategy.get_state())
+
+_last_full_sync = 0.0
+_last_shard_generation = None
+
+def _needs_full_sync(resync_requested: bool) -> bool:
+    """监听断开（或数据库不支持 LISTEN）、重连后、分片成员变化或到达全量核对周期时需要全量同步"""
+    if resync_requested or not strategy_listener.connected:
+        return True
+    if shard_coordinator and shard_coordinator.generation != _last_shard_generation:
+        return True
+    return time.time() - _last_full_sync >= settings.STRATEGY_RECONCILE_INTERVAL
+
+def strategy_sync_timeout() -> float:
+    """
+    空闲等待中最多多少秒醒来同步策略：监听未连接（或数据库不支持 LISTEN）时按 STRATEGY_SYNC_INTERVAL 轮询；
+    已连接时变更通知、监听断开和分片成员变化都会置位 strategy_listener.event，只需在下一次全量核对时醒来
+    （同步失败后 _last_full_sync 归零，仍至少间隔 STRATEGY_SYNC_INTERVAL 重试）
+    """
+    if not strategy_listener.connected:
+        return settings.STRATEGY_SYNC_INTERVAL
+    return max(settings.STRATEGY_SYNC_INTERVAL, _last_full_sync + settings.STRATEGY_RECONCILE_INTERVAL - time.time())
+
+def sync_strategies(running_strategies):
+    """
+    从数据库同步策略：停止已停用的策略，启动新增的策略，配置变化（version 变化）的策略重启。
+    正常情况下只查询收到变更通知的策略；全量查询只在 _needs_full_sync() 时进行。
+    """
+    global _last_full_sync, _last_shard_generation
+    changed_ids, resync_requested = strategy_listener.take_changes()
+    full = _needs_full_sync(resync_requested)
+    if not full and not changed_ids:
+        return
+
+    db = None
+    try:
+        db = SessionLocal()
+        if full:
+            shard_generation = shard_coordinator.generation if shard_coordinator else None
+            rows = db.query(models.Strategy).filter(models.Strategy.is_active == True).all()
+            # Stop removed/deactivated strategies
+            for s_id in set(running_strategies) - {s.id for s in rows}:
+                _stop_strategy(s_id, running_strategies)
+            _last_full_sync = time.time()
+            _last_shard_generation = shard_generation
+        else:
+            rows = db.query(models.Strategy).filter(models.Strategy.id.in_(changed_ids)).all()
+            # 已被删除的策略
+            for s_id in (changed_ids - {s.id for s in rows}) & set(running_strategies):
+                _stop_strategy(s_id, running_strategies)
+
+        # Start new or Update existing strategies
+        for s_db in rows:
+            _apply_strategy_row(s_db, running_strategies)
+
+    except Exception as e:
+        logger.error(f"Error syncing strategies from DB: {e}")
+        # 本次变化没有处理成功，下一轮做一次全量同步
+        _last_full_sync = 0.0
+    finally:
+        if db:
+            db.close()
+
+def get_due_strategies(running_strategies, due_markets):
+    """只返回时间周期刚刚收盘的策略；due_markets 为 None 时（启动后首轮）返回全部"""
+    return {
+        strategy_id: s_entry for strategy_id, s_entry in running_strategies.items()
+        if due_markets is None or any(
+            (req.exchange, req.timeframe) in due_markets
+            for req in s_entry['instance'].get_data_requirements()
+        )
+    }
+
+def get_active_markets(running_strategies):
+    """所有运行中策略使用的 {(exchange, timeframe)}"""
+    return {
+        (req.exchange, req.timeframe)
+        for s_entry in running_strategies.values()
+        for req in s_entry['instance'].get_data_requirements()
+    }
+
+def log_periodic_stats(manager=exchange_manager):
+    """清理过期缓存并输出统计（manager 为当前模式使用的交易所管理器，用于输出限流排队情况）"""
+    cache_manager.clear_expired()
+    cache_stats = cache_manager.get_stats()
+    logger.info(
+        f"📊 Cache Stats - Entries: {cache_stats['entries']}, Size: {cache_stats['bytes'] / 2 ** 20:.1f}/{cache_stats['max_bytes'] / 2 ** 20:.0f}MB"
+        f" | Hit Ratio: {cache_stats['hit_ratio']:.1%} (Hits: {cache_stats['hits']}, Misses: {cache_stats['misses']}, Coalesced: {cache_stats['coalesced']})"
+        f" | Expired: {cache_stats['expired']}, Evicted: {cache_stats['evicted']}"
+    )
+    indicator_stats = indicator_engine.get_stats()
+    logger.info(
+        f"🧮 Indicator Cache - Series: {indicator_stats['series']}, Hits: {indicator_stats['hits']}"
+        f", Extended: {indicator_stats['extended']}, Warm-ups: {indicator_stats['warmups']} ({indicator_stats['batched']} batched)"
+        f", Stale: {indicator_stats['stale']}"
+    )
+    overruns = worker_pool.get_overrun_stats()
+    if overruns:
+        logger.info(f"⏱ Strategy Overruns: {overruns}")
+    sink_stats = signal_sink.get_stats()
+    logger.info(
+        f"📨 Signal Sink - Queue Depth: {sink_stats['queue_depth']}, Flushed: {sink_stats['flushed']}/{sink_stats['submitted']}"
+        f", Flush Latency avg/max: {sink_stats['flush_latency_avg'] * 1000:.1f}ms/{sink_stats['flush_latency_max'] * 1000:.1f}ms"
+        f", DB Errors: {sink_stats['db_errors']}"
+    )
+    relay_stats = outbox_relay.get_stats()
+    logger.info(
+        f"📤 Outbox Relay - Relayed: {relay_stats['relayed']} in {relay_stats['batches']} batches"
+        f", Max Latency: {relay_stats['relay_latency_max'] * 1000:.1f}ms, Errors: {relay_stats['errors']}"
+    )
+    backfill_stats = history_backfill.get_stats()
+    logger.info(
+        f"🩹 History Backfill - Rounds: {backfill_stats['rounds']}, Pages: {backfill_stats['pages']}"
+        f", Candles: {backfill_stats['candles']}, Open Gaps: {backfill_stats['open_gaps']}, Fetch Errors: {backfill_stats['fetch_errors']}"
+    )
+    for exchange_name, stats in manager.rate_limiter.get_stats().items():
+        logger.info(
+            f"🚦 Rate Limit {exchange_name} - Requests: {stats['requests']}, Weight: {stats['weight']}, Throttled: {stats['throttled']}"
+            f", Queue Delay avg/max: {stats['wait_avg']:.3f}s/{stats['wait_max']:.3f}s, Bans: {stats['bans']}"
+        )
+
+_first_tick_done = False
+
+def log_cold_start(**details):
+    """首轮策略执行结束后记录一次冷启动耗时（进程启动 → 首个 tick 完成）"""
+    global _first_tick_done
+    if _first_tick_done:
+        return
+    _first_tick_done = True
+    extra = ''.join(f", {key}={value}" for key, value in details.items())
+    logger.info(f"🚀 Cold start to first tick: {time.monotonic() - ENGINE_STARTED_AT:.2f}s{extra}")
+
+def start_background_services():
+    """启动指标端点、分片心跳、策略变更监听、发件箱中继与历史补数（三种引擎模式共用）"""
+    start_metrics(settings.METRICS_PORT, settings.LOG_SAMPLE_EVERY)
+    BaseStrategy.tick_log_every = max(1, settings.LOG_SAMPLE_EVERY)
+    if shard_coordinator:
+        shard_coordinator.start()
+    strategy_listener.start()
+    outbox_relay.start()
+    history_backfill.start()
+
+def check_database():
+    """测试数据库连接"""
     try:
         db = SessionLocal()
         db.execute(text("SELECT 1"))
         logger.info("Database connection successful")
         db.close()
+        return True
     except Exception as e:
         logger.error(f"Database connection failed: {e}")
+        return False
+
+def main():
+    logger.info("Strategy Engine Starting...")
+    # 1. Test Database Connection
+    if not check_database():
         return
 
-    # 2. Test Exchange Connection
-    if exchange_manager.exchange:
-        logger.info("Exchange connection initialized")
-    else:
-        logger.warning("Exchange connection failed or not configured")
+    start_background_services()
+
+    # 2. 后台并行预热交易所连接（首次使用时也会按需初始化，不阻塞启动）
+    exchange_manager.warm_up()
 
     running_strategies = {} # {id: {'instance': strategy_obj, 'config_raw': str}}
+    due_markets = None  # 上次唤醒时刚收盘的 {(exchange, timeframe)}，None 表示启动后首轮全部执行
+    atexit.register(checkpoint_state, running_strategies, force=True)
 
     # 4. Main Loop
     logger.info("Entering Main Loop...")
@@ -219,64 +432,182 @@ def main():
     while True:
         loop_count += 1
         
-        # 定期清理过期缓存（每 5 分钟清理一次）
+        # 定期清理过期缓存（每 5 轮清理一次）
         if loop_count % 5 == 0:
-            cache_manager.clear_expired()
-            cache_stats = cache_manager.get_cache_size()
-            logger.info(f"📊 Cache Stats - Market Data: {cache_stats['market_data']}, Strategy Config: {cache_stats['strategy_config']}, Total: {cache_stats['total']}")
+            log_periodic_stats()
         
         # --- Dynamic Strategy Loading ---
-        try:
-            db = SessionLocal()
-            active_db_strategies = db.query(models.Strategy).filter(models.Strategy.is_active == True).all()
-            
-            active_ids = {s.id for s in active_db_strategies}
-            current_ids = set(running_strategies.keys())
-
-            # 1. Stop removed/deactivated strategies
-            for s_id in current_ids - active_ids:
-                logger.info(f"Strategy {s_id} deactivated or removed. Stopping...")
-                running_strategies[s_id]['instance'].stop()
-                del running_strategies[s_id]
-
-            # 2. Start new or Update existing strategies
-            for s_db in active_db_strategies:
-                # Check if new
-                if s_db.id not in running_strategies:
-                    logger.info(f"Found new strategy: {s_db.name}")
-                    _start_strategy(s_db, running_strategies)
-                
-                # Check if config changed
-                elif running_strategies[s_db.id]['config_raw'] != s_db.config_json:
-                    logger.info(f"Configuration changed for {s_db.name}. Restarting...")
-                    running_strategies[s_db.id]['instance'].stop()
-                    _start_strategy(s_db, running_strategies)
-                    
-        except Exception as e:
-            logger.error(f"Error syncing strategies from DB: {e}")
-        finally:
-            db.close()
+        sync_strategies(running_strategies)
 
         if not running_strategies:
             logger.warning("No active strategies running.")
-        else:
-            # --- Run Logic (Parallel Execution) ---
-            # 使用线程池并发执行所有策略,避免单个策略卡住整个引擎
-            with ThreadPoolExecutor(max_workers=min(len(running_strategies), 10)) as executor:
-                futures = {}
-                for strategy_id, s_entry in running_strategies.items():
-                    future = executor.submit(s_entry['instance'].on_tick)
-                    futures[future] = strategy_id
-                
-                # 等待所有策略执行完成（设置超时）
-                for future in as_completed(futures, timeout=50):
-                    strategy_id = futures[future]
-                    try:
-                        future.result()
-                    except Exception as e:
-                        logger.error(f"Error in strategy {strategy_id} tick: {e}")
-
-        time.sleep(60) # Loop every minute
+        # --- Plan & Run: 只执行时间周期刚刚收盘的策略，行情每个市场拉取一次，常驻线程池并发执行 ---
+        elif run_round(running_strategies, due_markets):
+            log_cold_start(exchange_init={k: round(v, 2) for k, v in exchange_manager.init_durations.items()})
+            checkpoint_state(running_strategies)
+
+        # 睡眠到下一根 K 线收盘（按交易所服务器时间对齐），收到策略变更通知时立即醒来；
+        # 只有监听未连接时才每 STRATEGY_SYNC_INTERVAL 秒醒来轮询一次（见 strategy_sync_timeout）
+        due_markets = scheduler.wait(
+            get_active_markets(running_strategies),
+            max_wait=strategy_sync_timeout(),
+            wake_event=strategy_listener.event
+        )
+
+async def main_async():
+    """
+    asyncio 引擎模式（ENGINE_MODE=async）：
+    行情与校时请求全部走 ccxt.async_support，每个交易所共享一个 HTTP 会话并限制并发，
+    策略通过 on_tick_async 执行（同步策略由 BaseStrategy 适配到线程中运行）。
+    """
+    logger.info("Strategy Engine Starting (asyncio mode)...")
+    if not await asyncio.to_thread(check_database):
+        return
+
+    start_background_services()
+
+    async_exchange_manager = AsyncExchangeManager(
+        max_concurrency=settings.EXCHANGE_MAX_CONCURRENCY,
+        rate_limiter=exchange_manager.rate_limiter  # 历史补数走同步管理器，共用同一份限流预算
+    )
+    await async_exchange_manager.init()
+    async_planner = TickPlanner(async_exchange_manager.candle_store, indicator_engine=indicator_engine, fetch_timeout=settings.TICK_SOFT_TIMEOUT)
+    global engine_candle_store
+    engine_candle_store = async_exchange_manager.candle_store
+    async_scheduler = CandleScheduler(
+        async_exchange_manager,
+        settle_delay=settings.SCHEDULER_SETTLE_DELAY,
+        clock_sync_interval=settings.CLOCK_SYNC_INTERVAL
+    )
+
+    running_strategies = {} # {id: {'instance': strategy_obj, 'config_raw': str}}
+    due_markets = None
+    atexit.register(checkpoint_state, running_strategies, force=True)
+
+    logger.info("Entering Main Loop (asyncio)...")
+    loop_count = 0
+    try:
+        while True:
+            loop_count += 1
+            if loop_count % 5 == 0:
+                log_periodic_stats(async_exchange_manager)
+
+            # 数据库访问是阻塞的，放到线程中执行
+            await asyncio.to_thread(sync_strategies, running_strategies)
+            due_strategies = get_due_strategies(running_strategies, due_markets)
+
+            if not running_strategies:
+                logger.warning("No active strategies running.")
+            elif due_strategies:
+                async_planner.plan_indicators([s_entry['instance'] for s_entry in running_strategies.values()])
+                market_data = await async_planner.prepare_async([s_entry['instance'] for s_entry in due_strategies.values()])
+                await worker_pool.run_async({
+                    strategy_id: functools.partial(run_tick_async, s_entry['instance'], s_entry['instance'].on_tick_async, market_data)
+                    for strategy_id, s_entry in due_strategies.items()
+                })
+                log_cold_start()
+                await asyncio.to_thread(checkpoint_state, running_strategies)
+
+            due_markets = await async_scheduler.wait_async(
+                get_active_markets(running_strategies),
+                max_wait=strategy_sync_timeout(),
+                wake_event=strategy_listener.event
+            )
+    finally:
+        await async_exchange_manager.close()
+
+async def main_stream():
+    """
+    推送模式（ENGINE_MODE=stream）：
+    行情由数据源（交易所 websocket 或本地回放服务）以 K 线收盘事件推送，推入 K 线缓冲区后立即执行订阅该市场的策略，不再轮询。
+    """
+    logger.info(f"Strategy Engine Starting (stream mode, source={settings.MARKET_DATA_SOURCE})...")
+    if not await asyncio.to_thread(check_database):
+        return
+
+    start_background_services()
+
+    async_exchange_manager = AsyncExchangeManager(
+        max_concurrency=settings.EXCHANGE_MAX_CONCURRENCY,
+        rate_limiter=exchange_manager.rate_limiter  # 历史补数走同步管理器，共用同一份限流预算
+    )
+    source = async_exchange_manager.create_market_data_source(settings.MARKET_DATA_SOURCE, settings.REPLAY_URL)
+    if source.seed_from_rest:
+        await async_exchange_manager.init()
+    candle_store = async_exchange_manager.candle_store
+    stream_planner = TickPlanner(candle_store, indicator_engine=indicator_engine)
+    # 回放数据源推送的是历史 K 线，不能用检查点中更新的 K 线预填缓冲区
+    global engine_candle_store
+    engine_candle_store = candle_store if source.seed_from_rest else None
+    if not source.seed_from_rest:
+        candle_store.history = None  # 回放数据不写入本地历史
+
+    running_strategies = {} # {id: {'instance': strategy_obj, 'config_raw': str}}
+    atexit.register(checkpoint_state, running_strategies, force=True)
+    seeded_markets = set()
+    last_dispatch = {}  # {market: asyncio.Task}，同一市场的事件按顺序执行
+
+    async def sync_loop():
+        """定期同步策略并更新订阅；新市场先通过 REST 拉取历史 K 线"""
+        while True:
+            await asyncio.to_thread(sync_strategies, running_strategies)
+            strategies = [s_entry['instance'] for s_entry in running_strategies.values()]
+            stream_planner.plan_indicators(strategies)
+            plan = stream_planner.plan(strategies)
+            if source.seed_from_rest:
+                new_markets = {market: lookback for market, lookback in plan.items() if market not in seeded_markets}
+                seeded_markets.update((await stream_planner.fetch_async(new_markets)).keys())
+            await source.subscribe(set(plan))
+            # 收到策略变更通知时提前醒来；监听已连接时只在全量核对时定时醒来
+            await strategy_listener.event.wait_async(strategy_sync_timeout())
+
+    async def dispatch(event, market_data, subscribers, previous):
+        if previous is not None:
+            await previous
+        await worker_pool.run_async({
+            strategy_id: functools.partial(run_tick_async, s_entry['instance'], s_entry['instance'].on_candle_close, event, market_data)
+            for strategy_id, s_entry in subscribers.items()
+        })
+        log_cold_start()
+        checkpoint_state(running_strategies)
+
+    sync_task = asyncio.create_task(sync_loop())
+    logger.info("Waiting for candle events...")
+    try:
+        async for event in source.events():
+            market = event.market
+            candle_store.push(*market, [event.closed] + ([event.forming] if event.forming else []))
+            if source.seed_from_rest:
+                # 实时行情：收盘事件到达比 K 线收盘晚了多少（回放的是历史 K 线，不统计）
+                close_ms = event.closed[0] + timeframe_to_ms(event.timeframe)
+                loop_lag_seconds('stream').observe(max(0.0, time.time() - close_ms / 1000))
+
+            lookbacks = {
+                strategy_id: req.lookback
+                for strategy_id, s_entry in running_strategies.items()
+                for req in s_entry['instance'].get_data_requirements()
+                if req.market == market
+            }
+            if not lookbacks:
+                continue
+            subscribers = {strategy_id: running_strategies[strategy_id] for strategy_id in lookbacks}
+            # 窗口在事件到达时复制一份，后续推送不会影响本次执行
+            market_data = {market: candle_store.get_buffered_window(*market, max(lookbacks.values()))}
+            last_dispatch[market] = asyncio.create_task(
+                dispatch(event, market_data, subscribers, last_dispatch.get(market))
+            )
+    finally:
+        sync_task.cancel()
+        await asyncio.gather(*last_dispatch.values(), return_exceptions=True)
+        await source.close()
+        await async_exchange_manager.close()
 
 if __name__ == "__main__":
-    main()
+    # docker stop 发送 SIGTERM：转为正常退出，让 atexit 和 finally 中的清理（写完信号队列等）得以执行
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    if settings.ENGINE_MODE == 'async':
+        asyncio.run(main_async())
+    elif settings.ENGINE_MODE == 'stream':
+        asyncio.run(main_stream())
+    else:
+        main()
@@ -0,0 +1,75 @@
+import json
+import os
+import time
+import logging
+import ccxt
+
+logger = logging.getLogger(__name__)
+
+# 缓存文件格式版本，文件结构变化时递增，旧文件会被忽略
+CACHE_FORMAT_VERSION = 1
+
+
+class MarketMetadataCache:
+    """
+    交易所市场元数据（load_markets 的结果）的本地文件缓存：
+    重启时直接从文件恢复 markets/currencies，跳过耗时的 load_markets；
+    超过 ttl 的缓存仍可使用，但调用方应在后台刷新。
+    格式版本或 ccxt 版本不一致的缓存视为无效。
+    """
+
+    def __init__(self, cache_dir: str, ttl: int = 6 * 3600):
+        self.cache_dir = cache_dir
+        self.ttl = ttl
+
+    def _path(self, exchange_name: str) -> str:
+        return os.path.join(self.cache_dir, f"markets_{exchange_name}.json")
+
+    def load(self, exchange_name: str):
+        """
+        读取缓存，返回 {'markets', 'currencies', 'saved_at', 'stale'}；
+        文件不存在、损坏或版本不匹配时返回 None
+        """
+        path = self._path(exchange_name)
+        try:
+            with open(path) as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logger.warning(f"Ignoring unreadable market cache {path}: {e}")
+            return None
+
+        if data.get('format') != CACHE_FORMAT_VERSION or data.get('ccxt_version') != ccxt.__version__:
+            logger.info(f"Market cache for {exchange_name} has a different version, ignoring")
+            return None
+        if not data.get('markets'):
+            return None
+        data['stale'] = time.time() - data.get('saved_at', 0) >= self.ttl
+        return data
+
+    def save(self, exchange_name: str, exch):
+        """把已加载的 markets/currencies 写入缓存（先写临时文件再原子替换）"""
+        path = self._path(exchange_name)
+        data = {
+            'format': CACHE_FORMAT_VERSION,
+            'ccxt_version': ccxt.__version__,
+            'saved_at': time.time(),
+            'markets': exch.markets,
+            'currencies': exch.currencies,
+        }
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            with open(tmp_path, 'w') as f:
+                json.dump(data, f, default=str)
+            os.replace(tmp_path, path)
+        except Exception as e:
+            logger.warning(f"Failed to write market cache {path}: {e}")
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    @staticmethod
+    def apply(exch, data):
+        """把缓存的元数据装入 ccxt 客户端（同步与 asyncio 客户端通用）"""
+        exch.set_markets(data['markets'], data.get('currencies'))
@@ -0,0 +1,137 @@
+import asyncio
+import json
+import logging
+from abc import ABC, abstractmethod
+from typing import NamedTuple, Optional
+import websockets
+
+logger = logging.getLogger(__name__)
+
+
+class CandleEvent(NamedTuple):
+    """K 线收盘事件：closed 为刚收盘的 K 线，forming 为新开始的 K 线（未完成，可能为 None）"""
+    exchange: str
+    symbol: str
+    timeframe: str
+    closed: list
+    forming: Optional[list] = None
+
+    @property
+    def market(self):
+        return (self.exchange, self.symbol, self.timeframe)
+
+
+class MarketDataSource(ABC):
+    """
+    推送式行情数据源：订阅 (exchange, symbol, timeframe) 后，通过 events() 产出 CandleEvent。
+    events() 收到 None 时结束（例如回放数据播放完毕）。
+    """
+
+    # 订阅前是否需要通过 REST 预先拉取历史 K 线
+    seed_from_rest = True
+
+    def __init__(self, max_queue: int = 10000):
+        self._queue = asyncio.Queue(maxsize=max_queue)
+
+    @abstractmethod
+    async def subscribe(self, markets):
+        """将订阅集合更新为 markets（{(exchange, symbol, timeframe)}）"""
+        pass
+
+    async def events(self):
+        while True:
+            event = await self._queue.get()
+            if event is None:
+                return
+            yield event
+
+    async def close(self):
+        pass
+
+
+class ExchangeStreamSource(MarketDataSource):
+    """通过交易所 websocket K 线推送（ccxt.pro watch_ohlcv）产生收盘事件"""
+
+    def __init__(self, exchange_manager, max_queue: int = 10000):
+        super().__init__(max_queue)
+        self.exchange_manager = exchange_manager
+        self._tasks = {}  # {market: asyncio.Task}
+
+    async def subscribe(self, markets):
+        markets = set(markets)
+        for market in markets - set(self._tasks):
+            self._tasks[market] = asyncio.create_task(self._watch(market))
+            logger.info(f"📡 Subscribed kline stream {':'.join(market)}")
+        for market in set(self._tasks) - markets:
+            self._tasks.pop(market).cancel()
+            logger.info(f"📡 Unsubscribed kline stream {':'.join(market)}")
+
+    async def _watch(self, market):
+        exchange_name, symbol, timeframe = market
+        exch = self.exchange_manager.get_stream_exchange(exchange_name)
+        if not exch:
+            logger.warning(f"Stream exchange {exchange_name} not available")
+            return
+        last = None  # 当前未完成 K 线的最新状态
+        while True:
+            try:
+                candles = await exch.watch_ohlcv(symbol, timeframe)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Kline stream error {':'.join(market)}: {e}")
+                await asyncio.sleep(5)
+                continue
+            if not candles:
+                continue
+            for candle in sorted(candles, key=lambda c: c[0]):
+                if last is not None and candle[0] > last[0]:
+                    # 出现了新的 K 线，上一根已经收盘
+                    await self._queue.put(CandleEvent(exchange_name, symbol, timeframe, list(last), list(candle)))
+                if last is None or candle[0] >= last[0]:
+                    last = candle
+
+    async def close(self):
+        for task in self._tasks.values():
+            task.cancel()
+        self._tasks.clear()
+
+
+class ReplaySource(MarketDataSource):
+    """连接本地回放服务（replay_server.py），以与实盘推送相同的事件形式接收录制好的 K 线"""
+
+    seed_from_rest = False
+
+    def __init__(self, url: str, max_queue: int = 10000):
+        super().__init__(max_queue)
+        self.url = url
+        self._ws = None
+        self._reader = None
+
+    async def subscribe(self, markets):
+        if self._ws is None:
+            self._ws = await websockets.connect(self.url, max_size=None)
+            self._reader = asyncio.create_task(self._read())
+            logger.info(f"📼 Connected to replay server {self.url}")
+        await self._ws.send(json.dumps({'op': 'subscribe', 'markets': [list(m) for m in markets]}))
+
+    async def _read(self):
+        try:
+            async for message in self._ws:
+                data = json.loads(message)
+                if data.get('op') == 'end':
+                    logger.info("📼 Replay finished")
+                    break
+                await self._queue.put(CandleEvent(
+                    data['exchange'], data['symbol'], data['timeframe'], data['closed'], data.get('forming')
+                ))
+        except websockets.ConnectionClosed as e:
+            logger.warning(f"Replay connection closed: {e}")
+        finally:
+            await self._queue.put(None)
+
+    async def close(self):
+        if self._reader:
+            self._reader.cancel()
+        if self._ws is not None:
+            await self._ws.close()
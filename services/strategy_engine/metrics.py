@@ -0,0 +1,131 @@
+import logging
+import threading
+from prometheus_client import Counter, Gauge, Histogram, start_http_server
+
+logger = logging.getLogger(__name__)
+
+# 延迟分桶（秒）：覆盖亚毫秒级的指标计算到数十秒的交易所请求/超时策略
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+EXCHANGE_REQUEST_SECONDS = Histogram(
+    'strategy_engine_exchange_request_seconds', 'Exchange REST call latency, excluding rate limiter queueing',
+    ['exchange', 'method'], buckets=LATENCY_BUCKETS
+)
+INDICATOR_COMPUTE_SECONDS = Histogram(
+    'strategy_engine_indicator_compute_seconds', 'Batched indicator computation time per series',
+    ['indicator'], buckets=LATENCY_BUCKETS
+)
+RATE_LIMIT_WAIT_SECONDS = Histogram(
+    'strategy_engine_rate_limit_wait_seconds', 'Time an exchange request waited for the weight budget before being sent',
+    ['exchange'], buckets=LATENCY_BUCKETS
+)
+WORKER_QUEUE_SECONDS = Histogram(
+    'strategy_engine_worker_queue_seconds', 'Delay between a strategy tick being submitted to the worker pool and starting to run',
+    ['pool'], buckets=LATENCY_BUCKETS
+)
+ON_TICK_SECONDS = Histogram(
+    'strategy_engine_on_tick_seconds', 'Strategy tick execution time',
+    ['strategy_class'], buckets=LATENCY_BUCKETS
+)
+LOOP_LAG_SECONDS = Histogram(
+    'strategy_engine_loop_lag_seconds', 'Delay of the actual wakeup behind the scheduled candle-close wakeup (scheduler) or the candle close (stream)',
+    ['source'], buckets=LATENCY_BUCKETS
+)
+CACHE_REQUESTS = Counter(
+    'strategy_engine_cache_requests_total', 'Cache lookups by result (hit / miss / coalesced)',
+    ['cache', 'result']
+)
+CACHE_EVICTIONS = Counter(
+    'strategy_engine_cache_evictions_total', 'Cache entries removed before being replaced, by reason (expired / lru)',
+    ['cache', 'reason']
+)
+MARKET_DATA_SKIPPED = Counter(
+    'strategy_engine_market_data_skipped_total', 'Markets left out of a round because fetching missed the deadline (timeout) or a timed-out fetch is still running (inflight)',
+    ['reason']
+)
+# 由 main 用 set_function 绑定到缓存实例，抓取时读取，不在热路径上更新
+CACHE_ENTRIES = Gauge('strategy_engine_cache_entries', 'Entries in the market data cache')
+CACHE_BYTES = Gauge('strategy_engine_cache_bytes', 'Estimated payload bytes in the market data cache')
+SIGNAL_EMIT_SECONDS = Histogram(
+    'strategy_engine_signal_emit_seconds', 'Time from signal submission to its DB commit',
+    buckets=LATENCY_BUCKETS
+)
+DB_WRITE_SECONDS = Histogram(
+    'strategy_engine_db_write_seconds', 'Database write latency',
+    ['operation'], buckets=LATENCY_BUCKETS
+)
+REDIS_WRITE_SECONDS = Histogram(
+    'strategy_engine_redis_write_seconds', 'Redis write latency',
+    ['operation'], buckets=LATENCY_BUCKETS
+)
+
+
+class LabelCache:
+    """
+    缓存 metric.labels(...) 返回的子指标：labels() 每次都要拼键加锁查找，
+    热路径上（每个策略每个 tick）改为一次字典查找。
+    """
+
+    def __init__(self, metric):
+        self.metric = metric
+        self._children = {}
+
+    def __call__(self, *labels):
+        child = self._children.get(labels)
+        if child is None:
+            child = self._children[labels] = self.metric.labels(*labels)
+        return child
+
+
+exchange_request_seconds = LabelCache(EXCHANGE_REQUEST_SECONDS)
+indicator_compute_seconds = LabelCache(INDICATOR_COMPUTE_SECONDS)
+rate_limit_wait_seconds = LabelCache(RATE_LIMIT_WAIT_SECONDS)
+worker_queue_seconds = LabelCache(WORKER_QUEUE_SECONDS)
+on_tick_seconds = LabelCache(ON_TICK_SECONDS)
+loop_lag_seconds = LabelCache(LOOP_LAG_SECONDS)
+cache_requests = LabelCache(CACHE_REQUESTS)
+cache_evictions = LabelCache(CACHE_EVICTIONS)
+market_data_skipped = LabelCache(MARKET_DATA_SKIPPED)
+db_write_seconds = LabelCache(DB_WRITE_SECONDS)
+redis_write_seconds = LabelCache(REDIS_WRITE_SECONDS)
+
+
+class SampledLogger:
+    """
+    热路径上的例行日志（每个 tick 的指标值、拉取计划等）：只在 DEBUG 级别输出，且每个 key 每 every 条只输出一条。
+    消息使用 logging 的 %-格式参数，未输出的消息不做格式化；INFO 级别下每次调用只有一次级别判断。
+    """
+
+    every = 100  # 由 start_metrics() 按配置设置
+
+    def __init__(self, logger):
+        self.logger = logger
+        self._counts = {}
+
+    def debug(self, key, message: str, *args):
+        if not self.logger.isEnabledFor(logging.DEBUG):
+            return
+        count = self._counts.get(key, 0)
+        self._counts[key] = count + 1
+        if count % self.every == 0:
+            self.logger.debug(message, *args)
+
+
+_server_lock = threading.Lock()
+_server_started = False
+
+
+def start_metrics(port: int, log_sample_every: int = 100):
+    """启动 /metrics HTTP 端点（后台线程，port 为 0 时不启动）并设置调试日志采样间隔，重复调用无副作用"""
+    global _server_started
+    SampledLogger.every = max(1, log_sample_every)
+    with _server_lock:
+        if _server_started or not port:
+            return
+        try:
+            start_http_server(port)
+        except OSError as e:
+            logger.error(f"Failed to start metrics endpoint on port {port}: {e}")
+            return
+        _server_started = True
+    logger.info(f"📈 Metrics endpoint listening on :{port}/metrics")
@@ -0,0 +1,175 @@
+import json
+import time
+import logging
+import threading
+from datetime import datetime, timedelta
+from sqlalchemy import text
+from models import SignalOutbox, CN_TZ
+from metrics import db_write_seconds, redis_write_seconds
+
+logger = logging.getLogger(__name__)
+
+# 多个引擎副本同时运行中继时，用事务级 advisory lock 保证同一时刻只有一个在转发，保持信号顺序
+OUTBOX_LOCK_KEY = 7_301_401
+
+
+def _now():
+    return datetime.now(CN_TZ).replace(tzinfo=None)
+
+
+class OutboxRelay:
+    """
+    发件箱中继：按 id 顺序读取 signal_outbox 中尚未转发的行，批量 XADD 到 Redis Stream 后标记为已转发。
+    先 XADD 后提交标记，进程在两者之间崩溃时会重复投递（至少一次），消费端按 idempotency_key 去重。
+    SignalSink 提交后调用 wake() 立即转发，否则每 poll_interval 秒轮询一次。
+    """
+
+    def __init__(self, session_factory, redis_client, stream: str = 'strategy_signals_stream',
+                 batch_size: int = 200, poll_interval: float = 1.0, maxlen: int = 100000,
+                 retention_hours: int = 72, prune_interval: int = 3600):
+        self.session_factory = session_factory
+        self.redis_client = redis_client
+        self.stream = stream
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.maxlen = maxlen
+        self.retention_hours = retention_hours
+        self.prune_interval = prune_interval
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self._last_prune = 0.0
+        self._lock = threading.Lock()
+        self.stats = {'relayed': 0, 'batches': 0, 'errors': 0, 'relay_latency_max': 0.0, 'pruned': 0, 'published_direct': 0}
+
+    def start(self):
+        if self._thread is None and self.redis_client:
+            self._thread = threading.Thread(target=self._run, name='outbox-relay', daemon=True)
+            self._thread.start()
+
+    def wake(self):
+        self._wake.set()
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._wake.wait(self.poll_interval)
+            self._wake.clear()
+            self.drain()
+            if time.monotonic() - self._last_prune >= self.prune_interval:
+                self._last_prune = time.monotonic()
+                self.prune()
+
+    def drain(self):
+        """转发直到没有积压（或出错）"""
+        while self.relay_once() == self.batch_size:
+            pass
+
+    def relay_once(self) -> int:
+        """转发一批，返回转发的条数"""
+        started = time.monotonic()
+        db = self.session_factory()
+        try:
+            if db.bind.dialect.name == 'postgresql':
+                if not db.execute(text("SELECT pg_try_advisory_xact_lock(:key)"), {'key': OUTBOX_LOCK_KEY}).scalar():
+                    return 0  # 其他副本正在转发
+            rows = (
+                db.query(SignalOutbox)
+                .filter(SignalOutbox.published_at.is_(None))
+                .order_by(SignalOutbox.id)
+                .limit(self.batch_size)
+                .all()
+            )
+            if not rows:
+                return 0
+
+            pipe = self.redis_client.pipeline(transaction=False)
+            for row in rows:
+                pipe.xadd(self.stream, {'key': row.idempotency_key, 'data': row.payload}, maxlen=self.maxlen, approximate=True)
+            xadd_started = time.perf_counter()
+            pipe.execute()
+            redis_write_seconds('signal_stream').observe(time.perf_counter() - xadd_started)
+
+            commit_started = time.perf_counter()
+            (
+                db.query(SignalOutbox)
+                .filter(SignalOutbox.id.in_([row.id for row in rows]))
+                .update({SignalOutbox.published_at: _now()}, synchronize_session=False)
+            )
+            db.commit()
+            db_write_seconds('outbox_mark_published').observe(time.perf_counter() - commit_started)
+        except Exception as e:
+            db.rollback()
+            with self._lock:
+                self.stats['errors'] += 1
+            logger.error(f"Outbox relay failed, will retry: {e}")
+            return 0
+        finally:
+            db.close()
+
+        latency = time.monotonic() - started
+        with self._lock:
+            self.stats['relayed'] += len(rows)
+            self.stats['batches'] += 1
+            self.stats['relay_latency_max'] = max(self.stats['relay_latency_max'], latency)
+        logger.info(f"Relayed {len(rows)} signals to stream '{self.stream}' in {latency * 1000:.1f}ms")
+        return len(rows)
+
+    def publish(self, signals) -> bool:
+        """
+        数据库写不进去的信号绕过发件箱直接 XADD 到 Stream（见 SignalSink），消息格式与经发件箱转发的相同，signal_id 为 None。
+        这些信号不会出现在 signals 表中；返回是否发布成功。
+        """
+        if not self.redis_client or not signals:
+            return False
+        try:
+            started = time.perf_counter()
+            pipe = self.redis_client.pipeline(transaction=False)
+            for signal_data in signals:
+                payload = json.dumps(dict(signal_data, signal_id=None))
+                pipe.xadd(self.stream, {'key': signal_data['idempotency_key'], 'data': payload}, maxlen=self.maxlen, approximate=True)
+            pipe.execute()
+            redis_write_seconds('signal_stream').observe(time.perf_counter() - started)
+        except Exception as e:
+            with self._lock:
+                self.stats['errors'] += 1
+            logger.error(f"Failed to publish {len(signals)} unsaved signals to stream '{self.stream}': {e}")
+            return False
+        with self._lock:
+            self.stats['published_direct'] += len(signals)
+        logger.warning(f"📣 Published {len(signals)} signals that could not be saved directly to stream '{self.stream}'")
+        return True
+
+    def prune(self):
+        """删除超过保留期的已转发记录"""
+        db = self.session_factory()
+        try:
+            cutoff = _now() - timedelta(hours=self.retention_hours)
+            deleted = (
+                db.query(SignalOutbox)
+                .filter(SignalOutbox.published_at.isnot(None), SignalOutbox.published_at < cutoff)
+                .delete(synchronize_session=False)
+            )
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            logger.error(f"Failed to prune signal outbox: {e}")
+            return
+        finally:
+            db.close()
+        if deleted:
+            with self._lock:
+                self.stats['pruned'] += deleted
+            logger.info(f"Pruned {deleted} relayed outbox rows older than {self.retention_hours}h")
+
+    def stop(self, timeout: float = 10.0):
+        """最后转发一次积压后停止"""
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._wake.set()
+        self._thread.join(timeout)
+        self.drain()
+
+    def get_stats(self):
+        with self._lock:
+            return dict(self.stats)
@@ -0,0 +1,257 @@
+import asyncio
+import time
+import logging
+import threading
+from metrics import rate_limit_wait_seconds
+
+logger = logging.getLogger(__name__)
+
+# 各交易所的请求权重预算: (每个窗口的权重上限, 窗口秒数)
+EXCHANGE_WEIGHT_LIMITS = {
+    'binance': (2400, 60),  # U 本位合约 REQUEST_WEIGHT 2400/分钟（按 IP）
+    'bitget': (1200, 60),  # 行情接口 20 次/秒
+}
+
+# 返回已用权重的响应头（小写），用于按交易所实际计数校准本地令牌桶
+USED_WEIGHT_HEADERS = {
+    'binance': ('x-mbx-used-weight-1m', 'x-mbx-used-weight'),
+}
+
+# 固定权重的接口，未列出的按 1 计
+ENDPOINT_WEIGHTS = {
+    'binance': {'fetch_balance': 5},
+}
+
+
+def endpoint_weight(exchange_name: str, method: str, limit: int = None) -> int:
+    """估算一次调用消耗的请求权重（Binance K 线接口的权重随 limit 增长）"""
+    if exchange_name == 'binance' and method == 'fetch_ohlcv':
+        limit = limit or 500
+        if limit < 100:
+            return 1
+        if limit < 500:
+            return 2
+        if limit <= 1000:
+            return 5
+        return 10
+    return ENDPOINT_WEIGHTS.get(exchange_name, {}).get(method, 1)
+
+
+def retry_after_seconds(headers, default: float = 60.0) -> float:
+    """从 429/418 响应的 Retry-After 头读取需要暂停的秒数"""
+    lowered = {str(k).lower(): v for k, v in (headers or {}).items()}
+    try:
+        return float(lowered['retry-after'])
+    except (KeyError, TypeError, ValueError):
+        return default
+
+
+class TokenBucket:
+    """
+    进程内令牌桶（线程安全）。
+    reserve() 先扣除令牌（允许为负）再返回需要等待的秒数，调用方在锁外睡眠，先到先得。
+    """
+
+    def __init__(self, capacity: float, refill_per_sec: float, clock=time.monotonic):
+        self.capacity = capacity
+        self.refill_per_sec = refill_per_sec
+        self.clock = clock  # 单调时间（秒），测试中替换为手动推进的时钟
+        self.tokens = capacity
+        self.updated_at = clock()
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.refill_per_sec)
+        self.updated_at = now
+
+    def reserve(self, weight: float) -> float:
+        with self._lock:
+            self._refill(self.clock())
+            self.tokens -= weight
+            return max(0.0, -self.tokens / self.refill_per_sec)
+
+    def observe_used(self, used: float):
+        """交易所返回的已用权重比本地估计高时，收紧剩余令牌"""
+        with self._lock:
+            self._refill(self.clock())
+            self.tokens = min(self.tokens, self.capacity - used)
+
+    def drain(self, seconds: float):
+        """被限流（429/418）后清空令牌，seconds 秒内不再放行"""
+        with self._lock:
+            self._refill(self.clock())
+            self.tokens = min(self.tokens, -seconds * self.refill_per_sec)
+
+
+# Redis 上的共享令牌桶，所有引擎副本共用一份预算；时间取 Redis 服务器时间，避免各节点时钟偏差
+# KEYS[1]: 桶的 hash; ARGV: capacity, refill_per_sec, weight, mode(reserve|observe|drain), value
+_REDIS_BUCKET_SCRIPT = """
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1]) or capacity
+local ts = tonumber(state[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate)
+local mode = ARGV[3]
+local value = tonumber(ARGV[4])
+if mode == 'reserve' then
+    tokens = tokens - value
+elseif mode == 'observe' then
+    tokens = math.min(tokens, capacity - value)
+else
+    tokens = math.min(tokens, -value * rate)
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', tostring(now))
+redis.call('EXPIRE', KEYS[1], math.ceil(capacity / rate) * 2 + 60)
+if tokens < 0 then
+    return tostring(-tokens / rate)
+end
+return '0'
+"""
+
+
+class RedisTokenBucket:
+    """多个引擎进程共享的令牌桶（Redis + Lua 原子操作），Redis 不可用时退回进程内令牌桶"""
+
+    def __init__(self, redis_client, key: str, capacity: float, refill_per_sec: float):
+        self.redis_client = redis_client
+        self.key = key
+        self.capacity = capacity
+        self.refill_per_sec = refill_per_sec
+        self._script = redis_client.register_script(_REDIS_BUCKET_SCRIPT)
+        self._fallback = TokenBucket(capacity, refill_per_sec)
+        self._redis_ok = True
+
+    def _run(self, mode: str, value: float):
+        try:
+            wait = float(self._script(keys=[self.key], args=[self.capacity, self.refill_per_sec, mode, value]))
+        except Exception as e:
+            if self._redis_ok:
+                logger.warning(f"Shared rate limiter unavailable ({e}), falling back to local bucket for {self.key}")
+                self._redis_ok = False
+            return None
+        if not self._redis_ok:
+            logger.info(f"Shared rate limiter recovered for {self.key}")
+            self._redis_ok = True
+        return wait
+
+    def reserve(self, weight: float) -> float:
+        wait = self._run('reserve', weight)
+        return self._fallback.reserve(weight) if wait is None else wait
+
+    def observe_used(self, used: float):
+        if self._run('observe', used) is None:
+            self._fallback.observe_used(used)
+
+    def drain(self, seconds: float):
+        if self._run('drain', seconds) is None:
+            self._fallback.drain(seconds)
+
+
+class RateLimiter:
+    """
+    ExchangeManager 级别的请求权重限流：所有线程（以及配置 Redis 时所有引擎进程）共享每个交易所的权重预算。
+    调用前 acquire() 按接口权重排队，调用后 observe() 用响应头中的已用权重校准，
+    并统计排队延迟，用于评估部署规模。
+    """
+
+    def __init__(self, redis_client=None, safety: float = 0.8, key_prefix: str = 'ratelimit'):
+        self.redis_client = redis_client
+        self.safety = safety
+        self.key_prefix = key_prefix
+        self._buckets = {}
+        self._lock = threading.Lock()
+        # {exchange_name: {'requests', 'weight', 'throttled', 'wait_total', 'wait_max', 'bans'}}
+        self.stats = {}
+
+    def _bucket(self, exchange_name: str):
+        bucket = self._buckets.get(exchange_name)
+        if bucket is None:
+            with self._lock:
+                bucket = self._buckets.get(exchange_name)
+                if bucket is None:
+                    limit, window = EXCHANGE_WEIGHT_LIMITS.get(exchange_name, (1200, 60))
+                    capacity = limit * self.safety
+                    if self.redis_client is not None:
+                        bucket = RedisTokenBucket(self.redis_client, f"{self.key_prefix}:{exchange_name}", capacity, capacity / window)
+                    else:
+                        bucket = TokenBucket(capacity, capacity / window)
+                    self._buckets[exchange_name] = bucket
+        return bucket
+
+    def _record(self, exchange_name: str, weight: int, wait: float):
+        rate_limit_wait_seconds(exchange_name).observe(wait)
+        with self._lock:
+            stats = self.stats.setdefault(exchange_name, {
+                'requests': 0, 'weight': 0, 'throttled': 0, 'wait_total': 0.0, 'wait_max': 0.0, 'bans': 0
+            })
+            stats['requests'] += 1
+            stats['weight'] += weight
+            if wait > 0:
+                stats['throttled'] += 1
+                stats['wait_total'] += wait
+                stats['wait_max'] = max(stats['wait_max'], wait)
+
+    def acquire(self, exchange_name: str, weight: int = 1) -> float:
+        """阻塞直到预算允许发出请求，返回排队等待的秒数"""
+        wait = self._bucket(exchange_name).reserve(weight)
+        if wait > 0:
+            time.sleep(wait)
+        self._record(exchange_name, weight, wait)
+        return wait
+
+    async def acquire_async(self, exchange_name: str, weight: int = 1) -> float:
+        """acquire() 的 asyncio 版本（Redis 调用放到线程中执行）"""
+        bucket = self._bucket(exchange_name)
+        if isinstance(bucket, RedisTokenBucket):
+            wait = await asyncio.to_thread(bucket.reserve, weight)
+        else:
+            wait = bucket.reserve(weight)
+        if wait > 0:
+            await asyncio.sleep(wait)
+        self._record(exchange_name, weight, wait)
+        return wait
+
+    def observe(self, exchange_name: str, headers):
+        """根据响应头中的已用权重校准令牌桶"""
+        names = USED_WEIGHT_HEADERS.get(exchange_name)
+        if not names or not headers:
+            return
+        lowered = {str(k).lower(): v for k, v in headers.items()}
+        for name in names:
+            if name in lowered:
+                try:
+                    used = float(lowered[name])
+                except (TypeError, ValueError):
+                    return
+                self._bucket(exchange_name).observe_used(used * self.safety)
+                return
+
+    def penalize(self, exchange_name: str, seconds: float):
+        """被交易所限流（429/418）后暂停该交易所的所有请求"""
+        logger.warning(f"🚦 {exchange_name} rate limit hit, pausing requests for {seconds:.0f}s")
+        with self._lock:
+            if exchange_name in self.stats:
+                self.stats[exchange_name]['bans'] += 1
+        self._bucket(exchange_name).drain(seconds)
+
+    def get_stats(self):
+        """各交易所的请求数、权重、排队次数与平均/最大排队延迟"""
+        with self._lock:
+            result = {}
+            for exchange_name, stats in self.stats.items():
+                result[exchange_name] = dict(stats)
+                result[exchange_name]['wait_avg'] = stats['wait_total'] / stats['requests'] if stats['requests'] else 0.0
+            return result
+
+
+def create_rate_limiter():
+    """按配置创建限流器：RATE_LIMIT_BACKEND=redis 时多个引擎进程共享同一份预算"""
+    from config import settings
+    redis_client = None
+    if settings.RATE_LIMIT_BACKEND == 'redis':
+        import redis
+        redis_client = redis.from_url(settings.REDIS_URL)
+    return RateLimiter(redis_client, safety=settings.RATE_LIMIT_SAFETY)
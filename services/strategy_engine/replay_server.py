@@ -0,0 +1,129 @@
+"""
+本地 K 线回放服务：通过 websocket 推送录制好的 K 线，用于离线测试和压测推送模式（ENGINE_MODE=stream, MARKET_DATA_SOURCE=replay）。
+
+录制:  python replay_server.py record candles.csv --exchange binance --symbol BTC/USDT --timeframe 1h --limit 1000
+回放:  python replay_server.py serve candles.csv --port 8765 --interval 0.05
+
+CSV 列: exchange,symbol,timeframe,timestamp,open,high,low,close,volume
+"""
+import argparse
+import asyncio
+import csv
+import heapq
+import json
+import logging
+import sys
+import websockets
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+    handlers=[logging.StreamHandler(sys.stdout)]
+)
+logger = logging.getLogger('replay_server')
+
+CSV_COLUMNS = ['exchange', 'symbol', 'timeframe', 'timestamp', 'open', 'high', 'low', 'close', 'volume']
+
+
+def load_candles(path: str):
+    """读取录制文件，返回 {(exchange, symbol, timeframe): [[ts, o, h, l, c, v], ...]}（按时间排序）"""
+    markets = {}
+    with open(path, newline='') as f:
+        for row in csv.DictReader(f):
+            market = (row['exchange'], row['symbol'], row['timeframe'])
+            candle = [int(row['timestamp'])] + [float(row[col]) for col in CSV_COLUMNS[4:]]
+            markets.setdefault(market, []).append(candle)
+    for candles in markets.values():
+        candles.sort(key=lambda c: c[0])
+    return markets
+
+
+def replay_events(markets: dict, subscribed):
+    """按时间顺序产出 (timestamp, 消息)：每根 K 线收盘时附带下一根 K 线的开盘状态作为未完成 K 线"""
+    heap = []
+    for market in subscribed:
+        candles = markets.get(market, [])
+        if candles:
+            heap.append((candles[0][0], market, 0))
+    heapq.heapify(heap)
+    while heap:
+        ts, market, i = heapq.heappop(heap)
+        candles = markets[market]
+        forming = None
+        if i + 1 < len(candles):
+            nxt = candles[i + 1]
+            forming = [nxt[0], nxt[1], nxt[1], nxt[1], nxt[1], 0.0]
+            heapq.heappush(heap, (nxt[0], market, i + 1))
+        exchange_name, symbol, timeframe = market
+        yield ts, {
+            'exchange': exchange_name,
+            'symbol': symbol,
+            'timeframe': timeframe,
+            'closed': candles[i],
+            'forming': forming,
+        }
+
+
+async def serve(path: str, host: str, port: int, interval: float):
+    markets = load_candles(path)
+    logger.info(f"Loaded {sum(len(c) for c in markets.values())} candles for {len(markets)} markets from {path}")
+
+    async def handler(websocket):
+        message = json.loads(await websocket.recv())
+        subscribed = [tuple(m) for m in message.get('markets', [])]
+        logger.info(f"Client subscribed to {len(subscribed)} markets")
+        last_ts = None
+        for ts, event in replay_events(markets, subscribed):
+            # 同一时间戳的 K 线一起发送，不同时间戳之间间隔 interval 秒
+            if last_ts is not None and ts != last_ts and interval > 0:
+                await asyncio.sleep(interval)
+            last_ts = ts
+            await websocket.send(json.dumps(event))
+        await websocket.send(json.dumps({'op': 'end'}))
+        logger.info("Replay finished")
+
+    async with websockets.serve(handler, host, port, max_size=None):
+        logger.info(f"📼 Replay server listening on ws://{host}:{port}")
+        await asyncio.Future()
+
+
+def record(path: str, exchange_name: str, symbol: str, timeframe: str, limit: int):
+    """从交易所拉取 K 线并追加写入录制文件"""
+    import ccxt
+    exch = getattr(ccxt, exchange_name)({'enableRateLimit': True})
+    candles = exch.fetch_ohlcv(symbol, timeframe, limit=limit)
+    with open(path, 'a', newline='') as f:
+        writer = csv.writer(f)
+        if f.tell() == 0:
+            writer.writerow(CSV_COLUMNS)
+        for candle in candles[:-1]:  # 最后一根未完成，不录制
+            writer.writerow([exchange_name, symbol, timeframe] + list(candle))
+    logger.info(f"Recorded {len(candles) - 1} candles of {exchange_name}:{symbol}:{timeframe} to {path}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local kline replay server")
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    serve_parser = sub.add_parser('serve', help='serve recorded candles over websocket')
+    serve_parser.add_argument('file')
+    serve_parser.add_argument('--host', default='0.0.0.0')
+    serve_parser.add_argument('--port', type=int, default=8765)
+    serve_parser.add_argument('--interval', type=float, default=0.0, help='seconds between candle timestamps')
+
+    record_parser = sub.add_parser('record', help='record candles from an exchange')
+    record_parser.add_argument('file')
+    record_parser.add_argument('--exchange', default='binance')
+    record_parser.add_argument('--symbol', default='BTC/USDT')
+    record_parser.add_argument('--timeframe', default='1h')
+    record_parser.add_argument('--limit', type=int, default=1000)
+
+    args = parser.parse_args()
+    if args.command == 'serve':
+        asyncio.run(serve(args.file, args.host, args.port, args.interval))
+    else:
+        record(args.file, args.exchange, args.symbol, args.timeframe, args.limit)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,220 @@
+import asyncio
+import time
+import logging
+import threading
+from datetime import datetime, timezone
+from candle_store import timeframe_to_ms
+from metrics import loop_lag_seconds
+
+logger = logging.getLogger(__name__)
+
+# Unix 纪元（1970-01-01）是周四，交易所周线从周一 00:00 UTC 开始
+WEEK_OFFSET_MS = 4 * 24 * 3600 * 1000
+
+
+def _candle_boundary_ms(timeframe: str, now_ms: int, ahead: int) -> int:
+    """now_ms 所在 K 线的开盘时间（ahead=0）或收盘时间（ahead=1），毫秒，交易所时间"""
+    unit = timeframe[-1]
+    if unit == 'M':
+        # 月线按自然月对齐
+        months = int(timeframe[:-1])
+        now = datetime.fromtimestamp(now_ms / 1000, tz=timezone.utc)
+        index = now.year * 12 + now.month - 1
+        index = (index // months + ahead) * months
+        boundary = datetime(index // 12, index % 12 + 1, 1, tzinfo=timezone.utc)
+        return int(boundary.timestamp() * 1000)
+    tf_ms = timeframe_to_ms(timeframe)
+    offset = WEEK_OFFSET_MS if unit == 'w' else 0
+    return ((now_ms - offset) // tf_ms + ahead) * tf_ms + offset
+
+
+def next_candle_close_ms(timeframe: str, now_ms: int) -> int:
+    """返回 now_ms 所在 K 线的收盘时间（即下一根 K 线的开盘时间，毫秒，交易所时间）"""
+    return _candle_boundary_ms(timeframe, now_ms, 1)
+
+
+def last_candle_close_ms(timeframe: str, now_ms: int) -> int:
+    """返回 now_ms 之前（含）最近一次收盘的时间（即 now_ms 所在 K 线的开盘时间，毫秒，交易所时间）"""
+    return _candle_boundary_ms(timeframe, now_ms, 0)
+
+
+class WakeEvent(threading.Event):
+    """
+    可在线程和 asyncio 中等待的唤醒事件（策略变更通知、监听断开、分片成员变化由其他线程 set）。
+    wait_async() 不占用线程池线程：set() 通过 call_soon_threadsafe 唤醒等待中的协程，
+    事件循环退出时等待随任务一起立即取消，不会拖住 asyncio.run 对默认线程池的关闭。
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._waiters = set()  # {(loop, asyncio.Event)}
+        self._waiters_lock = threading.Lock()
+
+    def set(self):
+        super().set()
+        with self._waiters_lock:
+            waiters = list(self._waiters)
+        for loop, waiter in waiters:
+            try:
+                loop.call_soon_threadsafe(waiter.set)
+            except RuntimeError:
+                pass  # 事件循环已关闭
+
+    async def wait_async(self, timeout: float = None) -> bool:
+        """与 wait() 相同，返回事件是否已置位"""
+        if self.is_set():
+            return True
+        waiter = (asyncio.get_running_loop(), asyncio.Event())
+        with self._waiters_lock:
+            self._waiters.add(waiter)
+        try:
+            if self.is_set():  # 登记之前已被 set
+                return True
+            await asyncio.wait_for(waiter[1].wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return self.is_set()
+        finally:
+            with self._waiters_lock:
+                self._waiters.discard(waiter)
+
+
+class CandleScheduler:
+    """
+    按 K 线收盘时间调度主循环：
+    根据各交易所服务器时间（而非本地时钟）计算每个 (exchange, timeframe) 的下一次收盘，
+    在收盘后 settle_delay 秒唤醒，并返回刚刚收盘的 (exchange, timeframe)。
+    每个 (exchange, timeframe) 记录最后一次返回的收盘，被策略变更等事件提前唤醒时也不会跳过收盘：
+    任何一次返回都包含自上次返回以来所有已过 settle_delay 的收盘，尚在 settle_delay 内的收盘仍是下一次唤醒的目标。
+    """
+
+    def __init__(self, exchange_manager, settle_delay: float = 2.0, clock_sync_interval: int = 3600,
+                 clock=time.time, sleep=time.sleep):
+        self.exchange_manager = exchange_manager
+        self.clock = clock  # 本地时间（秒），基准测试中替换为模拟时钟
+        self.sleep = sleep  # 无 wake_event 时的睡眠，模拟时钟下为直接推进时钟
+        self.settle_delay = settle_delay
+        self.clock_sync_interval = clock_sync_interval
+        self._offsets = {}  # {exchange_name: 服务器时间 - 本地时间（秒）}
+        self._last_clock_sync = {}  # {exchange_name: 上次校时的本地时间}
+        self._dispatched = {}  # {(exchange, timeframe): 最后一次返回的收盘时间（毫秒，交易所时间）}
+
+    def _record_offset(self, exchange_name: str, before: float, server_ms, after: float):
+        """记录一次校时结果（偏移取请求往返的中点）"""
+        self._last_clock_sync[exchange_name] = after
+        if server_ms is None:
+            return
+        offset = server_ms / 1000 - (before + after) / 2
+        if abs(offset - self._offsets.get(exchange_name, 0.0)) > 0.5:
+            logger.info(f"⏱ Clock offset for {exchange_name}: {offset:+.3f}s")
+        self._offsets[exchange_name] = offset
+
+    def _needs_clock_sync(self, exchange_name: str) -> bool:
+        return self.clock() - self._last_clock_sync.get(exchange_name, 0) >= self.clock_sync_interval
+
+    def _sync_clock(self, exchange_name: str):
+        """用交易所服务器时间校准本地时钟偏移"""
+        before = self.clock()
+        server_ms = self.exchange_manager.get_server_time(exchange_name)
+        self._record_offset(exchange_name, before, server_ms, self.clock())
+
+    def get_offset(self, exchange_name: str) -> float:
+        """获取交易所时钟偏移（秒），过期时重新校准"""
+        if self._needs_clock_sync(exchange_name):
+            self._sync_clock(exchange_name)
+        return self._offsets.get(exchange_name, 0.0)
+
+    def next_close_time(self, exchange_name: str, timeframe: str, now: float = None) -> float:
+        """返回 (exchange, timeframe) 下一次收盘对应的本地时间（秒）"""
+        now = self.clock() if now is None else now
+        offset = self.get_offset(exchange_name)
+        server_close_ms = next_candle_close_ms(timeframe, int((now + offset) * 1000))
+        return server_close_ms / 1000 - offset
+
+    def _settled_close_ms(self, exchange_name: str, timeframe: str, now: float) -> int:
+        """now 时已过 settle_delay 的最近一次收盘（毫秒，交易所时间）；只用已知的时钟偏移，不触发校时"""
+        offset = self._offsets.get(exchange_name, 0.0)
+        # 取整到毫秒而非截断：在 收盘 + settle_delay 准时醒来时，浮点误差不能让这次收盘被算作尚未到期
+        return last_candle_close_ms(timeframe, round((now - self.settle_delay + offset) * 1000))
+
+    def _plan_wakeup(self, markets, max_wait: float):
+        """
+        返回唤醒时间：最早一次尚未返回的收盘 + settle_delay（最多 max_wait 秒后）。
+        首次出现的市场从当前已过 settle_delay 的收盘开始记录，不补发启动前的收盘；不再使用的市场不再记录。
+        """
+        now = self.clock()
+        markets = set(markets)
+        for market in list(self._dispatched):
+            if market not in markets:
+                del self._dispatched[market]
+        wake_at = now + max_wait
+        for exchange_name, timeframe in markets:
+            try:
+                settled_ms = self._settled_close_ms(exchange_name, timeframe, now)
+                dispatched_ms = self._dispatched.setdefault((exchange_name, timeframe), settled_ms)
+                if settled_ms > dispatched_ms:
+                    # 已过 settle_delay 的收盘尚未返回（例如上次提前醒来后忙于同步策略）：立即返回
+                    target = now
+                else:
+                    # 收盘在 (now - settle_delay, now] 内的尚在等待 settle_delay，仍以它为目标
+                    target = self.next_close_time(exchange_name, timeframe, now - self.settle_delay) + self.settle_delay
+            except Exception as e:
+                logger.error(f"Failed to schedule {exchange_name}:{timeframe}: {e}")
+                continue
+            wake_at = min(wake_at, target)
+        return wake_at
+
+    def _due(self):
+        """
+        返回自上次返回以来已有收盘过了 settle_delay 的 {(exchange, timeframe)} 并记为已返回，
+        同时记录实际唤醒比其中最早的收盘 + settle_delay 晚了多少
+        """
+        now = self.clock()
+        due = set()
+        earliest = None
+        for (exchange_name, timeframe), dispatched_ms in self._dispatched.items():
+            try:
+                close_ms = self._settled_close_ms(exchange_name, timeframe, now)
+            except Exception as e:
+                logger.error(f"Failed to schedule {exchange_name}:{timeframe}: {e}")
+                continue
+            if close_ms <= dispatched_ms:
+                continue
+            due.add((exchange_name, timeframe))
+            self._dispatched[(exchange_name, timeframe)] = close_ms
+            # 过了多个收盘时（如长时间阻塞）按最早未返回的那次收盘计算延迟
+            first_close = next_candle_close_ms(timeframe, dispatched_ms)
+            ready_at = first_close / 1000 - self._offsets.get(exchange_name, 0.0) + self.settle_delay
+            earliest = ready_at if earliest is None else min(earliest, ready_at)
+        if due:
+            loop_lag_seconds('scheduler').observe(max(0.0, now - earliest))
+        return due
+
+    def wait(self, markets, max_wait: float, wake_event=None):
+        """
+        睡眠到下一次 K 线收盘 + settle_delay（最多 max_wait 秒），返回自上次返回以来收盘的 {(exchange, timeframe)}；
+        因 max_wait 或 wake_event（例如策略配置变更）提前醒来时只返回已过 settle_delay 的部分（通常为空集合）。
+        """
+        delay = self._plan_wakeup(markets, max_wait) - self.clock()
+        if delay > 0:
+            if wake_event is not None:
+                wake_event.wait(delay)
+            else:
+                self.sleep(delay)
+        return self._due()
+
+    async def wait_async(self, markets, max_wait: float, wake_event=None):
+        """wait() 的 asyncio 版本，exchange_manager 需为 AsyncExchangeManager；wake_event 为 WakeEvent"""
+        for exchange_name in {exchange_name for exchange_name, _ in markets}:
+            if self._needs_clock_sync(exchange_name):
+                before = self.clock()
+                server_ms = await self.exchange_manager.get_server_time(exchange_name)
+                self._record_offset(exchange_name, before, server_ms, self.clock())
+
+        delay = self._plan_wakeup(markets, max_wait) - self.clock()
+        if delay > 0:
+            if wake_event is not None:
+                await wake_event.wait_async(delay)
+            else:
+                await asyncio.sleep(delay)
+        return self._due()
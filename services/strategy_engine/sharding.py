@@ -0,0 +1,119 @@
+import atexit
+import bisect
+import hashlib
+import json
+import os
+import socket
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+def _hash(value: str) -> int:
+    return int.from_bytes(hashlib.md5(value.encode()).digest()[:8], 'big')
+
+
+def strategy_shard_key(config_json: str, strategy_id) -> str:
+    """策略的分片键 exchange:symbol（同一市场的策略落在同一节点上，共享 K 线缓冲区和指标缓存）"""
+    try:
+        config = json.loads(config_json or '{}')
+    except ValueError:
+        return f"strategy:{strategy_id}"
+    return f"{config.get('exchange', 'binance')}:{config.get('symbol', 'BTC/USDT')}"
+
+
+class HashRing:
+    """一致性哈希环：每个节点映射 vnodes 个虚拟节点，节点增减时只有约 1/N 的键需要迁移"""
+
+    def __init__(self, nodes=(), vnodes: int = 128):
+        self.vnodes = vnodes
+        self.nodes = tuple(sorted(nodes))
+        points = sorted((_hash(f"{node}#{i}"), node) for node in self.nodes for i in range(vnodes))
+        self._keys = [point for point, _ in points]
+        self._owners = [node for _, node in points]
+
+    def owner(self, key: str):
+        if not self._keys:
+            return None
+        index = bisect.bisect(self._keys, _hash(key)) % len(self._keys)
+        return self._owners[index]
+
+
+class ShardCoordinator:
+    """
+    多副本分片：每个引擎实例在 Redis 有序集合中登记心跳（score 为 Redis 服务器时间），
+    心跳超过 node_ttl 的节点视为下线。所有节点按相同的存活列表构建一致性哈希环，
+    各自只运行分到自己的策略；节点加入或下线后，在下一次策略同步时迁移受影响的策略。
+    Redis 不可用时沿用最后一次已知的成员列表，避免全部策略被停掉。
+    """
+
+    def __init__(self, redis_client, node_id: str = None, heartbeat_interval: float = 5.0,
+                 node_ttl: float = 15.0, vnodes: int = 128, key: str = 'strategy_engine:nodes', on_change=None):
+        self.redis_client = redis_client
+        self.node_id = node_id or f"{socket.gethostname()}-{os.getpid()}"
+        self.heartbeat_interval = heartbeat_interval
+        self.node_ttl = node_ttl
+        self.vnodes = vnodes
+        self.key = key
+        self.ring = HashRing([self.node_id], vnodes)
+        self.generation = 0  # 成员变化次数，策略同步据此判断是否需要重新分配
+        self.on_change = on_change  # 成员变化时调用（在心跳线程中），主循环据此立即醒来重新分配策略
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _heartbeat(self):
+        """登记本节点心跳，清理过期节点，返回存活节点列表"""
+        seconds, micros = self.redis_client.time()
+        now = seconds + micros / 1e6
+        pipe = self.redis_client.pipeline()
+        pipe.zadd(self.key, {self.node_id: now})
+        pipe.zremrangebyscore(self.key, '-inf', now - self.node_ttl)
+        pipe.zrange(self.key, 0, -1)
+        nodes = pipe.execute()[-1]
+        return [node.decode() if isinstance(node, bytes) else node for node in nodes]
+
+    def refresh(self):
+        """发送心跳并在成员变化时重建哈希环"""
+        try:
+            nodes = self._heartbeat()
+        except Exception as e:
+            logger.error(f"Shard heartbeat failed, keeping last known membership {list(self.ring.nodes)}: {e}")
+            return
+        if self.node_id not in nodes:
+            nodes.append(self.node_id)
+        if tuple(sorted(nodes)) != self.ring.nodes:
+            previous = self.ring.nodes
+            self.ring = HashRing(nodes, self.vnodes)
+            self.generation += 1
+            logger.info(f"🔀 Shard membership changed: {list(previous)} -> {list(self.ring.nodes)} (this node: {self.node_id})")
+            if self.on_change:
+                self.on_change()
+
+    def _run(self):
+        while not self._stop.wait(self.heartbeat_interval):
+            self.refresh()
+
+    def start(self):
+        """登记本节点并启动后台心跳线程"""
+        self.refresh()
+        self._thread = threading.Thread(target=self._run, name='shard-heartbeat', daemon=True)
+        self._thread.start()
+        atexit.register(self.stop)
+        logger.info(f"🔀 Sharding enabled as node {self.node_id}, {len(self.ring.nodes)} live node(s)")
+
+    def stop(self):
+        """注销本节点，其他节点在下一次同步时接管本节点的策略"""
+        if self._stop.is_set():
+            return
+        self._stop.set()
+        try:
+            self.redis_client.zrem(self.key, self.node_id)
+        except Exception as e:
+            logger.warning(f"Failed to deregister shard node {self.node_id}: {e}")
+
+    def owns(self, shard_key: str) -> bool:
+        return self.ring.owner(shard_key) == self.node_id
+
+    def get_stats(self):
+        return {'node_id': self.node_id, 'nodes': list(self.ring.nodes)}
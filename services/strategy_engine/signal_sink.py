@@ -0,0 +1,236 @@
+import json
+import queue
+import time
+import uuid
+import logging
+import threading
+from sqlalchemy import insert
+from models import Signal, SignalOutbox
+from metrics import SIGNAL_EMIT_SECONDS, db_write_seconds
+
+logger = logging.getLogger(__name__)
+
+_STOP = object()
+
+
+class SignalSink:
+    """
+    写后（write-behind）信号落库：
+    策略线程只把信号放入有界队列；单个后台线程攒批后，在同一事务中用多行 INSERT 写入 signals 表
+    和 signal_outbox 发件箱，提交后唤醒 OutboxRelay 转发到 Redis Stream。
+    单线程按入队顺序处理，保证同一策略的信号顺序不变。
+    队列满时 submit() 阻塞（背压），stop() 会把剩余信号全部写完。
+    写入失败的信号不会丢弃：
+    - 整批都写不进去（数据库不可用）时留在积压中按指数退避重试，新信号按顺序排在其后；
+    - 同批其他信号写入成功、只有个别写不进去（坏数据），或重试 max_retries 次仍失败、或正在停止时，
+      经 relay.publish() 直接发布到 Redis Stream（不落库），消费端照常收到。
+    """
+
+    def __init__(self, session_factory, relay=None, max_queue: int = 10000,
+                 batch_size: int = 200, flush_interval: float = 0.2,
+                 retry_delay: float = 1.0, retry_max_delay: float = 30.0, max_retries: int = 5):
+        self.session_factory = session_factory
+        self.relay = relay
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.retry_delay = retry_delay
+        self.retry_max_delay = retry_max_delay
+        self.max_retries = max_retries
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._thread = None
+        self._lock = threading.Lock()
+        self._backlog = []  # 写入失败、等待重试的 [(submitted_at, signal_data)]，只由后台线程访问
+        self._retries = 0
+        self._retry_at = 0.0
+        self.stats = {
+            'submitted': 0, 'flushed': 0, 'flushes': 0, 'db_errors': 0, 'retries': 0,
+            'published_direct': 0, 'lost': 0,
+            'flush_latency_total': 0.0, 'flush_latency_max': 0.0, 'queue_wait_max': 0.0,
+        }
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='signal-sink', daemon=True)
+            self._thread.start()
+
+    def submit(self, signal_data: dict):
+        """放入待写队列（线程安全），队列满时阻塞直到有空位"""
+        self.start()
+        # 幂等键在入队时生成，逐条重试时保持不变
+        item = (time.monotonic(), dict(signal_data, idempotency_key=uuid.uuid4().hex))
+        try:
+            self._queue.put_nowait(item)
+        except queue.Full:
+            logger.warning(f"Signal queue full ({self._queue.maxsize}), blocking strategy thread until it drains")
+            self._queue.put(item)
+        with self._lock:
+            self.stats['submitted'] += 1
+
+    def _next_batch(self, timeout: float = None):
+        """阻塞取第一条（最多 timeout 秒），然后在 flush_interval 内攒够 batch_size 条；收到停止标记时返回 (batch, True)"""
+        try:
+            first = self._queue.get(timeout=timeout)
+        except queue.Empty:
+            return [], False
+        if first is _STOP:
+            return [], True
+        batch = [first]
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is _STOP:
+                return batch, True
+            batch.append(item)
+        return batch, False
+
+    def _run(self):
+        stopping = False
+        while not stopping:
+            timeout = max(0.0, self._retry_at - time.monotonic()) if self._backlog else None
+            batch, stopping = self._next_batch(timeout)
+            if self._backlog and not stopping and time.monotonic() < self._retry_at:
+                # 退避期间不写库，新信号按顺序排在积压之后
+                self._backlog.extend(batch)
+                continue
+            if batch or self._backlog:
+                self._flush(batch)
+        # 停止时把队列里剩下的信号也写完，仍写不进去的直接发布
+        rest = []
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is not _STOP:
+                rest.append(item)
+        self._flush(rest, final=True)
+
+    def _rows(self, signals):
+        return [
+            {
+                'strategy_id': s['strategy_id'],
+                'symbol': s['symbol'],
+                'side': s['side'],
+                'price': s['price'],
+                'reason': s['reason'],
+            }
+            for s in signals
+        ]
+
+    def _write(self, db, signals):
+        """同一事务写入 Signal 与对应的发件箱记录"""
+        started = time.perf_counter()
+        signal_ids = db.scalars(
+            insert(Signal).returning(Signal.id, sort_by_parameter_order=True),
+            self._rows(signals)
+        ).all()
+        db.execute(insert(SignalOutbox), [
+            {
+                'signal_id': signal_id,
+                'idempotency_key': signal_data['idempotency_key'],
+                'payload': json.dumps(dict(signal_data, signal_id=signal_id)),
+            }
+            for signal_id, signal_data in zip(signal_ids, signals)
+        ])
+        db.commit()
+        db_write_seconds('signal_batch').observe(time.perf_counter() - started)
+
+    def _insert(self, signals):
+        """多行 INSERT；整批失败时逐条重试，避免一条坏数据拖累整批。返回仍未写入的信号"""
+        db = self.session_factory()
+        try:
+            self._write(db, signals)
+            return []
+        except Exception as e:
+            db.rollback()
+            logger.error(f"Batch insert of {len(signals)} signals failed, retrying one by one: {e}")
+        finally:
+            db.close()
+
+        failed = []
+        for signal_data in signals:
+            db = self.session_factory()
+            try:
+                self._write(db, [signal_data])
+            except Exception as e:
+                db.rollback()
+                with self._lock:
+                    self.stats['db_errors'] += 1
+                logger.error(f"Failed to save signal to DB: {e} ({signal_data})")
+                failed.append(signal_data)
+            finally:
+                db.close()
+        return failed
+
+    def _publish_direct(self, items):
+        """把写不进数据库的信号直接发布到 Redis Stream；连 Redis 也不可用时只能记录日志"""
+        signals = [signal_data for _, signal_data in items]
+        published = self.relay is not None and self.relay.publish(signals)
+        with self._lock:
+            self.stats['published_direct' if published else 'lost'] += len(signals)
+        if not published:
+            logger.error(f"❌ {len(signals)} signals could be neither saved nor published: {signals}")
+
+    def _flush(self, batch, final: bool = False):
+        """写入积压和 batch；失败的信号留待退避重试，或直接发布（见类说明）"""
+        batch = self._backlog + batch
+        self._backlog = []
+        if not batch:
+            return
+        started = time.monotonic()
+        failed_ids = {id(signal_data) for signal_data in self._insert([signal_data for _, signal_data in batch])}
+        failed = [item for item in batch if id(item[1]) in failed_ids]
+        written = [item for item in batch if id(item[1]) not in failed_ids]
+        if failed:
+            self._retries += 1
+            if written or final or self._retries > self.max_retries:
+                # 数据库可用而这几条写不进去、重试次数用完或正在停止：不再重试
+                self._publish_direct(failed)
+                self._retries = 0
+            else:
+                self._backlog = failed
+                delay = min(self.retry_max_delay, self.retry_delay * 2 ** (self._retries - 1))
+                self._retry_at = time.monotonic() + delay
+                with self._lock:
+                    self.stats['retries'] += 1
+                logger.error(f"💥 {len(failed)} signals not saved (attempt {self._retries}/{self.max_retries}), retrying in {delay:.1f}s")
+        else:
+            self._retries = 0
+        if not written:
+            return
+
+        if self.relay:
+            self.relay.wake()
+        finished = time.monotonic()
+        latency = finished - started
+        for submitted_at, _ in written:
+            SIGNAL_EMIT_SECONDS.observe(finished - submitted_at)
+        with self._lock:
+            self.stats['flushes'] += 1
+            self.stats['flushed'] += len(written)
+            self.stats['flush_latency_total'] += latency
+            self.stats['flush_latency_max'] = max(self.stats['flush_latency_max'], latency)
+            self.stats['queue_wait_max'] = max(self.stats['queue_wait_max'], finished - written[0][0])
+        logger.info(f"Flushed {len(written)} signals to DB in {latency * 1000:.1f}ms")
+
+    def stop(self, timeout: float = 30.0):
+        """写完队列中的所有信号后停止后台线程"""
+        if self._thread is None or not self._thread.is_alive():
+            return
+        self._queue.put(_STOP)
+        self._thread.join(timeout)
+        if self._thread.is_alive():
+            logger.error(f"Signal sink did not drain within {timeout}s, {self._queue.qsize()} signals left")
+
+    def get_stats(self):
+        """队列深度、已写入条数与刷盘延迟"""
+        with self._lock:
+            stats = dict(self.stats)
+        stats['queue_depth'] = self._queue.qsize()
+        stats['backlog'] = len(self._backlog)
+        stats['flush_latency_avg'] = stats['flush_latency_total'] / stats['flushes'] if stats['flushes'] else 0.0
+        return stats
@@ -0,0 +1,107 @@
+import json
+import time
+import logging
+from metrics import redis_write_seconds
+
+logger = logging.getLogger(__name__)
+
+
+def _market_field(market) -> str:
+    return '|'.join(market)
+
+
+class StrategyStateStore:
+    """
+    策略运行时状态的 Redis 检查点：
+    - {prefix}:strategies  hash，策略 ID -> {'class', 'saved_at', 'state'}
+    - {prefix}:candles     hash，exchange|symbol|timeframe -> 最近若干根 K 线
+    引擎定期和退出时保存，启动策略时恢复，重启后不必重新拉取整段历史，也不会重复或漏发信号。
+    """
+
+    def __init__(self, redis_client, prefix: str = 'strategy_engine:state', candle_tail: int = 200):
+        self.redis_client = redis_client
+        self.prefix = prefix
+        self.candle_tail = candle_tail
+        self._strategies_key = f"{prefix}:strategies"
+        self._candles_key = f"{prefix}:candles"
+
+    def save(self, running_strategies: dict, candle_store=None):
+        """保存所有运行中策略的状态以及它们用到的 K 线尾部，返回保存的策略数"""
+        if not self.redis_client or not running_strategies:
+            return 0
+        started = time.monotonic()
+        now = time.time()
+        strategies = {}
+        markets = set()
+        for strategy_id, s_entry in running_strategies.items():
+            strategy = s_entry['instance']
+            try:
+                state = strategy.get_state()
+            except Exception as e:
+                logger.error(f"Failed to snapshot state of strategy {strategy_id}: {e}")
+                continue
+            strategies[str(strategy_id)] = json.dumps({
+                'class': type(strategy).__name__,
+                'saved_at': now,
+                'state': state,
+            })
+            markets.update(req.market for req in strategy.get_data_requirements())
+
+        candles = {}
+        if candle_store is not None:
+            candles = {
+                _market_field(market): json.dumps(rows)
+                for market, rows in candle_store.snapshot(markets, self.candle_tail).items()
+            }
+
+        try:
+            write_started = time.perf_counter()
+            pipe = self.redis_client.pipeline(transaction=False)
+            if strategies:
+                pipe.hset(self._strategies_key, mapping=strategies)
+            if candles:
+                pipe.hset(self._candles_key, mapping=candles)
+            pipe.execute()
+            redis_write_seconds('state_checkpoint').observe(time.perf_counter() - write_started)
+        except Exception as e:
+            logger.error(f"Failed to checkpoint strategy state: {e}")
+            return 0
+        logger.info(f"💾 Checkpointed {len(strategies)} strategies and {len(candles)} candle buffers in {(time.monotonic() - started) * 1000:.1f}ms")
+        return len(strategies)
+
+    def load(self, strategy_id, class_name: str):
+        """读取策略的状态快照；不存在、损坏或策略类型已变化时返回 None"""
+        if not self.redis_client:
+            return None
+        try:
+            raw = self.redis_client.hget(self._strategies_key, str(strategy_id))
+            if raw is None:
+                return None
+            checkpoint = json.loads(raw)
+        except Exception as e:
+            logger.warning(f"Failed to load checkpoint of strategy {strategy_id}: {e}")
+            return None
+        if checkpoint.get('class') != class_name:
+            return None
+        return checkpoint.get('state')
+
+    def load_candles(self, markets):
+        """读取 K 线快照 {market: rows}"""
+        markets = list(markets)
+        if not self.redis_client or not markets:
+            return {}
+        try:
+            values = self.redis_client.hmget(self._candles_key, [_market_field(m) for m in markets])
+        except Exception as e:
+            logger.warning(f"Failed to load candle checkpoints: {e}")
+            return {}
+        return {market: json.loads(raw) for market, raw in zip(markets, values) if raw}
+
+    def delete(self, strategy_id):
+        """策略被停用或删除时清除其状态，重新启用时从头开始"""
+        if not self.redis_client:
+            return
+        try:
+            self.redis_client.hdel(self._strategies_key, str(strategy_id))
+        except Exception as e:
+            logger.warning(f"Failed to delete checkpoint of strategy {strategy_id}: {e}")
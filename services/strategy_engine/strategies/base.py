@@ -1,15 +1,71 @@
 from abc import ABC, abstractmethod
+import asyncio
+from typing import NamedTuple
 import logging
 
 logger = logging.getLogger(__name__)
 
+class DataRequirement(NamedTuple):
+    """策略声明的行情数据需求：在哪个市场上至少需要多少根 K 线"""
+    exchange: str
+    symbol: str
+    timeframe: str
+    lookback: int
+
+    @property
+    def market(self):
+        return (self.exchange, self.symbol, self.timeframe)
+
+class IndicatorRequirement(NamedTuple):
+    """策略声明需要的指标：在 market 上计算 name 指标，参数为 params，由 IndicatorEngine 缓存并在 K 线收盘时增量计算"""
+    market: tuple  # (exchange, symbol, timeframe)
+    name: str
+    params: tuple
+
+class ConfigField(NamedTuple):
+    """策略配置项声明：值的类型、默认值（required=True 时必须在 config_json 中提供）与说明"""
+    type: type
+    default: object = None
+    required: bool = False
+    description: str = ''
+
+class StrategyConfigError(ValueError):
+    """config_json 不符合策略声明的 config_schema"""
+
 class BaseStrategy(ABC):
+    # 配置项声明 {key: ConfigField}，注册表创建策略前据此校验 config_json 并补全默认值
+    config_schema: dict = {}
+    # log_tick() 每多少个 tick 输出一条，引擎启动时按 LOG_SAMPLE_EVERY 设置
+    tick_log_every: int = 100
+
+    @classmethod
+    def validate_config(cls, config: dict) -> dict:
+        """按 config_schema 校验并转换配置，返回补全默认值后的新配置；未声明的键原样保留"""
+        validated = dict(config)
+        errors = []
+        for key, field in cls.config_schema.items():
+            if config.get(key) is None:
+                if field.required:
+                    errors.append(f"'{key}' is required")
+                else:
+                    validated[key] = field.default
+                continue
+            try:
+                validated[key] = field.type(config[key])
+            except (TypeError, ValueError):
+                errors.append(f"'{key}' must be {field.type.__name__}, got {config[key]!r}")
+        if errors:
+            raise StrategyConfigError(f"Invalid config for {cls.__name__}: {'; '.join(errors)}")
+        return validated
+
     def __init__(self, strategy_id: int, name: str, config: dict, exchange):
         self.strategy_id = strategy_id
         self.name = name
         self.config = config
         self.exchange = exchange
         self.is_running = False
+        self.indicator_engine = None  # 由主循环注入的共享指标服务，未注入时策略自行计算
+        self._tick_logs = 0
 
     @abstractmethod
     def start(self):
@@ -22,9 +78,81 @@ class BaseStrategy(ABC):
         pass
 
     @abstractmethod
-    def on_tick(self):
-        """Called on every tick/loop iteration"""
+    def on_tick(self, market_data: dict = None):
+        """
+        Called on every tick/loop iteration.
+        market_data: {(exchange, symbol, timeframe): 只读 Candles（按列的 OHLCV 数组）}，由主循环统一拉取，所有策略共享
+        """
         pass
 
+    async def on_tick_async(self, market_data: dict = None):
+        """
+        asyncio 引擎模式下的入口。
+        默认适配同步策略：在线程中执行 on_tick（信号回调中的数据库/Redis 写入是阻塞的），
+        原生异步策略可直接重写本方法。
+        """
+        await asyncio.to_thread(self.on_tick, market_data)
+
+    async def on_candle_close(self, event, market_data: dict):
+        """
+        推送模式下 K 线收盘事件的入口（event 为 CandleEvent）。
+        默认与轮询模式相同：用推送更新后的 K 线窗口执行一次 on_tick。
+        """
+        await self.on_tick_async(market_data)
+
+    def get_data_requirements(self):
+        """返回策略需要的行情数据列表 [DataRequirement]，主循环据此统一拉取"""
+        return []
+
+    def get_indicator_requirements(self):
+        """返回策略需要的指标列表 [IndicatorRequirement]，相同的 (market, 指标, 参数) 在所有策略间只计算一次"""
+        return []
+
+    def backtest_signals(self, ohlcv, prices):
+        """
+        向量化回测：返回在历史 K 线上逐 tick 执行 on_tick 会产生的信号 [(tick 序号 t, side, price, reason)]。
+        ohlcv 为已完成 K 线；第 t 次 tick 时 K 线 t 正在形成、当前价为 prices[t]，
+        策略看到的窗口是前 lookback - 1 根已完成 K 线加上这根未完成 K 线。
+        未实现的策略只能用逐事件方式回测（见 backtest.py）。
+        """
+        raise NotImplementedError
+
+    def get_state(self) -> dict:
+        """
+        返回可 JSON 序列化的运行时状态快照（指标累加器、防重复信号的标记等），
+        引擎定期和退出时保存，重启或修改参数后通过 restore_state() 恢复。默认无状态。
+        """
+        return {}
+
+    def restore_state(self, state: dict):
+        """从 get_state() 的快照恢复；快照中与当前配置不兼容的部分（如换了交易对）应忽略"""
+        pass
+
+    def get_ohlcv(self, requirement: DataRequirement, market_data: dict = None):
+        """
+        取出策略所需的最近 lookback 根 K 线（Candles 切片，不复制数据）。
+        主循环未提供该市场数据时（如单独调用 on_tick），直接从 K 线存储读取。
+        """
+        window = market_data.get(requirement.market) if market_data else None
+        if window is None:
+            window = self.exchange.candle_store.get_window(
+                requirement.symbol, requirement.timeframe, requirement.lookback, requirement.exchange
+            )
+            if window is None:
+                return None
+        return window[-requirement.lookback:]
+
     def log(self, message: str):
         logger.info(f"[{self.name}] {message}")
+
+    def log_tick(self, message: str, *args):
+        """
+        每个 tick 的例行状态日志（当前指标值、未触发原因等）：只在 DEBUG 级别输出，每 tick_log_every 条输出一条。
+        args 为 %-格式参数，未输出时不做格式化。
+        """
+        if not logger.isEnabledFor(logging.DEBUG):
+            return
+        count = self._tick_logs
+        self._tick_logs = count + 1
+        if count % self.tick_log_every == 0:
+            logger.debug(f"[%s] {message}", self.name, *args)
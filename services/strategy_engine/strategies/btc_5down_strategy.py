@@ -1,5 +1,5 @@
-from .base import BaseStrategy
-import pandas as pd
+from .base import BaseStrategy, ConfigField, DataRequirement
+import numpy as np
 import logging
 from datetime import datetime
 from pytz import timezone
@@ -8,15 +8,15 @@ from pytz import timezone
 CN_TZ = timezone('Asia/Shanghai')
 logger = logging.getLogger(__name__)
 
-# 缓存管理器（通过 set_cache_manager() 初始化）
-cache_manager = None
-
-def set_cache_manager(cm):
-    """设置缓存管理器"""
-    global cache_manager
-    cache_manager = cm
+SIGNAL_REASON = "连续5根1小时阴线确认，顺势追空 (5 Consecutive Bearish Candles -> Short)"
 
 class BtcFiveDownStrategy(BaseStrategy):
+    config_schema = {
+        'symbol': ConfigField(str, 'BTC/USDT', description='交易对'),
+        'timeframe': ConfigField(str, '1h', description='时间级别'),
+        'exchange': ConfigField(str, 'binance', description='交易所名称'),
+    }
+
     def __init__(self, strategy_id: int, name: str, config: dict, exchange, signal_callback):
         # 初始化父类
         super().__init__(strategy_id, name, config, exchange)
@@ -26,6 +26,7 @@ class BtcFiveDownStrategy(BaseStrategy):
         self.symbol = config.get('symbol', 'BTC/USDT')  # 交易对
         self.timeframe = config.get('timeframe', '1h')  # 时间级别
         self.exchange_name = config.get('exchange', 'binance')  # 交易所名称
+        self.lookback = 10  # 需要的 K 线数量（5 根已完成 + 未完成 + 冗余）
         
         # 状态记录：记录上一次处理的K线时间戳，防止单根K线重复报警
         self.last_processed_timestamp = None
@@ -38,7 +39,36 @@ class BtcFiveDownStrategy(BaseStrategy):
         self.is_running = False
         self.log("🛑 策略停止")
 
-    def on_tick(self):
+    def get_state(self):
+        return {
+            'market': [self.exchange_name, self.symbol, self.timeframe],
+            'last_processed_timestamp': self.last_processed_timestamp,
+        }
+
+    def restore_state(self, state: dict):
+        # 只在同一市场上恢复，避免换了交易对后跳过新市场的 K 线
+        if not state or state.get('market') != [self.exchange_name, self.symbol, self.timeframe]:
+            return
+        self.last_processed_timestamp = state.get('last_processed_timestamp')
+        self.log(f"♻️ 恢复状态: last_processed_timestamp={self.last_processed_timestamp}")
+
+    def get_data_requirements(self):
+        return [DataRequirement(self.exchange_name, self.symbol, self.timeframe, self.lookback)]
+
+    def backtest_signals(self, ohlcv, prices):
+        """
+        向量化回测：tick t 时最近 5 根已完成 K 线（t-5 ~ t-1）全部为阴线则按当前价做空。
+        每个 tick 的已完成 K 线都是新的一根，last_processed_timestamp 去重在回测中不会触发。
+        """
+        bearish = ohlcv[:, 4] < ohlcv[:, 1]
+        if len(ohlcv) <= 5:
+            return []
+        streak = np.lib.stride_tricks.sliding_window_view(bearish[:-1], 5).all(axis=1)  # streak[i]: i ~ i+4 全为阴线
+        ticks = np.flatnonzero(streak) + 5
+        ticks = ticks[ticks >= max(self.lookback, 6) - 1]
+        return [(int(t), "SELL", float(prices[t]), SIGNAL_REASON) for t in ticks]
+
+    def on_tick(self, market_data: dict = None):
         """
         每分钟执行一次的主逻辑
         """
@@ -46,37 +76,18 @@ class BtcFiveDownStrategy(BaseStrategy):
             return
 
         try:
-            # 1. 获取 K 线数据（优先从缓存）
-            cache_key = f"{self.exchange_name}:{self.symbol}:{self.timeframe}"
-            ohlcv = None
+            # 1. 获取 K 线数据（由主循环统一拉取的只读窗口）
+            ohlcv = self.get_ohlcv(self.get_data_requirements()[0], market_data)
             
-            # 尝试从缓存获取
-            if cache_manager:
-                ohlcv = cache_manager.get_cache('market_data', self.exchange_name, self.symbol, self.timeframe)
-                if ohlcv:
-                    self.log(f"✓ 使用缓存 OHLCV (BTC 5连阴策略) [{cache_key}]")
-            
-            # 缓存未命中，从交易所获取
-            if not ohlcv:
-                ohlcv = self.exchange.get_ohlcv(self.symbol, self.timeframe, limit=10, exchange_name=self.exchange_name)
-                # 存入缓存
-                if cache_manager and ohlcv:
-                    cache_manager.set_cache('market_data', self.exchange_name, self.symbol, ohlcv, self.timeframe)
-                    self.log(f"📦 缓存新 OHLCV (BTC 5连阴策略) [{cache_key}]")
-            
-            if not ohlcv or len(ohlcv) < 6:
-                self.log(f"K线数据不足: 只有 {len(ohlcv) if ohlcv else 0} 根 (从 {self.exchange_name})")
+            if ohlcv is None or len(ohlcv) < 6:
+                self.log(f"K线数据不足: 只有 {len(ohlcv) if ohlcv is not None else 0} 根 (从 {self.exchange_name})")
                 return
 
-            # 转换为 DataFrame
-            df = pd.DataFrame(ohlcv, columns=['timestamp', 'open', 'high', 'low', 'close', 'volume'])
-            
             # 2. 锁定"上一根已完成"的K线
-            # df.iloc[-1] 是当前正在走的K线（未完成）
-            # df.iloc[-2] 是刚刚走完的那根K线（即潜在的第5根阴线）
-            last_completed_idx = len(df) - 2
-            last_completed_candle = df.iloc[last_completed_idx]
-            last_completed_ts = int(last_completed_candle['timestamp'])
+            # ohlcv[-1] 是当前正在走的K线（未完成）
+            # ohlcv.last_closed() 是刚刚走完的那根K线（即潜在的第5根阴线）
+            last_completed_candle = ohlcv.last_closed()
+            last_completed_ts = last_completed_candle.timestamp
 
             # 3. 检查是否是新的一根K线
             # 只有当K线刚收盘（新的小时/周期开始）时才检查，避免在周期中间重复发信号
@@ -87,23 +98,21 @@ class BtcFiveDownStrategy(BaseStrategy):
             self.last_processed_timestamp = last_completed_ts
 
             # 4. 核心逻辑：检查最近 5 根已完成 K 线
-            # 从倒数第6根到倒数第2根（包含）= 共5根
-            start_idx = max(0, last_completed_idx - 4)
-            end_idx = last_completed_idx + 1
-            target_candles = df.iloc[start_idx:end_idx]
+            # 从倒数第6根到倒数第2根（包含）= 共5根（切片不复制数据）
+            target_candles = ohlcv.closed()[-5:]
             
             if len(target_candles) < 5:
                 self.log(f"K线数据不足以进行5根K线判断: 只有 {len(target_candles)} 根")
                 return
             
             # 判断是否全部为阴线 (Close < Open)
-            is_all_bearish = (target_candles['close'] < target_candles['open']).all()
+            is_all_bearish = bool((target_candles.close < target_candles.open).all())
 
             if is_all_bearish:
-                current_price = float(df['close'].iloc[-1])
+                current_price = float(ohlcv.close[-1])
                 
                 # 构造信号 - 做空 (SELL)
-                reason = "连续5根1小时阴线确认，顺势追空 (5 Consecutive Bearish Candles -> Short)"
+                reason = SIGNAL_REASON
                 self.log(f"⚡️ 信号触发: {reason} | 现价: {current_price}")
 
                 signal_data = {
@@ -119,7 +128,7 @@ class BtcFiveDownStrategy(BaseStrategy):
                 # 发送信号
                 self.signal_callback(signal_data)
             else:
-                self.log(f"K线检查完成: 未满足5连阴条件 (Last Close: {last_completed_candle['close']:.2f})")
+                self.log_tick("K线检查完成: 未满足5连阴条件 (Last Close: %.2f)", last_completed_candle.close)
 
         except Exception as e:
             logger.error(f"[{self.name}] 策略执行出错: {e}", exc_info=True)
\ No newline at end of file
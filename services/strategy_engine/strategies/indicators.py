@@ -0,0 +1,300 @@
+import math
+import numpy as np
+
+# wilder_average 每块的最大长度：块越长，块内累加的舍入误差越大（相对误差约 块长 × 机器精度）
+WILDER_BLOCK = 4096
+# vectorized_wilder_rsi 与逐根递推之差的保守上界（RSI 取值 0~100，实测误差在 1e-12 以下）
+RSI_TOLERANCE = 1e-7
+
+
+def _rsi_from_averages(avg_gain: float, avg_loss: float) -> float:
+    """由平均涨幅/跌幅计算 RSI；无波动时返回 NaN（不产生信号）"""
+    if avg_loss == 0:
+        return 100.0 if avg_gain > 0 else float('nan')
+    return 100.0 - 100.0 / (1.0 + avg_gain / avg_loss)
+
+
+def wilder_rsi_series(closes, period: int = 14):
+    """
+    批量计算 Wilder RSI（参考实现）。
+    前 period 个差值取简单平均作为种子，之后按 avg = (avg * (period - 1) + x) / period 平滑。
+    返回与 closes 等长的数组，前 period 个位置为 NaN。
+    """
+    closes = np.asarray(closes, dtype=np.float64)
+    out = np.full(len(closes), np.nan)
+    if len(closes) <= period:
+        return out
+    delta = np.diff(closes)
+    gains = np.where(delta > 0, delta, 0.0)
+    losses = np.where(delta < 0, -delta, 0.0)
+    avg_gain = gains[:period].mean()
+    avg_loss = losses[:period].mean()
+    out[period] = _rsi_from_averages(avg_gain, avg_loss)
+    for i in range(period, len(delta)):
+        avg_gain = (avg_gain * (period - 1) + gains[i]) / period
+        avg_loss = (avg_loss * (period - 1) + losses[i]) / period
+        out[i + 1] = _rsi_from_averages(avg_gain, avg_loss)
+    return out
+
+
+def _wilder_averages_batch(closes, periods):
+    """
+    wilder_rsi_batch 与 WilderRsi.warm_up_batch 共用的核心：按周期升序排列，时间方向逐根递推、周期方向向量化。
+    返回 (order, k, gains, losses, gain_hist, loss_hist)：sorted_periods = periods[order]，前 k 个周期数据足够，
+    hist 形状为 (k, 差值个数)，第 i 列为推入第 i 个差值后的平均涨幅/跌幅（种子之前为 NaN）。
+    种子用 sum() 累加、递推写成 (avg * (period - 1) + x) / period，逐位与 WilderRsi.update 相同。
+    """
+    closes = np.asarray(closes, dtype=np.float64)
+    periods = np.asarray(periods, dtype=np.int64)
+    n = max(len(closes) - 1, 0)  # 差值个数
+    delta = np.diff(closes)
+    gains = np.where(delta > 0, delta, 0.0)
+    losses = np.where(delta < 0, -delta, 0.0)
+    order = np.argsort(periods, kind='stable')
+    sorted_periods = periods[order]
+    k = int(np.searchsorted(sorted_periods, n, side='right'))  # 数据足够的周期数
+    gain_hist = np.full((k, n), np.nan)
+    loss_hist = np.full((k, n), np.nan)
+    if k == 0:
+        return order, k, gains, losses, gain_hist, loss_hist
+
+    p = sorted_periods[:k].astype(np.float64)
+    avg_gain = np.array([sum(gains[:period].tolist()) / period for period in sorted_periods[:k]])
+    avg_loss = np.array([sum(losses[:period].tolist()) / period for period in sorted_periods[:k]])
+    rows = np.arange(k)
+    gain_hist[rows, sorted_periods[:k] - 1] = avg_gain
+    loss_hist[rows, sorted_periods[:k] - 1] = avg_loss
+
+    # 第 i 步时已完成种子的周期恰好是前缀 [:active]
+    active = 0
+    for i in range(int(sorted_periods[0]), n):
+        while active < k and sorted_periods[active] <= i:
+            active += 1
+        avg_gain[:active] = (avg_gain[:active] * (p[:active] - 1) + gains[i]) / p[:active]
+        avg_loss[:active] = (avg_loss[:active] * (p[:active] - 1) + losses[i]) / p[:active]
+        gain_hist[:active, i] = avg_gain[:active]
+        loss_hist[:active, i] = avg_loss[:active]
+    return order, k, gains, losses, gain_hist, loss_hist
+
+
+def wilder_rsi_batch(closes, periods):
+    """
+    一次计算多个周期的 Wilder RSI，返回形状为 (len(periods), len(closes)) 的数组，行顺序与 periods 一致。
+    时间方向逐根递推，周期方向向量化；结果与逐个调用 wilder_rsi_series 相同。
+    """
+    order, k, _, _, gain_hist, loss_hist = _wilder_averages_batch(closes, periods)
+    out = np.full((len(order), len(closes)), np.nan)
+    if k == 0:
+        return out
+    with np.errstate(divide='ignore', invalid='ignore'):
+        rsi = 100.0 - 100.0 / (1.0 + gain_hist / loss_hist)
+    # avg_loss == 0: 有涨幅为 100，无波动为 NaN（与 _rsi_from_averages 一致）
+    rsi = np.where(loss_hist == 0, np.where(gain_hist > 0, 100.0, np.nan), rsi)
+    out[order[:k], 1:] = rsi
+    return out
+
+
+class WilderRsi:
+    """
+    流式 Wilder RSI：只保存平滑后的平均涨幅/跌幅和上一根收盘价。
+    - warm_up(): 用历史已完成 K 线一次性初始化
+    - update(): K 线收盘时 O(1) 更新
+    - peek():   用未完成 K 线的当前价格计算临时 RSI，不改变状态
+    """
+
+    def __init__(self, period: int = 14):
+        self.period = period
+        self.reset()
+
+    def reset(self):
+        self.avg_gain = None
+        self.avg_loss = None
+        self.last_close = None
+        self._seed = []  # 种子阶段累积的 (gain, loss)
+
+    @property
+    def ready(self):
+        return self.avg_gain is not None
+
+    def warm_up(self, closes):
+        """用已完成 K 线的收盘价序列初始化（会清空已有状态）"""
+        self.reset()
+        for close in closes:
+            self.update(close)
+        return self.value
+
+    @classmethod
+    def warm_up_batch(cls, closes, periods):
+        """
+        用同一段已完成 K 线一次预热多个周期，返回与 periods 顺序一致的 [WilderRsi]，
+        状态与逐个调用 warm_up(closes) 完全相同，周期方向向量化（见 wilder_rsi_batch）。
+        """
+        order, k, gains, losses, gain_hist, loss_hist = _wilder_averages_batch(closes, periods)
+        last_close = float(closes[-1]) if len(closes) else None
+        seed = [[float(g), float(l)] for g, l in zip(gains, losses)]  # 数据不足的周期仍处于种子阶段
+        instances = [None] * len(order)
+        for rank, index in enumerate(order):
+            rsi = cls(int(periods[index]))
+            ready = rank < k
+            rsi.set_state({
+                'period': rsi.period,
+                'avg_gain': float(gain_hist[rank, -1]) if ready else None,
+                'avg_loss': float(loss_hist[rank, -1]) if ready else None,
+                'last_close': last_close,
+                'seed': [] if ready else seed,
+            })
+            instances[index] = rsi
+        return instances
+
+    def update(self, close: float):
+        """推入一根已完成 K 线的收盘价，返回更新后的 RSI（未就绪时为 NaN）"""
+        close = float(close)
+        if self.last_close is None:
+            self.last_close = close
+            return float('nan')
+
+        delta = close - self.last_close
+        gain = delta if delta > 0 else 0.0
+        loss = -delta if delta < 0 else 0.0
+        self.last_close = close
+
+        if self.avg_gain is None:
+            self._seed.append((gain, loss))
+            if len(self._seed) < self.period:
+                return float('nan')
+            self.avg_gain = sum(g for g, _ in self._seed) / self.period
+            self.avg_loss = sum(l for _, l in self._seed) / self.period
+            self._seed = []
+        else:
+            self.avg_gain = (self.avg_gain * (self.period - 1) + gain) / self.period
+            self.avg_loss = (self.avg_loss * (self.period - 1) + loss) / self.period
+        return self.value
+
+    @property
+    def value(self):
+        """最近一根已完成 K 线的 RSI"""
+        if not self.ready:
+            return float('nan')
+        return _rsi_from_averages(self.avg_gain, self.avg_loss)
+
+    def get_state(self):
+        """可 JSON 序列化的状态快照"""
+        return {
+            'period': self.period,
+            'avg_gain': self.avg_gain,
+            'avg_loss': self.avg_loss,
+            'last_close': self.last_close,
+            'seed': [list(pair) for pair in self._seed],
+        }
+
+    def set_state(self, state):
+        """从 get_state() 的快照恢复，周期不同时返回 False 且不修改状态"""
+        if not state or state.get('period') != self.period:
+            return False
+        self.avg_gain = state['avg_gain']
+        self.avg_loss = state['avg_loss']
+        self.last_close = state['last_close']
+        self._seed = [tuple(pair) for pair in state.get('seed', [])]
+        return True
+
+    def peek(self, close: float):
+        """以 close 作为下一根（未完成）K 线的收盘价，计算临时 RSI，不修改状态"""
+        if not self.ready:
+            return float('nan')
+        delta = float(close) - self.last_close
+        gain = delta if delta > 0 else 0.0
+        loss = -delta if delta < 0 else 0.0
+        avg_gain = (self.avg_gain * (self.period - 1) + gain) / self.period
+        avg_loss = (self.avg_loss * (self.period - 1) + loss) / self.period
+        return _rsi_from_averages(avg_gain, avg_loss)
+
+
+def wilder_average(x, period: int):
+    """
+    Wilder 平滑的向量化实现：out[j] 为依次推入 x[:j + 1] 后的平均值，j < period - 1 时为 NaN。
+    种子为前 period 个值的简单平均，之后的递推 avg = (avg * (period - 1) + x) / period 写成闭式
+    avg[s + i] = w^(i+1) * (avg[s - 1] + Σ_{m≤i} w^-(m+1) * x[s + m] / period)，w = (period - 1) / period；
+    按块计算以免 w^-i 溢出，所有块的块内累加一次完成，块之间只递推一个标量。
+    与逐根递推只差浮点舍入，相对误差约为 块长 × 机器精度。
+    """
+    x = np.asarray(x, dtype=np.float64)
+    out = np.full(len(x), np.nan)
+    if len(x) < period:
+        return out
+    seed = sum(x[:period].tolist()) / period
+    out[period - 1] = seed
+    count = len(x) - period
+    if count == 0:
+        return out
+    if period == 1:
+        out[1:] = x[1:]  # w = 0：平均值就是当前值
+        return out
+
+    w = (period - 1) / period
+    block = max(1, min(WILDER_BLOCK, int(250 / -math.log10(w))))  # 保证 w^-block <= 1e250
+    blocks = -(-count // block)
+    padded = np.zeros(blocks * block)
+    padded[:count] = x[period:] / period
+    decay = w ** np.arange(1, block + 1)  # w^(i+1)
+    local = np.cumsum(padded.reshape(blocks, block) / decay, axis=1) * decay  # 每块从 0 开始平滑的结果
+    carries = np.empty(blocks)
+    carry, block_decay = seed, decay[-1]
+    for b, end in enumerate(local[:, -1].tolist()):
+        carries[b] = carry
+        carry = carry * block_decay + end
+    out[period:] = (local + carries[:, None] * decay).ravel()[:count]
+    return out
+
+
+def vectorized_wilder_rsi(closes, period: int = 14, last_closes=None):
+    """
+    streaming_wilder_rsi 的向量化版本（用于回测）：平均涨幅/跌幅由 wilder_average 一次算出，
+    位置 t 的值同样是推入 closes[:t] 后以 last_closes[t] peek 的结果，与逐根递推只差浮点舍入。
+    返回 (rsi, uncertain)：uncertain 标出平均跌幅接近下溢的位置——逐根递推可能恰好为 0（RSI 为 100 或 NaN）
+    而这里不为 0（或相反），需要精确结果时应改用 streaming_wilder_rsi。
+    """
+    closes = np.asarray(closes, dtype=np.float64)
+    last_closes = closes if last_closes is None else np.asarray(last_closes, dtype=np.float64)
+    out = np.full(len(closes), np.nan)
+    uncertain = np.zeros(len(closes), dtype=bool)
+    if len(closes) < period + 2:
+        return out, uncertain
+
+    delta = np.diff(closes)
+    gains = np.where(delta > 0, delta, 0.0)
+    losses = np.where(delta < 0, -delta, 0.0)
+    avg_gain = wilder_average(gains, period)
+    avg_loss = wilder_average(losses, period)
+
+    # tick t 时已推入 t - 1 个差值，状态为第 t - 2 个差值处的平均值，period + 1 起就绪
+    t = np.arange(period + 1, len(closes))
+    peek_delta = last_closes[t] - closes[t - 1]
+    peek_gain = np.where(peek_delta > 0, peek_delta, 0.0)
+    peek_loss = np.where(peek_delta < 0, -peek_delta, 0.0)
+    ag = (avg_gain[t - 2] * (period - 1) + peek_gain) / period
+    al = (avg_loss[t - 2] * (period - 1) + peek_loss) / period
+    with np.errstate(divide='ignore', invalid='ignore', over='ignore'):
+        rsi = 100.0 - 100.0 / (1.0 + ag / al)
+    out[t] = np.where(al == 0, np.where(ag > 0, 100.0, np.nan), rsi)
+    if period > 1:
+        had_loss = np.cumsum(losses)[t - 2] > 0
+        uncertain[t] = had_loss & (avg_loss[t - 2] < 1e-250) & (peek_loss < 1e-250)
+    return out, uncertain
+
+
+def streaming_wilder_rsi(closes, period: int = 14, last_closes=None):
+    """
+    逐 tick 的流式 Wilder RSI（回测的精确参考）：位置 t 的值为 WilderRsi 依次推入已完成 K 线 closes[:t] 后，
+    以 last_closes[t]（默认 closes[t]）作为未完成 K 线价格 peek 的结果。
+    与 IndicatorEngine 从序列开头预热、之后逐根延伸得到的值逐位相同；按时间顺序单次遍历，是 Python 循环，
+    大量数据时先用 vectorized_wilder_rsi，只在结果落在舍入误差内会改变信号时回退到这里。
+    """
+    closes = np.asarray(closes, dtype=np.float64)
+    last_closes = closes if last_closes is None else np.asarray(last_closes, dtype=np.float64)
+    out = np.full(len(closes), np.nan)
+    rsi = WilderRsi(period)
+    for t in range(len(closes)):
+        if t:
+            rsi.update(closes[t - 1])
+        out[t] = rsi.peek(last_closes[t])
+    return out
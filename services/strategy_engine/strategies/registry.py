@@ -0,0 +1,108 @@
+import time
+import logging
+import importlib
+from importlib.metadata import entry_points
+from .base import BaseStrategy
+
+logger = logging.getLogger(__name__)
+
+# 第三方包可通过该入口点组注册策略：名称为策略类型，值为 "module:Class"
+ENTRY_POINT_GROUP = 'strategy_engine.strategies'
+
+# 内置策略类型 -> "module:Class"，只在第一次用到时导入
+BUILTIN_STRATEGIES = {
+    'rsi': 'strategies.rsi_strategy:RsiStrategy',
+    'btc_5down': 'strategies.btc_5down_strategy:BtcFiveDownStrategy',
+}
+
+# config_json 中没有 type 的旧策略按名称映射到类型
+LEGACY_STRATEGY_NAMES = {
+    'RSI Strategy': 'rsi',
+    'BTC 5连阴策略': 'btc_5down',
+    'btc_5down': 'btc_5down',
+}
+
+
+class UnknownStrategyError(LookupError):
+    """config_json 中的策略类型未注册（或旧策略名称无法映射到类型）"""
+
+
+class StrategyRegistry:
+    """
+    策略类型注册表：策略由 config_json 中的 type 字段（旧数据按策略名称）确定类型，
+    类型到类的映射来自内置表和 Python 入口点，策略模块在第一次创建该类型的策略时才导入，
+    引擎启动时不再加载所有策略及其依赖（如 pandas）。
+    """
+
+    def __init__(self, builtins: dict = None, legacy_names: dict = None, group: str = ENTRY_POINT_GROUP):
+        self._targets = dict(BUILTIN_STRATEGIES if builtins is None else builtins)
+        self._legacy_names = dict(LEGACY_STRATEGY_NAMES if legacy_names is None else legacy_names)
+        self._group = group
+        self._entry_points_loaded = False
+        self._classes = {}  # {type: class}，已导入的策略类
+
+    def register(self, strategy_type: str, target):
+        """注册策略类型，target 可以是策略类或 "module:Class" 字符串"""
+        if isinstance(target, str):
+            self._targets[strategy_type] = target
+            self._classes.pop(strategy_type, None)
+        else:
+            self._classes[strategy_type] = self._check_class(strategy_type, target)
+
+    def _load_entry_points(self):
+        """读取入口点元数据（不导入模块），内置类型优先"""
+        if self._entry_points_loaded:
+            return
+        self._entry_points_loaded = True
+        for ep in entry_points(group=self._group):
+            if ep.name in self._targets:
+                logger.warning(f"Strategy type '{ep.name}' from entry point {ep.value} shadows an existing type, ignored")
+                continue
+            self._targets[ep.name] = ep.value
+
+    def available_types(self):
+        self._load_entry_points()
+        return sorted(set(self._targets) | set(self._classes))
+
+    def resolve_type(self, name: str, config: dict) -> str:
+        """策略类型：优先取 config_json 中的 type，其次按旧策略名称映射"""
+        strategy_type = config.get('type') or self._legacy_names.get(name)
+        if not strategy_type:
+            raise UnknownStrategyError(
+                f"Strategy '{name}' has no 'type' in config_json; known types: {', '.join(self.available_types())}"
+            )
+        return strategy_type
+
+    def get(self, strategy_type: str):
+        """返回策略类，首次调用时导入所在模块"""
+        cls = self._classes.get(strategy_type)
+        if cls is not None:
+            return cls
+        target = self._targets.get(strategy_type)
+        if target is None:
+            self._load_entry_points()
+            target = self._targets.get(strategy_type)
+        if target is None:
+            raise UnknownStrategyError(
+                f"Unknown strategy type '{strategy_type}'; known types: {', '.join(self.available_types())}"
+            )
+
+        started = time.monotonic()
+        module_name, _, class_name = target.partition(':')
+        cls = getattr(importlib.import_module(module_name), class_name)
+        self._classes[strategy_type] = self._check_class(strategy_type, cls)
+        logger.info(f"📦 Loaded strategy type '{strategy_type}' ({target}) in {(time.monotonic() - started) * 1000:.0f}ms")
+        return cls
+
+    def _check_class(self, strategy_type: str, cls):
+        if not (isinstance(cls, type) and issubclass(cls, BaseStrategy)):
+            raise TypeError(f"Strategy type '{strategy_type}' must be a BaseStrategy subclass, got {cls!r}")
+        return cls
+
+    def resolve(self, name: str, config: dict):
+        """返回 (策略类, 校验后的配置)；类型未知或配置不合法时抛出异常"""
+        cls = self.get(self.resolve_type(name, config))
+        return cls, cls.validate_config(config)
+
+
+strategy_registry = StrategyRegistry()
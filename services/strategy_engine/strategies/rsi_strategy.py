@@ -1,5 +1,5 @@
-from .base import BaseStrategy
-import pandas as pd
+from .base import BaseStrategy, ConfigField, DataRequirement, IndicatorRequirement
+from .indicators import RSI_TOLERANCE, WilderRsi, streaming_wilder_rsi, vectorized_wilder_rsi
 import numpy as np
 import logging
 from datetime import datetime
@@ -10,15 +10,16 @@ CN_TZ = timezone('Asia/Shanghai')
 
 logger = logging.getLogger(__name__)
 
-# 导入缓存管理器（延迟导入以避免循环依赖）
-cache_manager = None
-
-def set_cache_manager(cm):
-    """设置缓存管理器（在 main.py 中调用）"""
-    global cache_manager
-    cache_manager = cm
-
 class RsiStrategy(BaseStrategy):
+    config_schema = {
+        'symbol': ConfigField(str, 'BTC/USDT', description='交易对'),
+        'timeframe': ConfigField(str, '1h', description='K 线周期'),
+        'exchange': ConfigField(str, 'binance', description='交易所'),
+        'rsi_period': ConfigField(int, 14, description='RSI 周期'),
+        'rsi_overbought': ConfigField(int, 70, description='超买阈值'),
+        'rsi_oversold': ConfigField(int, 30, description='超卖阈值'),
+    }
+
     def __init__(self, strategy_id: int, name: str, config: dict, exchange, signal_callback):
         super().__init__(strategy_id, name, config, exchange)
         self.signal_callback = signal_callback
@@ -30,9 +31,15 @@ class RsiStrategy(BaseStrategy):
         self.rsi_period = int(config.get('rsi_period', 14))
         self.rsi_overbought = int(config.get('rsi_overbought', 70))
         self.rsi_oversold = int(config.get('rsi_oversold', 30))
+        self.lookback = 100  # 计算 RSI 使用的 K 线数量
         
         self.last_signal_rsi = None  # 记录上次信号时的RSI状态（0=正常, 1=超卖, 2=超买）
 
+        # 流式 RSI 状态：只在 K 线收盘时 O(1) 更新，未完成 K 线只计算临时值；
+        # 只在未注入 IndicatorEngine 时使用（单独运行），注入后 RSI 由引擎的共享累加器计算
+        self.rsi = WilderRsi(self.rsi_period)
+        self.rsi_last_ts = None  # 最后一根已推入 RSI 状态的已完成 K 线时间戳
+
     def start(self):
         self.is_running = True
         self.log(f"🚀 Started RSI Strategy for {self.symbol} ({self.timeframe}) @ {self.exchange_name}")
@@ -41,63 +48,138 @@ class RsiStrategy(BaseStrategy):
         self.is_running = False
         self.log("Stopped RSI Strategy")
 
-    def calculate_rsi(self, closes):
-        delta = closes.diff()
-        gain = (delta.where(delta > 0, 0)).rolling(window=self.rsi_period).mean()
-        loss = (-delta.where(delta < 0, 0)).rolling(window=self.rsi_period).mean()
-        rs = gain / loss
-        return 100 - (100 / (1 + rs))
+    def update_rsi(self, ohlcv):
+        """
+        将窗口中新收盘的 K 线推入 RSI 状态，返回以最后一根（未完成）K 线价格计算的临时 RSI。
+        首次调用或断档（上次处理的 K 线已不在窗口内）时用窗口内全部已完成 K 线重新预热。
+        """
+        timestamps = ohlcv.timestamp
+        closes = ohlcv.close
+        closed_count = len(ohlcv) - 1  # 最后一根是正在走的 K 线
+
+        if self.rsi_last_ts is not None:
+            pos = int(np.searchsorted(timestamps[:closed_count], self.rsi_last_ts))
+            if pos < closed_count and timestamps[pos] == self.rsi_last_ts:
+                for close in closes[pos + 1:closed_count]:
+                    self.rsi.update(close)
+            else:
+                self.rsi_last_ts = None
+
+        if self.rsi_last_ts is None:
+            self.rsi.warm_up(closes[:closed_count])
+        if closed_count > 0:
+            self.rsi_last_ts = timestamps[closed_count - 1]
+
+        return self.rsi.peek(closes[-1])
+
+    def classify(self, rsi: float):
+        """RSI 所处区间，返回 (signal_side, rsi_state, reason)，rsi_state: 0=正常, 1=超卖, 2=超买"""
+        if rsi < self.rsi_oversold:
+            return "BUY", 1, f"RSI ({rsi:.2f}) < {self.rsi_oversold} (Oversold)"
+        if rsi > self.rsi_overbought:
+            return "SELL", 2, f"RSI ({rsi:.2f}) > {self.rsi_overbought} (Overbought)"
+        return None, 0, ""
+
+    def backtest_signals(self, ohlcv, prices):
+        """
+        向量化回测：每个 tick 的 RSI 由 vectorized_wilder_rsi 一次算出（对应 IndicatorEngine 在首个窗口预热、之后逐根延伸的值），
+        再按 last_signal_rsi 状态机筛选——只有进入与上次信号不同的区间时才发信号。
+        向量化结果与逐根递推只差浮点舍入；有值落在舍入误差内可能改变信号（阈值、reason 中两位小数的进位）时，
+        改用逐根递推的 streaming_wilder_rsi 重算，保证与逐事件回测完全一致。
+        """
+        closes = ohlcv[:, 4]
+        rsi, uncertain = vectorized_wilder_rsi(closes, self.rsi_period, last_closes=prices)
+        rsi[:self.lookback - 1] = np.nan  # 窗口不满 lookback 时引擎不执行策略
+        uncertain[:self.lookback - 1] = False
+        signals = self._signals_from_rsi(rsi, prices)
+        if uncertain.any() or self._near_boundary(rsi, signals):
+            rsi = streaming_wilder_rsi(closes, self.rsi_period, last_closes=prices)
+            rsi[:self.lookback - 1] = np.nan
+            signals = self._signals_from_rsi(rsi, prices)
+        return signals
+
+    def _signals_from_rsi(self, rsi, prices):
+        with np.errstate(invalid='ignore'):
+            states = np.where(rsi < self.rsi_oversold, 1, np.where(rsi > self.rsi_overbought, 2, 0))
+        ticks = np.flatnonzero(states)
+        changed = states[ticks] != np.concatenate(([-1 if self.last_signal_rsi is None else self.last_signal_rsi], states[ticks][:-1]))
+        signals = []
+        for t in ticks[changed]:
+            side, _, reason = self.classify(float(rsi[t]))
+            signals.append((int(t), side, float(prices[t]), reason))
+        return signals
+
+    def _near_boundary(self, rsi, signals):
+        """是否有 RSI 离阈值、或信号 reason 中两位小数的进位点不到 RSI_TOLERANCE"""
+        with np.errstate(invalid='ignore'):
+            near = (np.abs(rsi - self.rsi_oversold) < RSI_TOLERANCE) | (np.abs(rsi - self.rsi_overbought) < RSI_TOLERANCE)
+        if near.any():
+            return True
+        scaled = rsi[[t for t, *_ in signals]] * 100
+        return bool((np.abs(scaled - np.floor(scaled) - 0.5) < RSI_TOLERANCE * 100).any())
 
-    def on_tick(self):
+    def get_state(self):
+        """
+        注入 IndicatorEngine 时保存引擎中本策略所用 RSI 序列的累加器（'indicator'），
+        恢复后下一根 K 线直接增量延伸，不必按窗口重新预热；否则保存自身的流式 RSI 状态。
+        """
+        state = {
+            'market': [self.exchange_name, self.symbol, self.timeframe],
+            'last_signal_rsi': self.last_signal_rsi,
+        }
+        if self.indicator_engine:
+            req = self.get_indicator_requirements()[0]
+            state['indicator'] = self.indicator_engine.get_series_state(req.market, req.name, req.params)
+        else:
+            state['rsi'] = self.rsi.get_state()
+            state['rsi_last_ts'] = int(self.rsi_last_ts) if self.rsi_last_ts is not None else None
+        return state
+
+    def restore_state(self, state: dict):
+        # 换了市场的快照整体作废；RSI 周期变化或快照中没有对应的累加器时只保留信号状态，
+        # RSI 在首个 tick 由 K 线窗口（已从检查点恢复的 K 线缓存）重新预热
+        if not state or state.get('market') != [self.exchange_name, self.symbol, self.timeframe]:
+            return
+        self.last_signal_rsi = state.get('last_signal_rsi')
+        if self.indicator_engine:
+            req = self.get_indicator_requirements()[0]
+            rsi_ready = self.indicator_engine.restore_series(req.market, req.name, req.params, state.get('indicator'))
+        else:
+            if self.rsi.set_state(state.get('rsi')):
+                self.rsi_last_ts = state.get('rsi_last_ts')
+            rsi_ready = self.rsi.ready
+        self.log(f"♻️ Restored state: last_signal_rsi={self.last_signal_rsi}, rsi_ready={rsi_ready}")
+
+    def get_data_requirements(self):
+        return [DataRequirement(self.exchange_name, self.symbol, self.timeframe, self.lookback)]
+
+    def get_indicator_requirements(self):
+        market = (self.exchange_name, self.symbol, self.timeframe)
+        return [IndicatorRequirement(market, 'rsi', (self.rsi_period,))]
+
+    def on_tick(self, market_data: dict = None):
         if not self.is_running:
             return
 
         try:
-            # 1. 尝试从缓存获取 OHLCV 数据
-            cache_key = f"{self.exchange_name}:{self.symbol}:{self.timeframe}"
-            ohlcv = None
-            
-            if cache_manager:
-                ohlcv = cache_manager.get_cache('market_data', self.exchange_name, self.symbol, self.timeframe)
-                if ohlcv:
-                    self.log(f"✓ Using cached OHLCV for {cache_key}")
-            
-            # 2. 如果缓存未命中，从交易所获取
-            if not ohlcv:
-                ohlcv = self.exchange.get_ohlcv(self.symbol, self.timeframe, limit=100, exchange_name=self.exchange_name)
-                if not ohlcv:
-                    self.log(f"Failed to fetch OHLCV from {self.exchange_name}")
-                    return
-                
-                # 3. 存入缓存
-                if cache_manager:
-                    cache_manager.set_cache('market_data', self.exchange_name, self.symbol, ohlcv, self.timeframe)
-                    self.log(f"📦 Cached OHLCV for {cache_key}")
+            # 1. 获取 OHLCV 数据（由主循环统一拉取的只读窗口）
+            ohlcv = self.get_ohlcv(self.get_data_requirements()[0], market_data)
+            if ohlcv is None or len(ohlcv) == 0:
+                self.log(f"Failed to fetch OHLCV from {self.exchange_name}")
+                return
 
-            df = pd.DataFrame(ohlcv, columns=['timestamp', 'open', 'high', 'low', 'close', 'volume'])
-            df['close'] = df['close'].astype(float)
-            
-            # 4. Calculate RSI
-            df['rsi'] = self.calculate_rsi(df['close'])
-            
-            current_rsi = df['rsi'].iloc[-1]
-            current_price = df['close'].iloc[-1]
+            # 2. Calculate RSI（优先使用全引擎共享的指标缓存，每根 K 线收盘只计算一次，否则用自身的流式状态）
+            if self.indicator_engine:
+                req = self.get_indicator_requirements()[0]
+                current_rsi = self.indicator_engine.get(req.market, req.name, req.params, ohlcv)
+            else:
+                current_rsi = self.update_rsi(ohlcv)
+            current_price = float(ohlcv.close[-1])
             
-            self.log(f"Current RSI: {current_rsi:.2f} | Price: {current_price}")
+            self.log_tick("Current RSI: %.2f | Price: %s", current_rsi, current_price)
 
             # 3. Generate Signal
-            signal_side = None
-            reason = ""
-            current_rsi_state = 0  # 0=正常, 1=超卖, 2=超买
-
-            if current_rsi < self.rsi_oversold:
-                signal_side = "BUY"
-                current_rsi_state = 1  # 超卖状态
-                reason = f"RSI ({current_rsi:.2f}) < {self.rsi_oversold} (Oversold)"
-            elif current_rsi > self.rsi_overbought:
-                signal_side = "SELL"
-                current_rsi_state = 2  # 超买状态
-                reason = f"RSI ({current_rsi:.2f}) > {self.rsi_overbought} (Overbought)"
+            signal_side, current_rsi_state, reason = self.classify(current_rsi)
 
             # 4. Publish Signal if RSI state changed (entered oversold/overbought)
             if signal_side and current_rsi_state != self.last_signal_rsi:
@@ -0,0 +1,93 @@
+import json
+import select
+import time
+import logging
+import threading
+from scheduler import WakeEvent
+
+logger = logging.getLogger(__name__)
+
+# 与 admin/models.py 中的 STRATEGY_CHANGES_CHANNEL 保持一致
+STRATEGY_CHANGES_CHANNEL = 'strategy_changes'
+
+
+class StrategyChangeListener:
+    """
+    在独立的数据库连接上 LISTEN 策略变更通知（admin 写入策略时在同一事务中 NOTIFY），
+    收集变化的策略 ID 并置位 event，主循环据此提前醒来，只查询变化的行。
+    连接建立或重连后要求一次全量核对，弥补断线期间错过的通知。
+    非 PostgreSQL 数据库不支持 LISTEN，connected 始终为 False，调用方退回轮询。
+    """
+
+    def __init__(self, engine, channel: str = STRATEGY_CHANGES_CHANNEL, reconnect_delay: float = 5.0):
+        self.engine = engine
+        self.channel = channel
+        self.reconnect_delay = reconnect_delay
+        self.event = WakeEvent()  # 同步主循环用 wait()，asyncio 模式用 wait_async()
+        self.connected = False
+        self._changed = set()
+        self._resync = True
+        self._lock = threading.Lock()
+        self._thread = None
+        self.stats = {'notifications': 0, 'reconnects': 0}
+
+    def start(self):
+        if self.engine.dialect.name != 'postgresql':
+            logger.info(f"Database dialect {self.engine.dialect.name} has no LISTEN/NOTIFY, strategy sync falls back to polling")
+            return
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='strategy-listener', daemon=True)
+            self._thread.start()
+
+    def _listen(self):
+        raw = self.engine.raw_connection()
+        try:
+            conn = raw.driver_connection
+            conn.autocommit = True
+            with conn.cursor() as cursor:
+                cursor.execute(f"LISTEN {self.channel}")
+            with self._lock:
+                self.connected = True
+                self._resync = True
+            self.event.set()
+            logger.info(f"👂 Listening for strategy changes on channel '{self.channel}'")
+            while True:
+                if select.select([conn], [], [], 30) == ([], [], []):
+                    continue
+                conn.poll()
+                while conn.notifies:
+                    self._on_notify(conn.notifies.pop(0).payload)
+        finally:
+            with self._lock:
+                self.connected = False
+            # 唤醒主循环，监听恢复前退回按 STRATEGY_SYNC_INTERVAL 轮询
+            self.event.set()
+            raw.close()
+
+    def _on_notify(self, payload: str):
+        try:
+            strategy_id = int(json.loads(payload)['id'])
+        except (ValueError, KeyError, TypeError):
+            logger.warning(f"Ignoring malformed strategy change notification: {payload}")
+            return
+        with self._lock:
+            self._changed.add(strategy_id)
+            self.stats['notifications'] += 1
+        self.event.set()
+
+    def _run(self):
+        while True:
+            try:
+                self._listen()
+            except Exception as e:
+                self.stats['reconnects'] += 1
+                logger.error(f"Strategy change listener disconnected, reconnecting in {self.reconnect_delay}s: {e}")
+                time.sleep(self.reconnect_delay)
+
+    def take_changes(self):
+        """取出并清空待处理的变化，返回 (变化的策略 ID 集合, 是否需要全量核对)"""
+        with self._lock:
+            changed, resync = self._changed, self._resync
+            self._changed, self._resync = set(), False
+            self.event.clear()
+        return changed, resync
@@ -0,0 +1,7 @@
+import os
+import sys
+
+# 测试不连接数据库、不落盘历史；引擎模块按扁平方式导入（与在 services/strategy_engine 下运行时一致）
+os.environ.setdefault('DATABASE_URL', 'sqlite://')
+os.environ.setdefault('HISTORY_STORE_DIR', '')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
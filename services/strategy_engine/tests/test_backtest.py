@@ -0,0 +1,49 @@
+import numpy as np
+import pytest
+from backtest import first_mismatch, run_events, run_vectorized
+from strategies.indicators import RSI_TOLERANCE, streaming_wilder_rsi, vectorized_wilder_rsi
+
+
+def random_ohlcv(seed: int, n: int = 3000):
+    """随机游走的 1h K 线，波动足够在 RSI 阈值和 5 连阴之间来回触发"""
+    rng = np.random.default_rng(seed)
+    closes = 100 * np.exp(np.cumsum(rng.normal(0, 0.01, n)))
+    opens = np.concatenate(([100.0], closes[:-1])) * (1 + rng.normal(0, 0.001, n))
+    ts = 1_700_000_000_000 // 3600000 * 3600000 + np.arange(n) * 3600000
+    return np.column_stack([ts, opens, np.maximum(opens, closes) * 1.001, np.minimum(opens, closes) * 0.999, closes, rng.uniform(1, 10, n)])
+
+
+def assert_parity(strategy_type, config, ohlcv):
+    prices = ohlcv[:, 1].copy()  # 与 backtest.py 相同：tick t 时的当前价为 K 线 t 的开盘价
+    vectorized = run_vectorized(strategy_type, config, ohlcv, prices)
+    events = run_events(strategy_type, config, ohlcv, prices)
+    assert vectorized, "no signals, the comparison would be vacuous"
+    assert first_mismatch(events, vectorized) is None
+
+
+@pytest.mark.parametrize('seed', [0, 1])
+@pytest.mark.parametrize('config', [{}, {'rsi_period': 21, 'rsi_oversold': 25}, {'rsi_period': 2}])
+def test_rsi_vectorized_matches_events(seed, config):
+    assert_parity('rsi', config, random_ohlcv(seed))
+
+
+@pytest.mark.parametrize('seed', [0, 1])
+def test_btc_5down_vectorized_matches_events(seed):
+    assert_parity('btc_5down', {}, random_ohlcv(seed))
+
+
+def test_rsi_parity_when_losses_underflow():
+    # 长时间只涨不跌，平均跌幅衰减到下溢：向量化结果标记为不确定，回退到逐根递推
+    ohlcv = random_ohlcv(3, 1600)
+    ohlcv[400:, 1] = ohlcv[400:, 4] = ohlcv[400, 4] * (1 + 0.001 * np.arange(1, 1201))
+    _, uncertain = vectorized_wilder_rsi(ohlcv[:, 4], 2, last_closes=ohlcv[:, 1])
+    assert uncertain.any()
+    assert_parity('rsi', {'rsi_period': 2, 'rsi_overbought': 99}, ohlcv)
+
+
+@pytest.mark.parametrize('period', [1, 2, 14, 100])
+def test_vectorized_rsi_within_tolerance_of_streaming(period):
+    ohlcv = random_ohlcv(period, 20000)
+    closes, prices = ohlcv[:, 4], ohlcv[:, 1]
+    vectorized, _ = vectorized_wilder_rsi(closes, period, last_closes=prices)
+    np.testing.assert_allclose(vectorized, streaming_wilder_rsi(closes, period, last_closes=prices), atol=RSI_TOLERANCE / 100, rtol=0, equal_nan=True)
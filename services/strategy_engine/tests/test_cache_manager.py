@@ -0,0 +1,111 @@
+import threading
+import time
+import numpy as np
+from cache_manager import ENTRY_OVERHEAD, CacheManager, estimate_size
+
+
+def make_cache(max_bytes: int = 256 * 2 ** 20, ttl: float = 30):
+    now = [1000.0]
+    return CacheManager({'market_data': ttl}, max_bytes=max_bytes, clock=lambda: now[0]), now
+
+
+def test_entries_expire_after_ttl():
+    cache, now = make_cache(ttl=30)
+    cache.set_cache('market_data', 'binance', 'A', 'a', '1m')
+    now[0] += 29
+    assert cache.get_cache('market_data', 'binance', 'A', '1m') == 'a'
+    now[0] += 1
+    assert cache.get_cache('market_data', 'binance', 'A', '1m') is None
+    assert cache.get_stats()['expired'] == 1 and len(cache) == 0 and cache.bytes == 0
+
+
+def test_overwrite_restarts_ttl():
+    cache, now = make_cache(ttl=30)
+    cache.set_cache('market_data', 'binance', 'A', 'a1', '1m')
+    now[0] += 20
+    cache.set_cache('market_data', 'binance', 'A', 'a2', '1m')
+    now[0] += 20
+    # 第一次写入的堆项已到期，但条目已被覆盖，不能被误删
+    assert cache.get_cache('market_data', 'binance', 'A', '1m') == 'a2'
+    assert cache.get_stats()['expired'] == 0
+
+
+def test_unknown_cache_type_is_not_cached():
+    cache, _ = make_cache()
+    cache.set_cache('ticker', 'binance', 'A', 'a')
+    assert cache.get_cache('ticker', 'binance', 'A') is None
+    calls = []
+    assert cache.get_or_fetch('ticker', 'binance', 'A', lambda: calls.append(1) or 'a') == 'a'
+    assert cache.get_or_fetch('ticker', 'binance', 'A', lambda: calls.append(1) or 'a') == 'a'
+    assert len(calls) == 2
+
+
+def test_size_estimate_tracks_array_bytes():
+    array = np.zeros((6, 500))
+    assert estimate_size(array) >= array.nbytes
+    # 视图按其覆盖的数据计
+    assert estimate_size(array[:, :100]) < estimate_size(array)
+    assert estimate_size([[0.0] * 6] * 100) > estimate_size([[0.0] * 6] * 10)
+
+
+def test_lru_eviction_order_under_byte_budget():
+    value = np.zeros(1000)  # 8000 字节
+    entry_size = estimate_size(value) + ENTRY_OVERHEAD
+    cache, _ = make_cache(max_bytes=3 * entry_size)
+    for symbol in 'ABC':
+        cache.set_cache('market_data', 'binance', symbol, value, '1m')
+    # 访问 A 后它成为最近使用的，下一次淘汰的是 B
+    assert cache.get_cache('market_data', 'binance', 'A', '1m') is value
+    cache.set_cache('market_data', 'binance', 'D', value, '1m')
+    assert cache.get_cache('market_data', 'binance', 'B', '1m') is None
+    assert all(cache.get_cache('market_data', 'binance', s, '1m') is value for s in 'ACD')
+    stats = cache.get_stats()
+    assert stats['evicted'] == 1 and stats['bytes'] == 3 * entry_size
+
+
+def test_value_larger_than_budget_is_rejected():
+    cache, _ = make_cache(max_bytes=1000)
+    cache.set_cache('market_data', 'binance', 'A', np.zeros(1000), '1m')
+    assert len(cache) == 0 and cache.get_stats()['rejected'] == 1
+
+
+def test_concurrent_misses_share_one_fetch():
+    cache, _ = make_cache()
+    started = threading.Event()
+    release = threading.Event()
+    calls = []
+
+    def fetch():
+        calls.append(1)
+        started.set()
+        release.wait(5)
+        return 'window'
+
+    results = []
+    threads = [
+        threading.Thread(target=lambda: results.append(cache.get_or_fetch('market_data', 'binance', 'A', fetch, '1m')))
+        for _ in range(8)
+    ]
+    threads[0].start()
+    started.wait(5)
+    for thread in threads[1:]:
+        thread.start()
+    # 等其余线程都进入等待后再放行
+    deadline = time.monotonic() + 5
+    while cache.get_stats()['coalesced'] < 7 and time.monotonic() < deadline:
+        time.sleep(0.005)
+    release.set()
+    for thread in threads:
+        thread.join(5)
+    assert results == ['window'] * 8 and len(calls) == 1
+    stats = cache.get_stats()
+    assert (stats['misses'], stats['coalesced']) == (1, 7)
+    # 之后直接命中
+    assert cache.get_or_fetch('market_data', 'binance', 'A', fetch, '1m') == 'window'
+    assert cache.get_stats()['hits'] == 1
+
+
+def test_failed_fetch_is_not_cached():
+    cache, _ = make_cache()
+    assert cache.get_or_fetch('market_data', 'binance', 'A', lambda: None, '1m') is None
+    assert cache.get_or_fetch('market_data', 'binance', 'A', lambda: 'a', '1m') == 'a'
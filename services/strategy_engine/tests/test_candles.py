@@ -0,0 +1,109 @@
+import numpy as np
+import pytest
+from candle_store import CandleBuffer, CandleStore
+from candles import Candle, Candles
+
+MINUTE = 60000
+
+
+def rows(start: int, count: int, price: float = 100.0):
+    """从第 start 分钟开始的 count 根 1m K 线，收盘价为 price + 分钟数"""
+    return [[(start + i) * MINUTE, price, price + 1, price - 1, price + start + i, 1.0] for i in range(count)]
+
+
+def test_candles_slices_are_read_only_views():
+    candles = Candles.from_rows(rows(0, 10))
+    tail = candles[-4:]
+    assert len(tail) == 4 and np.shares_memory(tail.close, candles.close)
+    assert tail.timestamp.dtype == np.int64 and tail.timestamp[0] == 6 * MINUTE
+    assert len(candles.closed()) == 9
+    with pytest.raises(ValueError):
+        candles.close[0] = 0
+    with pytest.raises(AttributeError):
+        candles.close = np.zeros(10)
+
+
+def test_last_closed_and_forming():
+    candles = Candles.from_rows(rows(0, 3))
+    assert candles.forming() == Candle(2 * MINUTE, 100.0, 101.0, 99.0, 102.0, 1.0)
+    assert candles.last_closed().timestamp == MINUTE
+    assert Candles.from_rows(rows(0, 1)).last_closed() is None
+    assert Candles.from_rows([]).forming() is None
+    assert np.array_equal(candles.to_numpy(), np.asarray(rows(0, 3)))
+
+
+def test_buffer_merge_replaces_appends_and_wraps():
+    buf = CandleBuffer(5)
+    assert buf.merge(rows(0, 3))
+    # 最后一根的新状态原地替换，更旧的忽略，新的追加
+    assert buf.merge([rows(2, 1, price=200.0)[0], rows(0, 1)[0], rows(3, 1)[0]])
+    assert list(buf.tail(5)[:, 0] // MINUTE) == [0, 1, 2, 3]
+    assert buf.tail(5)[2, 4] == 202.0
+    assert not buf.merge(rows(0, 1))
+    # 超过容量后覆盖最旧的，窗口仍按时间顺序
+    buf.merge(rows(4, 4))
+    assert len(buf) == 5 and buf.last_timestamp == 7 * MINUTE
+    assert list(buf.window(3).timestamp // MINUTE) == [5, 6, 7]
+
+
+def test_buffer_grow_keeps_candles_and_persist_progress():
+    buf = CandleBuffer(5)
+    buf.merge(rows(0, 8))  # 环形缓冲区已回绕
+    buf.persisted_ts = 6 * MINUTE
+    version = buf.version
+    buf.grow(10)
+    assert buf.capacity == 10 and len(buf) == 5 and buf.version == version
+    assert list(buf.tail(10)[:, 0] // MINUTE) == [3, 4, 5, 6, 7]
+    assert buf.persisted_ts == 6 * MINUTE and buf.backfill_pending
+    buf.merge(rows(8, 7))
+    assert len(buf) == 10 and list(buf.window(2).timestamp // MINUTE) == [13, 14]
+
+
+def test_merge_history_prepends_older_candles():
+    buf = CandleBuffer(5)
+    buf.merge(rows(5, 5))
+    buf.grow(8)
+    assert buf.merge_history(rows(1, 9, price=300.0))
+    assert list(buf.tail(8)[:, 0] // MINUTE) == [2, 3, 4, 5, 6, 7, 8, 9]
+    # 相同时间戳以新拉取的为准
+    assert buf.tail(8)[-1, 4] == 309.0
+
+
+class FakeExchange:
+    """截至第 now 分钟有 K 线（最后一根为未完成 K 线），记录每次请求"""
+
+    def __init__(self, now: int):
+        self.now = now
+        self.calls = []
+
+    def get_ohlcv(self, symbol, timeframe, limit, since=None, exchange_name='binance'):
+        self.calls.append((limit, since))
+        start = self.now - limit + 1 if since is None else since // MINUTE
+        return rows(start, min(limit, self.now - start + 1))
+
+
+class FakeHistory:
+    def __init__(self):
+        self.appended = []
+
+    def append(self, exchange_name, symbol, timeframe, closed):
+        self.appended.extend(int(ts) // MINUTE for ts in closed[:, 0])
+
+
+def test_store_grows_buffer_without_discarding_or_repersisting():
+    exchange, history = FakeExchange(now=1000), FakeHistory()
+    store = CandleStore(exchange, capacity=100, history=history, clock=lambda: exchange.now * 60 + 1)
+    assert len(store.get_window('X/USDT', '1m', 100)) == 100
+    assert history.appended == list(range(901, 1000))
+
+    # 新策略需要 300 根：一次整窗拉取补齐更早的 K 线，已写入历史的不再重写
+    window = store.get_window('X/USDT', '1m', 300)
+    assert len(window) == 300 and list(window.timestamp[[0, -1]] // MINUTE) == [701, 1000]
+    assert exchange.calls[-1] == (300, None)
+    assert history.appended == list(range(901, 1000))
+
+    # 之后恢复增量拉取
+    exchange.now += 1
+    assert len(store.get_window('X/USDT', '1m', 300)) == 300
+    assert exchange.calls[-1][1] == 1000 * MINUTE
+    assert history.appended == list(range(901, 1001))
@@ -0,0 +1,42 @@
+from datetime import datetime, timezone
+import numpy as np
+import pytest
+from candle_store import timeframe_to_ms
+from history_store import HistoryStore
+
+
+def ms(*args):
+    return int(datetime(*args, tzinfo=timezone.utc).timestamp() * 1000)
+
+
+def candles(first_ts: int, timeframe: str, count: int):
+    ts = first_ts + np.arange(count) * timeframe_to_ms(timeframe)
+    closes = 100 + np.arange(count, dtype=np.float64)
+    return np.column_stack([ts, closes, closes + 1, closes - 1, closes, np.ones(count)])
+
+
+# 周线从周一开盘，3 日线按 Unix 纪元对齐，都不与月初对齐，会跨月写入
+@pytest.mark.parametrize('timeframe, first_ts', [
+    ('1w', ms(2024, 2, 5)),
+    ('3d', ms(2024, 1, 30)),
+])
+def test_round_trip_unaligned_timeframes(tmp_path, timeframe, first_ts):
+    store = HistoryStore(str(tmp_path))
+    rows = candles(first_ts, timeframe, 10)
+    store.append('binance', 'BTC/USDT', timeframe, rows)
+
+    np.testing.assert_array_equal(store.read('binance', 'BTC/USDT', timeframe), rows)
+    for i in range(len(rows)):
+        # 从任意一根开始读，第一根必须是它本身；end 不包含
+        np.testing.assert_array_equal(store.read('binance', 'BTC/USDT', timeframe, start=int(rows[i, 0])), rows[i:])
+        np.testing.assert_array_equal(store.read('binance', 'BTC/USDT', timeframe, end=int(rows[i, 0])), rows[:i])
+        # start 落在两根 K 线之间时从下一根开始
+        np.testing.assert_array_equal(store.read('binance', 'BTC/USDT', timeframe, start=int(rows[i, 0]) - 1), rows[i:])
+
+
+def test_round_trip_aligned_timeframe_across_months(tmp_path):
+    store = HistoryStore(str(tmp_path))
+    rows = candles(ms(2024, 2, 29, 22), '1h', 5)
+    store.append('binance', 'BTC/USDT', '1h', rows[::-1])  # 乱序写入
+    np.testing.assert_array_equal(store.read('binance', 'BTC/USDT', '1h'), rows)
+    np.testing.assert_array_equal(store.read('binance', 'BTC/USDT', '1h', start=int(rows[1, 0]), end=int(rows[4, 0])), rows[1:4])
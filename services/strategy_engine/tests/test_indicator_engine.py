@@ -0,0 +1,125 @@
+import numpy as np
+from benchmark import FakeExchangeManager, SimulatedClock, build_strategies
+from candle_store import timeframe_to_ms
+from candles import Candles
+from indicator_engine import IndicatorEngine
+from main import get_due_strategies
+from strategies.base import IndicatorRequirement
+from tick_planner import TickPlanner
+
+# build_strategies 按 RSI / 5 连阴交替分配到市场上，偶数位的市场（RSI）覆盖全部四种周期
+MARKETS = [('binance', f"SYM{i}/USDT", tf) for i, tf in enumerate(['1m', '1m', '5m', '5m', '15m', '15m', '1h', '1h'])]
+
+
+def run_rounds(rounds: int):
+    """16 个策略（8 个 RSI）分布在 8 个市场、4 种周期上，按模拟时钟每分钟一轮，只执行刚收盘周期的策略"""
+    clock = SimulatedClock(1_700_000_000_000 // 3600000 * 3600000)
+    exchange = FakeExchangeManager(clock, capacity=200)
+    engine = IndicatorEngine()
+    planner = TickPlanner(exchange.candle_store, indicator_engine=engine)
+    running, _ = build_strategies(16, MARKETS, exchange)
+    for s_entry in running.values():
+        s_entry['instance'].indicator_engine = engine
+        s_entry['instance'].start()
+
+    due_markets = None
+    closes = 0  # 首轮之后 RSI 序列经历的收盘次数
+    for _ in range(rounds):
+        due = get_due_strategies(running, due_markets)
+        planner.plan_indicators([s_entry['instance'] for s_entry in running.values()])
+        market_data = planner.prepare([s_entry['instance'] for s_entry in due.values()])
+        for s_entry in due.values():
+            s_entry['instance'].on_tick(market_data)
+            if due_markets is not None and s_entry['instance'].get_indicator_requirements():
+                closes += 1
+        clock.advance(60)
+        now_ms = int(clock.time() * 1000)
+        due_markets = {(exchange_name, tf) for exchange_name, _, tf in MARKETS if now_ms % timeframe_to_ms(tf) < 60000}
+    planner._executor.shutdown()
+    return engine, running, closes
+
+
+def test_each_series_warms_up_once_across_mixed_timeframes():
+    engine, running, closes = run_rounds(120)
+    series = {
+        (req.market, req.name, req.params)
+        for s_entry in running.values()
+        for req in s_entry['instance'].get_indicator_requirements()
+    }
+    stats = engine.get_stats()
+    assert stats['series'] == len(series) == 8
+    # 首轮每个序列预热一次，之后高周期策略不在本轮执行也不会丢弃累加器，收盘时只增量延伸
+    assert stats['warmups'] == len(series)
+    assert stats['stale'] == 0
+    # 每个 RSI 策略各有一个参数，序列与策略一一对应：1m 119 次收盘、5m 23、15m 7、1h 1
+    assert stats['extended'] == closes == 2 * (119 + 23 + 7 + 1)
+
+
+def test_unused_series_are_dropped():
+    engine, running, _ = run_rounds(3)
+    engine.set_requirements(running[0]['instance'].get_indicator_requirements())
+    assert engine.get_stats()['series'] == 1
+
+
+
+def random_window(closes, start: int = 0):
+    """以 closes 为收盘价的 1m K 线窗口，首根开盘时间为第 start 分钟"""
+    ts = (np.arange(len(closes)) + start) * 60000
+    return Candles.from_rows(np.column_stack([ts, closes, closes + 1, closes - 1, closes, np.ones(len(closes))]))
+
+
+def test_parameter_variants_warm_up_in_one_batch():
+    closes = 100 + np.cumsum(np.random.default_rng(7).normal(size=301))
+    market = ('binance', 'X/USDT', '1m')
+    periods = [7, 14, 21, 50]
+
+    batched = IndicatorEngine()
+    batched.set_requirements([IndicatorRequirement(market, 'rsi', (period,)) for period in periods])
+    values = [batched.get(market, 'rsi', (period,), random_window(closes[:300])) for period in periods]
+    # 第一个请求批量预热全部四个周期，其余三个直接命中
+    stats = batched.get_stats()
+    assert (stats['warmups'], stats['batched'], stats['hits']) == (4, 3, 3)
+
+    for period, value in zip(periods, values):
+        single = IndicatorEngine()
+        assert single.get(market, 'rsi', (period,), random_window(closes[:300])) == value
+        # 下一根 K 线收盘后增量延伸，结果仍与单独预热的一致
+        expected = single.get(market, 'rsi', (period,), random_window(closes[1:], start=1))
+        assert batched.get(market, 'rsi', (period,), random_window(closes[1:], start=1)) == expected
+
+
+def test_rsi_checkpoint_restores_engine_series():
+    from strategies.rsi_strategy import RsiStrategy
+    import json
+    closes = 100 + np.cumsum(np.random.default_rng(11).normal(size=400))
+
+    def start_strategy(engine):
+        strategy = RsiStrategy(1, 'rsi', RsiStrategy.validate_config({'symbol': 'X/USDT', 'timeframe': '1m'}), None, lambda signal_data: None)
+        strategy.indicator_engine = engine
+        return strategy
+
+    engine = IndicatorEngine()
+    strategy = start_strategy(engine)
+    strategy.start()
+    req = strategy.get_data_requirements()[0]
+    # 前 200 根 K 线上逐根执行，之后检查点（经 JSON 往返，与 Redis 中保存的一致）
+    for t in range(req.lookback, 200):
+        strategy.on_tick({req.market: random_window(closes[t - req.lookback:t], start=t - req.lookback)})
+    state = json.loads(json.dumps(strategy.get_state()))
+    assert 'rsi' not in state and state['indicator']['last_ts'] == 197 * 60000
+
+    # 重启：新的引擎从检查点恢复累加器，下一根 K 线直接增量延伸，与未重启时的值完全相同
+    restored_engine = IndicatorEngine()
+    restored = start_strategy(restored_engine)
+    restored.restore_state(state)
+    window = random_window(closes[200 - req.lookback:200], start=200 - req.lookback)
+    value = restored_engine.get(req.market, 'rsi', (restored.rsi_period,), window)
+    assert value == engine.get(req.market, 'rsi', (strategy.rsi_period,), window)
+    stats = restored_engine.get_stats()
+    assert (stats['warmups'], stats['extended']) == (0, 1)
+
+    # 周期变化后快照不适用，RSI 由窗口重新预热
+    changed = RsiStrategy(1, 'rsi', RsiStrategy.validate_config({'symbol': 'X/USDT', 'timeframe': '1m', 'rsi_period': 21}), None, lambda signal_data: None)
+    changed.indicator_engine = IndicatorEngine()
+    changed.restore_state(state)
+    assert changed.indicator_engine.get_stats()['series'] == 0
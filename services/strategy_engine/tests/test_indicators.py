@@ -0,0 +1,65 @@
+import json
+import math
+import numpy as np
+import pytest
+from strategies.indicators import WilderRsi, wilder_rsi_series
+
+ATOL = 1e-9  # RSI 取值 0~100，流式与批量实现只在浮点舍入上可能不同
+
+
+def random_closes(seed: int, n: int = 500):
+    rng = np.random.default_rng(seed)
+    closes = 100 * np.exp(np.cumsum(rng.normal(0, 0.01, n)))
+    closes[n // 3:n // 3 + 20] = closes[n // 3]  # 一段无波动的 K 线
+    return closes
+
+
+@pytest.mark.parametrize('seed', range(5))
+@pytest.mark.parametrize('period', [2, 7, 14, 30])
+def test_update_matches_batch_reference(seed, period):
+    closes = random_closes(seed)
+    expected = wilder_rsi_series(closes, period)
+    rsi = WilderRsi(period)
+    actual = np.array([rsi.update(close) for close in closes])
+    np.testing.assert_allclose(actual, expected, atol=ATOL, rtol=0, equal_nan=True)
+
+
+@pytest.mark.parametrize('period', [2, 14, 30])
+def test_warm_up_and_peek_match_batch_reference(period):
+    closes = random_closes(42)
+    expected = wilder_rsi_series(closes, period)
+    for n in [0, 1, period, period + 1, 100, len(closes) - 1]:
+        rsi = WilderRsi(period)
+        value = rsi.warm_up(closes[:n])
+        assert math.isnan(value) if n <= period else value == pytest.approx(expected[n - 1], abs=ATOL)
+        # 以下一根收盘价 peek 等于把它推入后的 RSI，且不改变状态
+        peeked = rsi.peek(closes[n]) if n else float('nan')
+        before = rsi.get_state()
+        if n > period:
+            assert peeked == pytest.approx(expected[n], abs=ATOL)
+        else:
+            assert math.isnan(peeked)
+        assert rsi.get_state() == before
+
+
+@pytest.mark.parametrize('split', [0, 1, 5, 14, 15, 200])
+def test_state_round_trip(split):
+    closes = random_closes(3)
+    original = WilderRsi(14)
+    original.warm_up(closes[:split])
+
+    restored = WilderRsi(14)
+    assert restored.set_state(json.loads(json.dumps(original.get_state())))
+    assert restored.get_state() == original.get_state()
+    for close in closes[split:]:
+        a, b = original.update(close), restored.update(close)
+        assert (math.isnan(a) and math.isnan(b)) or a == b
+
+
+def test_set_state_rejects_other_period():
+    rsi = WilderRsi(14)
+    rsi.warm_up(random_closes(1)[:50])
+    other = WilderRsi(21)
+    assert not other.set_state(rsi.get_state())
+    assert not other.ready and other.last_close is None
+    assert not other.set_state(None)
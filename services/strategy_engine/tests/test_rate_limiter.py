@@ -0,0 +1,156 @@
+import types
+import ccxt
+import pytest
+from exchange import ExchangeManager
+from rate_limiter import _REDIS_BUCKET_SCRIPT, RateLimiter, RedisTokenBucket, TokenBucket, endpoint_weight, retry_after_seconds
+
+
+class ManualClock:
+    def __init__(self, now: float = 1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+def test_bucket_refills_up_to_capacity():
+    clock = ManualClock()
+    bucket = TokenBucket(100, 10, clock=clock)
+    assert bucket.reserve(100) == 0
+    # 令牌允许为负：先到的请求排在前面，等待时间按欠下的令牌计算
+    assert bucket.reserve(20) == pytest.approx(2.0)
+    clock.now += 1
+    assert bucket.reserve(5) == pytest.approx(1.5)
+    # 空闲再久也不会超过容量
+    clock.now += 3600
+    assert bucket.reserve(100) == 0
+    assert bucket.reserve(1) == pytest.approx(0.1)
+
+
+def test_used_weight_header_tightens_bucket():
+    clock = ManualClock()
+    bucket = TokenBucket(100, 10, clock=clock)
+    bucket.observe_used(95)
+    assert bucket.reserve(10) == pytest.approx(0.5)
+    # 交易所计数比本地低时不放宽
+    bucket.observe_used(0)
+    assert bucket.reserve(1) == pytest.approx(0.6)
+
+
+def test_penalize_pauses_all_requests_for_retry_after():
+    clock = ManualClock()
+    limiter = RateLimiter()
+    limiter._buckets['binance'] = TokenBucket(100, 10, clock=clock)
+    limiter.penalize('binance', 30)
+    assert limiter._bucket('binance').reserve(1) == pytest.approx(30.1)
+    clock.now += 31
+    assert limiter._bucket('binance').reserve(1) == 0
+
+
+def test_ddos_protection_from_exchange_penalizes_bucket():
+    clock = ManualClock()
+    limiter = RateLimiter()
+    limiter._buckets['binance'] = TokenBucket(100, 10, clock=clock)
+
+    class Binance:
+        id = 'binance'
+        last_response_headers = {'Retry-After': '12', 'X-MBX-USED-WEIGHT-1M': '40'}
+
+        def fetch_ohlcv(self, *args, **kwargs):
+            raise ccxt.DDoSProtection('429 Too Many Requests')
+
+    manager = types.SimpleNamespace(rate_limiter=limiter)
+    with pytest.raises(ccxt.DDoSProtection):
+        ExchangeManager._call(manager, Binance(), 'fetch_ohlcv', 'BTC/USDT', '1m', limit=100)
+    # 按 Retry-After 暂停 12 秒；发出的请求本身按 limit=100 计权重 2
+    assert limiter._bucket('binance').reserve(1) == pytest.approx(12.1)
+    stats = limiter.get_stats()['binance']
+    assert (stats['requests'], stats['weight'], stats['bans']) == (1, 2, 1)
+
+
+def test_weights_and_retry_after_parsing():
+    assert [endpoint_weight('binance', 'fetch_ohlcv', n) for n in (50, 100, 500, 1500)] == [1, 2, 5, 10]
+    assert endpoint_weight('binance', 'fetch_balance') == 5
+    assert endpoint_weight('bitget', 'fetch_ohlcv', 1000) == 1
+    assert retry_after_seconds({'retry-after': '7'}) == 7
+    assert retry_after_seconds({}, default=60) == 60
+    assert retry_after_seconds(None, default=60) == 60
+
+
+class FakeRedis:
+    """register_script 返回的脚本对象：记录调用参数，按 replies 依次返回或抛出"""
+
+    def __init__(self, replies):
+        self.replies = list(replies)
+        self.calls = []
+
+    def register_script(self, script):
+        assert script == _REDIS_BUCKET_SCRIPT
+
+        def run(keys, args):
+            self.calls.append((keys, args))
+            reply = self.replies.pop(0)
+            if isinstance(reply, Exception):
+                raise reply
+            return reply
+        return run
+
+
+def test_redis_bucket_runs_script_and_falls_back_when_redis_is_down():
+    redis = FakeRedis([b'0', b'1.5', ConnectionError('redis down'), b'0'])
+    bucket = RedisTokenBucket(redis, 'ratelimit:binance', 100, 10)
+    assert bucket.reserve(5) == 0
+    assert bucket.reserve(20) == 1.5
+    assert redis.calls[1] == (['ratelimit:binance'], [100, 10, 'reserve', 20])
+    # Redis 不可用：退回进程内令牌桶（此时本地桶是满的）
+    assert bucket.reserve(5) == 0 and not bucket._redis_ok
+    assert bucket._fallback.tokens < 100
+    assert bucket.reserve(5) == 0 and bucket._redis_ok
+
+
+def run_lua_bucket(clock):
+    """在 lupa 中执行共享令牌桶的 Lua 脚本，redis.call 由一个内存 hash 实现"""
+    lupa = pytest.importorskip('lupa')
+    lua = lupa.LuaRuntime()
+    hashes = {}
+
+    def call(command, key=None, *args):
+        if command == 'TIME':
+            return lua.table(str(int(clock.now)), str(int(round(clock.now % 1 * 1e6))))
+        if command == 'HMGET':
+            return lua.table(*(hashes.get(key, {}).get(field) for field in args))
+        if command == 'HSET':
+            hashes.setdefault(key, {}).update(zip(args[::2], args[1::2]))
+        return None
+
+    lua.globals().redis = lua.table(call=call)
+    script = lua.eval(f"function(KEYS, ARGV)\n{_REDIS_BUCKET_SCRIPT}\nend")
+    return lambda mode, value: float(script(lua.table('bucket'), lua.table('100', '10', mode, str(value))))
+
+
+def test_redis_script_matches_local_bucket():
+    clock = ManualClock()
+    run = run_lua_bucket(clock)
+    assert run('reserve', 100) == 0
+    assert run('reserve', 20) == pytest.approx(2.0)
+    clock.now += 1
+    assert run('reserve', 5) == pytest.approx(1.5)
+    clock.now += 3600
+    assert run('reserve', 0) == 0
+    run('observe', 95)
+    assert run('reserve', 10) == pytest.approx(0.5)
+    clock.now += 60
+    run('drain', 30)
+    assert run('reserve', 1) == pytest.approx(30.1)
+
+
+def test_async_manager_shares_sync_managers_budget():
+    from async_exchange import AsyncExchangeManager
+
+    limiter = RateLimiter()
+    manager = AsyncExchangeManager(rate_limiter=limiter)
+    assert manager.rate_limiter is limiter
+    # 同步管理器（历史补数）用掉的权重，异步管理器的请求同样要排队等待
+    limiter.acquire('binance', int(limiter._bucket('binance').capacity))
+    assert manager.rate_limiter._bucket('binance').reserve(1) > 0
+    assert AsyncExchangeManager().rate_limiter is not limiter
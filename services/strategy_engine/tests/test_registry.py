@@ -0,0 +1,86 @@
+import sys
+import types
+import pytest
+from strategies.base import BaseStrategy, StrategyConfigError
+from strategies.registry import StrategyRegistry, UnknownStrategyError
+import strategies.registry as registry_module
+
+PLUGIN_SOURCE = '''
+from strategies.base import BaseStrategy, ConfigField
+
+class PluginStrategy(BaseStrategy):
+    config_schema = {'threshold': ConfigField(float, 1.5)}
+    def start(self): pass
+    def stop(self): pass
+    def on_tick(self, market_data=None): pass
+'''
+
+
+@pytest.fixture
+def plugin_module(tmp_path, monkeypatch):
+    """可导入但尚未导入的第三方策略模块"""
+    (tmp_path / 'plugin_strategies.py').write_text(PLUGIN_SOURCE)
+    monkeypatch.syspath_prepend(str(tmp_path))
+    monkeypatch.delitem(sys.modules, 'plugin_strategies', raising=False)
+    return 'plugin_strategies'
+
+
+def fake_entry_points(*pairs):
+    return lambda group: [types.SimpleNamespace(name=name, value=value, group=group) for name, value in pairs]
+
+
+def test_resolves_type_from_config_and_validates():
+    cls, config = StrategyRegistry().resolve('my rsi', {'type': 'rsi', 'rsi_period': '21'})
+    assert cls.__name__ == 'RsiStrategy'
+    assert config['rsi_period'] == 21 and config['rsi_overbought'] == 70
+
+
+def test_legacy_names_map_to_types():
+    registry = StrategyRegistry()
+    assert registry.resolve('RSI Strategy', {})[0].__name__ == 'RsiStrategy'
+    assert registry.resolve('BTC 5连阴策略', {})[0].__name__ == 'BtcFiveDownStrategy'
+    # type 优先于名称
+    assert registry.resolve('RSI Strategy', {'type': 'btc_5down'})[0].__name__ == 'BtcFiveDownStrategy'
+
+
+def test_unknown_names_and_types_raise(monkeypatch):
+    monkeypatch.setattr(registry_module, 'entry_points', fake_entry_points())
+    registry = StrategyRegistry()
+    with pytest.raises(UnknownStrategyError, match='no \'type\''):
+        registry.resolve('Some old strategy', {})
+    with pytest.raises(UnknownStrategyError, match="Unknown strategy type 'macd'"):
+        registry.resolve('x', {'type': 'macd'})
+
+
+def test_invalid_config_raises():
+    with pytest.raises(StrategyConfigError, match='rsi_period'):
+        StrategyRegistry().resolve('x', {'type': 'rsi', 'rsi_period': 'fast'})
+
+
+def test_entry_points_are_loaded_lazily(monkeypatch, plugin_module):
+    monkeypatch.setattr(registry_module, 'entry_points', fake_entry_points(
+        ('plugin', f'{plugin_module}:PluginStrategy'),
+        ('rsi', f'{plugin_module}:PluginStrategy'),  # 与内置类型同名，忽略
+    ))
+    registry = StrategyRegistry()
+    assert 'plugin' in registry.available_types()
+    # 只读入口点元数据，模块在第一次创建该类型的策略时才导入
+    assert plugin_module not in sys.modules
+    cls, config = registry.resolve('x', {'type': 'plugin'})
+    assert cls.__name__ == 'PluginStrategy' and config['threshold'] == 1.5
+    assert plugin_module in sys.modules
+    assert registry.get('rsi').__name__ == 'RsiStrategy'
+
+
+def test_register_checks_base_class():
+    registry = StrategyRegistry(builtins={}, legacy_names={})
+
+    class Custom(BaseStrategy):
+        def start(self): pass
+        def stop(self): pass
+        def on_tick(self, market_data=None): pass
+
+    registry.register('custom', Custom)
+    assert registry.get('custom') is Custom
+    with pytest.raises(TypeError):
+        registry.register('bad', object)
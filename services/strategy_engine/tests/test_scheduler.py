@@ -0,0 +1,99 @@
+import asyncio
+import threading
+import time
+import pytest
+from benchmark import SimulatedClock
+from scheduler import CandleScheduler, WakeEvent
+
+HOUR = 3600
+MARKET = ('binance', '1h')
+
+
+class FakeExchange:
+    def __init__(self, clock):
+        self.clock = clock
+
+    def get_server_time(self, exchange_name: str = 'binance'):
+        return int(self.clock.time() * 1000)
+
+
+class FakeWakeEvent:
+    """在模拟时钟的 fire_at 时刻被置位的 wake_event（如收到策略变更通知）"""
+
+    def __init__(self, clock, fire_at: float):
+        self.clock = clock
+        self.fire_at = fire_at
+
+    def wait(self, timeout: float):
+        fired = self.clock.time() + timeout >= self.fire_at
+        self.clock.advance(max(0.0, (self.fire_at if fired else self.clock.time() + timeout) - self.clock.time()))
+        return fired
+
+
+def make_scheduler(start: float):
+    clock = SimulatedClock(int(start * 1000))
+    return clock, CandleScheduler(FakeExchange(clock), settle_delay=2.0, clock=clock.time, sleep=clock.advance)
+
+
+def test_wakes_at_close_plus_settle_delay():
+    close = 1_700_000_000 // HOUR * HOUR + HOUR
+    clock, scheduler = make_scheduler(close - HOUR + 100)
+    assert scheduler.wait([MARKET], max_wait=2 * HOUR) == {MARKET}
+    assert clock.time() == close + 2
+    # 下一次收盘之前因 max_wait 醒来时不返回任何市场
+    assert scheduler.wait([MARKET], max_wait=60) == set()
+
+
+def test_early_wake_inside_settle_delay_does_not_skip_the_close():
+    close = 1_700_000_000 // HOUR * HOUR + HOUR
+    clock, scheduler = make_scheduler(close - HOUR + 100)
+    # 收盘后 1.95 秒被策略变更通知唤醒：这次收盘尚未 settle，不返回
+    assert scheduler.wait([MARKET], max_wait=2 * HOUR, wake_event=FakeWakeEvent(clock, close + 1.95)) == set()
+    # 下一次等待仍以这次收盘为目标，只再睡 0.05 秒，而不是等到下一小时
+    assert scheduler.wait([MARKET], max_wait=2 * HOUR) == {MARKET}
+    assert abs(clock.time() - (close + 2)) < 1e-6
+    # 同一次收盘只返回一次
+    assert scheduler.wait([MARKET], max_wait=60) == set()
+
+
+def test_closes_passed_while_busy_are_returned_on_any_wake():
+    close = 1_700_000_000 // HOUR * HOUR + HOUR
+    clock, scheduler = make_scheduler(close - HOUR + 100)
+    assert scheduler.wait([MARKET], max_wait=2 * HOUR, wake_event=FakeWakeEvent(clock, close + 1.95)) == set()
+    # 同步策略等操作耗时，再次等待时收盘早已过了 settle_delay：立即返回，不再睡眠
+    clock.advance(10)
+    now = clock.time()
+    assert scheduler.wait([MARKET], max_wait=2 * HOUR, wake_event=FakeWakeEvent(clock, now + 30)) == {MARKET}
+    assert clock.time() == now
+
+
+def test_new_market_does_not_replay_earlier_closes():
+    close = 1_700_000_000 // HOUR * HOUR + HOUR
+    clock, scheduler = make_scheduler(close - HOUR + 100)
+    assert scheduler.wait([('binance', '1m')], max_wait=2 * HOUR) == {('binance', '1m')}
+    # 1h 市场此时才出现：启动前的收盘不补发，只等它的下一次收盘
+    clock.advance(HOUR - 200)
+    assert scheduler.wait([MARKET], max_wait=2 * HOUR) == {MARKET}
+    assert clock.time() == close + 2
+
+
+def test_wake_event_wakes_coroutines_from_other_threads():
+    event = WakeEvent()
+
+    async def wait():
+        threading.Timer(0.05, event.set).start()
+        return await event.wait_async(10)
+
+    started = time.monotonic()
+    assert asyncio.run(wait()) is True
+    assert time.monotonic() - started < 1
+    event.clear()
+    assert asyncio.run(event.wait_async(0.01)) is False
+
+
+def test_wake_event_wait_is_cancelled_with_the_loop():
+    # 等待不占用线程池线程：事件循环退出（如 SIGTERM）时立即返回，不等到超时
+    started = time.monotonic()
+    with pytest.raises(asyncio.TimeoutError):
+        asyncio.run(asyncio.wait_for(WakeEvent().wait_async(30), 0.05))
+    assert time.monotonic() - started < 2
@@ -0,0 +1,70 @@
+import json
+from sharding import HashRing, ShardCoordinator, strategy_shard_key
+
+KEYS = [f"binance:SYM{i}/USDT" for i in range(2000)]
+
+
+def assignments(nodes):
+    ring = HashRing(nodes)
+    return {key: ring.owner(key) for key in KEYS}
+
+
+def test_assignment_is_stable_and_independent_of_node_order():
+    assert assignments(['a', 'b', 'c']) == assignments(['c', 'a', 'b'])
+    assert HashRing([]).owner('binance:BTC/USDT') is None
+
+
+def test_keys_are_spread_across_nodes():
+    counts = {}
+    for owner in assignments(['a', 'b', 'c', 'd']).values():
+        counts[owner] = counts.get(owner, 0) + 1
+    assert set(counts) == {'a', 'b', 'c', 'd'}
+    assert all(0.15 < count / len(KEYS) < 0.35 for count in counts.values())
+
+
+def test_node_join_moves_only_keys_to_the_new_node():
+    before, after = assignments(['a', 'b', 'c']), assignments(['a', 'b', 'c', 'd'])
+    moved = [key for key in KEYS if before[key] != after[key]]
+    assert all(after[key] == 'd' for key in moved)
+    # 理想情况下移动 1/4，虚拟节点带来的偏差有限
+    assert 0.15 < len(moved) / len(KEYS) < 0.35
+
+
+def test_node_leave_moves_only_its_own_keys():
+    before, after = assignments(['a', 'b', 'c', 'd']), assignments(['a', 'b', 'c'])
+    moved = [key for key in KEYS if before[key] != after[key]]
+    assert moved and all(before[key] == 'd' for key in moved)
+    assert len(moved) == sum(1 for owner in before.values() if owner == 'd')
+
+
+def test_shard_key_groups_strategies_by_market():
+    config = json.dumps({'exchange': 'bitget', 'symbol': 'ETH/USDT', 'timeframe': '5m'})
+    assert strategy_shard_key(config, 1) == strategy_shard_key(json.dumps({'exchange': 'bitget', 'symbol': 'ETH/USDT'}), 2)
+    assert strategy_shard_key(config, 1) == 'bitget:ETH/USDT'
+    assert strategy_shard_key('{}', 3) == 'binance:BTC/USDT'
+    assert strategy_shard_key('not json', 4) == 'strategy:4'
+
+
+def test_coordinator_rebuilds_ring_on_membership_change(monkeypatch):
+    coordinator = ShardCoordinator(None, node_id='a')
+    members = [['a', 'b'], ['a', 'b'], ConnectionError('redis down'), ['b']]
+
+    def heartbeat():
+        reply = members.pop(0)
+        if isinstance(reply, Exception):
+            raise reply
+        return list(reply)
+
+    monkeypatch.setattr(coordinator, '_heartbeat', heartbeat)
+    coordinator.refresh()
+    assert coordinator.ring.nodes == ('a', 'b') and coordinator.generation == 1
+    coordinator.refresh()
+    assert coordinator.generation == 1
+    # Redis 不可用：沿用最后一次已知的成员
+    coordinator.refresh()
+    assert coordinator.ring.nodes == ('a', 'b') and coordinator.generation == 1
+    # 本节点心跳过期被清理时仍把自己算在内
+    coordinator.refresh()
+    assert coordinator.ring.nodes == ('a', 'b') and coordinator.generation == 1
+    owned = [key for key in KEYS if coordinator.owns(key)]
+    assert owned == [key for key, owner in assignments(['a', 'b']).items() if owner == 'a']
@@ -0,0 +1,105 @@
+import threading
+import time
+from signal_sink import SignalSink
+
+
+class FakeSession:
+    def rollback(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class FakeRelay:
+    def __init__(self):
+        self.published = []
+
+    def wake(self):
+        pass
+
+    def publish(self, signals):
+        self.published.extend(signal_data['reason'] for signal_data in signals)
+        return True
+
+
+class FlakyDatabase:
+    """前 down_for 次写入失败（数据库不可用），bad 中的信号始终写不进去"""
+
+    def __init__(self, down_for: int = 0, bad=()):
+        self.down_for = down_for
+        self.bad = set(bad)
+        self.saved = []
+        self.attempts = 0
+        self.lock = threading.Lock()
+
+    def write(self, db, signals):
+        with self.lock:
+            self.attempts += 1
+            if self.attempts <= self.down_for:
+                raise ConnectionError('could not connect to server')
+            if any(signal_data['reason'] in self.bad for signal_data in signals):
+                raise ValueError('value too long for type character varying')
+            self.saved.extend(signal_data['reason'] for signal_data in signals)
+
+
+def make_sink(database, **kwargs):
+    relay = FakeRelay()
+    sink = SignalSink(FakeSession, relay, flush_interval=0.01, retry_delay=0.01, retry_max_delay=0.05, **kwargs)
+    sink._write = database.write
+    return sink, relay
+
+
+def submit(sink, reasons):
+    for reason in reasons:
+        sink.submit({'strategy_id': 1, 'symbol': 'BTC/USDT', 'side': 'BUY', 'price': 1.0, 'reason': reason})
+
+
+def wait_until(condition, timeout: float = 5.0):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return condition()
+
+
+def test_signals_survive_a_database_outage_in_order():
+    database = FlakyDatabase(down_for=6)
+    sink, relay = make_sink(database, max_retries=10)
+    submit(sink, ['s1', 's2'])
+    time.sleep(0.05)
+    submit(sink, ['s3'])
+    assert wait_until(lambda: len(database.saved) == 3)
+    sink.stop()
+    assert database.saved == ['s1', 's2', 's3']
+    assert relay.published == []
+    assert sink.get_stats()['retries'] > 0
+
+
+def test_unsaved_signals_are_published_when_retries_run_out():
+    database = FlakyDatabase(down_for=10 ** 6)
+    sink, relay = make_sink(database, max_retries=2)
+    submit(sink, ['s1', 's2'])
+    assert wait_until(lambda: relay.published == ['s1', 's2'])
+    sink.stop()
+    assert database.saved == []
+    stats = sink.get_stats()
+    assert (stats['published_direct'], stats['lost'], stats['backlog']) == (2, 0, 0)
+
+
+def test_bad_row_is_published_without_holding_back_the_batch():
+    database = FlakyDatabase(bad={'s2'})
+    sink, relay = make_sink(database)
+    submit(sink, ['s1', 's2', 's3'])
+    sink.stop()
+    assert database.saved == ['s1', 's3']
+    assert relay.published == ['s2']
+
+
+def test_backlog_is_published_on_stop():
+    database = FlakyDatabase(down_for=10 ** 6)
+    sink, relay = make_sink(database, max_retries=100)
+    sink.retry_delay = sink.retry_max_delay = 60
+    submit(sink, ['s1'])
+    assert wait_until(lambda: sink.get_stats()['backlog'] == 1)
+    sink.stop()
+    assert relay.published == ['s1']
@@ -0,0 +1,49 @@
+import time
+import pytest
+import main
+from sharding import ShardCoordinator
+from strategy_sync import StrategyChangeListener
+
+
+def test_idle_wait_polls_only_while_listener_disconnected(monkeypatch):
+    monkeypatch.setattr(main.strategy_listener, 'connected', False)
+    assert main.strategy_sync_timeout() == main.settings.STRATEGY_SYNC_INTERVAL
+
+    # 监听已连接：不再按 STRATEGY_SYNC_INTERVAL 轮询，只在下一次全量核对时醒来
+    monkeypatch.setattr(main.strategy_listener, 'connected', True)
+    monkeypatch.setattr(main, '_last_full_sync', time.time())
+    assert main.strategy_sync_timeout() == pytest.approx(main.settings.STRATEGY_RECONCILE_INTERVAL, abs=1)
+    # 同步失败（_last_full_sync 归零）后不会空转
+    monkeypatch.setattr(main, '_last_full_sync', 0.0)
+    assert main.strategy_sync_timeout() == main.settings.STRATEGY_SYNC_INTERVAL
+
+
+class _BrokenConnection:
+    """LISTEN 执行中断开的数据库连接"""
+
+    class driver_connection:
+        autocommit = False
+
+        @staticmethod
+        def cursor():
+            raise ConnectionError('server closed the connection')
+
+    def close(self):
+        pass
+
+
+def test_listener_disconnect_wakes_main_loop():
+    listener = StrategyChangeListener(type('Engine', (), {'raw_connection': lambda self: _BrokenConnection()})())
+    listener.connected = True
+    with pytest.raises(ConnectionError):
+        listener._listen()
+    assert not listener.connected and listener.event.is_set()
+
+
+def test_shard_membership_change_wakes_main_loop(monkeypatch):
+    woken = []
+    coordinator = ShardCoordinator(None, node_id='a', on_change=lambda: woken.append(True))
+    monkeypatch.setattr(coordinator, '_heartbeat', lambda: ['a', 'b'])
+    coordinator.refresh()
+    coordinator.refresh()
+    assert coordinator.generation == 1 and woken == [True]
@@ -0,0 +1,91 @@
+import asyncio
+import threading
+from tick_planner import TickPlanner
+
+FAST = ('binance', 'BTC/USDT', '1m')
+SLOW = ('binance', 'ETH/USDT', '1m')
+
+
+class SlowCandleStore:
+    """SLOW 市场的请求阻塞到 release 被置位（如交易所无响应或长时间限流等待）"""
+
+    def __init__(self):
+        self.release = threading.Event()
+        self.calls = {FAST: 0, SLOW: 0}
+
+    def get_window(self, symbol, timeframe, lookback, exchange_name):
+        market = (exchange_name, symbol, timeframe)
+        self.calls[market] += 1
+        if market == SLOW:
+            self.release.wait(5)
+        return f"window:{symbol}"
+
+
+class AsyncSlowCandleStore(SlowCandleStore):
+    async def get_window(self, symbol, timeframe, lookback, exchange_name):
+        market = (exchange_name, symbol, timeframe)
+        self.calls[market] += 1
+        if market == SLOW:
+            while not self.release.is_set():
+                await asyncio.sleep(0.01)
+        return f"window:{symbol}"
+
+
+def test_slow_market_is_skipped_without_stalling_the_round():
+    store = SlowCandleStore()
+    planner = TickPlanner(store, fetch_timeout=0.1)
+    plan = {FAST: 100, SLOW: 100}
+    assert planner.fetch(plan) == {FAST: 'window:BTC/USDT'}
+    # 超时的拉取仍在运行：下一轮不重复提交
+    assert planner.fetch(plan) == {FAST: 'window:BTC/USDT'}
+    assert store.calls[SLOW] == 1
+    # 拉取结束后恢复正常
+    store.release.set()
+    planner._inflight[SLOW].result()
+    assert planner.fetch(plan) == {FAST: 'window:BTC/USDT', SLOW: 'window:ETH/USDT'}
+    assert store.calls[SLOW] == 2
+    planner._executor.shutdown()
+
+
+def test_slow_market_is_skipped_in_async_mode():
+    async def run():
+        store = AsyncSlowCandleStore()
+        planner = TickPlanner(store, fetch_timeout=0.1)
+        plan = {FAST: 100, SLOW: 100}
+        first = await planner.fetch_async(plan)
+        second = await planner.fetch_async(plan)
+        store.release.set()
+        await planner._inflight[SLOW]
+        third = await planner.fetch_async(plan)
+        planner._executor.shutdown()
+        return first, second, third, store.calls[SLOW]
+
+    first, second, third, slow_calls = asyncio.run(run())
+    assert first == second == {FAST: 'window:BTC/USDT'}
+    assert third == {FAST: 'window:BTC/USDT', SLOW: 'window:ETH/USDT'}
+    assert slow_calls == 2
+
+
+def test_short_history_window_stays_cached():
+    from cache_manager import CacheManager
+
+    class NewListing:
+        """只有 30 根 K 线历史的新上市交易对"""
+        calls = 0
+
+        def get_window(self, symbol, timeframe, lookback, exchange_name):
+            NewListing.calls += 1
+            return [[i, 1, 1, 1, 1, 1] for i in range(30)]
+
+    now = [1000.0]
+    planner = TickPlanner(NewListing(), CacheManager(clock=lambda: now[0]))
+    for _ in range(3):
+        assert len(planner.fetch({FAST: 100})[FAST]) == 30
+    assert NewListing.calls == 1
+    # 回看变长时重新拉取；缓存过期后（下一根 K 线）再拉取
+    planner.fetch({FAST: 200})
+    assert NewListing.calls == 2
+    now[0] += 60
+    planner.fetch({FAST: 200})
+    assert NewListing.calls == 3
+    planner._executor.shutdown()
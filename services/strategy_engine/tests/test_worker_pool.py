@@ -0,0 +1,108 @@
+import asyncio
+import threading
+import time
+import pytest
+from worker_pool import StrategyWorkerPool
+
+
+class SlowStrategy:
+    """on_tick 阻塞到 release 被置位（或睡眠 delay 秒），模拟卡在交易所请求上的策略"""
+
+    def __init__(self, delay: float = None):
+        self.delay = delay
+        self.release = threading.Event()
+        self.ticks = 0
+
+    def on_tick(self):
+        self.ticks += 1
+        if self.delay is not None:
+            time.sleep(self.delay)
+        else:
+            self.release.wait(5)
+
+
+@pytest.fixture
+def pool():
+    pool = StrategyWorkerPool(max_workers=2, soft_timeout=0.05, hard_timeout=0.2)
+    yield pool
+    pool.shutdown()
+
+
+def test_soft_overrun_is_counted_but_awaited(pool):
+    slow = SlowStrategy(delay=0.1)
+    assert pool.run({'slow': slow.on_tick, 'fast': lambda: None}) == 2
+    stats = pool.get_overrun_stats()
+    assert stats['slow'] == {'soft_overruns': 1, 'hard_overruns': 0, 'skipped': 0}
+    assert 'fast' not in stats
+
+
+def test_hard_deadline_skips_strategy_until_it_returns(pool):
+    slow = SlowStrategy()
+    started = time.monotonic()
+    assert pool.run({'slow': slow.on_tick, 'fast': lambda: None}) == 1
+    # 主循环只等到硬截止
+    assert time.monotonic() - started < 1.0
+    assert pool.get_overrun_stats()['slow']['hard_overruns'] == 1
+
+    # 仍在运行：后续轮次跳过，不再排队
+    assert pool.run({'slow': slow.on_tick}) == 0
+    assert pool.run({'slow': slow.on_tick}) == 0
+    assert pool.get_overrun_stats()['slow']['skipped'] == 2
+    assert slow.ticks == 1
+
+    # 结束后恢复正常调度
+    slow.release.set()
+    time.sleep(0.05)
+    assert pool.run({'slow': slow.on_tick}) == 1
+    assert slow.ticks == 2
+
+
+def test_queued_tasks_are_cancelled_at_hard_deadline():
+    pool = StrategyWorkerPool(max_workers=1, soft_timeout=0.05, hard_timeout=0.1)
+    blocker, queued = SlowStrategy(), SlowStrategy()
+    try:
+        pool.run({'blocker': blocker.on_tick, 'queued': queued.on_tick})
+        # 唯一的线程被占用，排队的任务被取消而不是留到以后执行
+        blocker.release.set()
+        time.sleep(0.05)
+        assert queued.ticks == 0
+        assert pool.get_overrun_stats()['queued']['hard_overruns'] == 1
+        # 被取消的任务不算仍在运行，下一轮照常执行
+        queued.release.set()
+        assert pool.run({'queued': queued.on_tick}) == 1
+        assert queued.ticks == 1
+    finally:
+        pool.shutdown()
+
+
+def test_errors_do_not_stop_other_strategies(pool):
+    def broken():
+        raise RuntimeError('boom')
+    assert pool.run({'broken': broken, 'ok': lambda: None}) == 2
+
+
+def test_async_hard_deadline_keeps_task_running(pool):
+    async def scenario():
+        release = asyncio.Event()
+        ticks = []
+
+        async def slow():
+            ticks.append(1)
+            await release.wait()
+
+        async def fast():
+            pass
+
+        assert await pool.run_async({'slow': slow, 'fast': fast}) == 1
+        stats = pool.get_overrun_stats()['slow']
+        assert stats['soft_overruns'] == 1 and stats['hard_overruns'] == 1
+
+        assert await pool.run_async({'slow': slow}) == 0
+        assert pool.get_overrun_stats()['slow']['skipped'] == 1
+
+        release.set()
+        await asyncio.sleep(0)
+        assert await pool.run_async({'slow': slow}) == 1
+        assert len(ticks) == 2
+
+    asyncio.run(scenario())
@@ -0,0 +1,155 @@
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor, wait
+from metrics import SampledLogger, market_data_skipped
+
+logger = logging.getLogger(__name__)
+sampled_logger = SampledLogger(logger)
+
+
+class TickPlanner:
+    """
+    每轮主循环的行情拉取计划：
+    汇总所有运行中策略声明的数据需求，每个 (exchange, symbol, timeframe) 只按最大回看长度拉取一次，
+    再把同一个只读窗口交给所有策略，各策略自行切出需要的长度。
+    设置 fetch_timeout 时整轮拉取共用一个截止时间：超时的市场本轮跳过（拉取在后台继续，结果写入 K 线存储供下一轮使用），
+    它的拉取结束前后续轮次不再重复提交，慢交易所或长时间的限流等待不会拖住主循环。
+    """
+
+    def __init__(self, candle_store, cache_manager=None, indicator_engine=None, max_workers: int = 10,
+                 fetch_timeout: float = None):
+        self.candle_store = candle_store
+        self.cache_manager = cache_manager
+        self.indicator_engine = indicator_engine
+        self.max_workers = max_workers
+        self.fetch_timeout = fetch_timeout
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='market-data')
+        self._inflight = {}  # {market: Future / Task}，超过截止仍未结束的拉取
+        self._fetched_lookback = {}  # {market: 最近一次拉取时的回看长度}，判断缓存中的短窗口是否只是历史不足
+
+    def plan(self, strategies):
+        """返回 {(exchange, symbol, timeframe): 最大回看长度}"""
+        plan = {}
+        for strategy in strategies:
+            try:
+                requirements = strategy.get_data_requirements()
+            except Exception as e:
+                logger.error(f"Failed to get data requirements of strategy {strategy.name}: {e}")
+                continue
+            for req in requirements:
+                plan[req.market] = max(plan.get(req.market, 0), req.lookback)
+        return plan
+
+    def _fetch_market(self, market, lookback):
+        exchange_name, symbol, timeframe = market
+
+        def fetch():
+            window = self.candle_store.get_window(symbol, timeframe, lookback, exchange_name)
+            self._fetched_lookback[market] = lookback
+            return window
+
+        if self.cache_manager is None:
+            return fetch()
+        window = self.cache_manager.get_or_fetch('market_data', exchange_name, symbol, fetch, timeframe)
+        if window is not None and len(window) < lookback and self._fetched_lookback.get(market, 0) < lookback:
+            # 缓存中的窗口是按更短的回看拉取的（例如刚加入了回看更长的策略），重新拉取；
+            # 按本轮回看拉取后仍然较短的（新上市、历史不足）照常使用缓存，过期后（新 K 线到来时）再拉取
+            window = fetch()
+            if window is not None:
+                self.cache_manager.set_cache('market_data', exchange_name, symbol, window, timeframe)
+        return window
+
+    def _skip(self, market, reason: str):
+        market_data_skipped(reason).inc()
+        if reason == 'timeout':
+            logger.warning(f"⏱ Fetching {':'.join(market)} exceeded the round deadline ({self.fetch_timeout}s), skipping it this round")
+        else:
+            logger.warning(f"⏱ Fetch of {':'.join(market)} from an earlier round is still running, skipping it this round")
+
+    def _still_running(self, market) -> bool:
+        """上一轮超时的拉取是否仍未结束；已结束的清除记录（出错时补记日志）"""
+        previous = self._inflight.get(market)
+        if previous is None:
+            return False
+        if not previous.done():
+            self._skip(market, 'inflight')
+            return True
+        del self._inflight[market]
+        if not previous.cancelled() and previous.exception() is not None:
+            logger.error(f"Error fetching market data for {':'.join(market)}: {previous.exception()}")
+        return False
+
+    def fetch(self, plan):
+        """按计划并发拉取，返回 {(exchange, symbol, timeframe): 只读 Candles}，不含超过截止的市场"""
+        market_data = {}
+        if not plan:
+            return market_data
+        futures = {
+            market: self._executor.submit(self._fetch_market, market, lookback)
+            for market, lookback in plan.items()
+            if not self._still_running(market)
+        }
+        wait(futures.values(), timeout=self.fetch_timeout)
+        for market, future in futures.items():
+            if not future.done():
+                self._inflight[market] = future
+                self._skip(market, 'timeout')
+                continue
+            try:
+                window = future.result()
+            except Exception as e:
+                logger.error(f"Error fetching market data for {':'.join(market)}: {e}")
+                continue
+            if window is not None:
+                market_data[market] = window
+        return market_data
+
+    def plan_indicators(self, strategies):
+        """
+        汇总 strategies 需要的指标，指标缓存据此丢弃已无策略使用的条目。
+        应传入所有运行中的策略而不只是本轮到期的：高周期策略不在本轮执行时，它的累加器也要保留到下次收盘增量延伸。
+        """
+        requirements = []
+        for strategy in strategies:
+            try:
+                requirements.extend(strategy.get_indicator_requirements())
+            except Exception as e:
+                logger.error(f"Failed to get indicator requirements of strategy {strategy.name}: {e}")
+        self.indicator_engine.set_requirements(requirements)
+
+    async def fetch_async(self, plan):
+        """fetch() 的 asyncio 版本，candle_store 需为 AsyncCandleStore"""
+        tasks = {
+            (exchange_name, symbol, timeframe): asyncio.ensure_future(
+                self.candle_store.get_window(symbol, timeframe, lookback, exchange_name))
+            for (exchange_name, symbol, timeframe), lookback in plan.items()
+            if not self._still_running((exchange_name, symbol, timeframe))
+        }
+        market_data = {}
+        if not tasks:
+            return market_data
+        await asyncio.wait(tasks.values(), timeout=self.fetch_timeout)
+        for market, task in tasks.items():
+            if not task.done():
+                self._inflight[market] = task
+                self._skip(market, 'timeout')
+                continue
+            if task.exception() is not None:
+                logger.error(f"Error fetching market data for {':'.join(market)}: {task.exception()}")
+            elif task.result() is not None:
+                market_data[market] = task.result()
+        return market_data
+
+    def prepare(self, strategies):
+        """规划并拉取本轮所需的全部行情数据（指标需求由调用方按所有运行中策略另行登记，见 plan_indicators）"""
+        plan = self.plan(strategies)
+        market_data = self.fetch(plan)
+        sampled_logger.debug('tick_plan', "📈 Tick plan: %d markets for %d strategies, fetched %d", len(plan), len(strategies), len(market_data))
+        return market_data
+
+    async def prepare_async(self, strategies):
+        """prepare() 的 asyncio 版本"""
+        plan = self.plan(strategies)
+        market_data = await self.fetch_async(plan)
+        sampled_logger.debug('tick_plan', "📈 Tick plan: %d markets for %d strategies, fetched %d", len(plan), len(strategies), len(market_data))
+        return market_data
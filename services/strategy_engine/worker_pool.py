@@ -0,0 +1,133 @@
+import asyncio
+import time
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+from metrics import worker_queue_seconds
+
+logger = logging.getLogger(__name__)
+
+
+class StrategyWorkerPool:
+    """
+    常驻的策略执行线程池，每轮对每个策略设置软/硬两个截止时间：
+    - 超过软截止：记录警告，继续等待
+    - 超过硬截止：主循环不再等待，尚未开始的任务直接取消；仍在运行的策略在结束前的后续轮次都会被跳过，而不是再次排队
+    单个策略卡在交易所请求上不会拖慢或中断其他策略和主循环。
+    """
+
+    def __init__(self, max_workers: int = 10, soft_timeout: float = 20.0, hard_timeout: float = 50.0):
+        self.max_workers = max_workers
+        self.soft_timeout = soft_timeout
+        self.hard_timeout = hard_timeout
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='strategy')
+        self._inflight = {}  # {strategy_id: Future}，超过硬截止仍未结束的任务
+        self._lock = threading.Lock()
+        # {strategy_id: {'soft_overruns': n, 'hard_overruns': n, 'skipped': n}}
+        self.overruns = {}
+
+    def _count(self, strategy_id, field: str):
+        with self._lock:
+            counters = self.overruns.setdefault(strategy_id, {'soft_overruns': 0, 'hard_overruns': 0, 'skipped': 0})
+            counters[field] += 1
+
+    def _should_skip(self, strategy_id) -> bool:
+        """上一轮的执行还没结束时跳过本轮，不再排队"""
+        previous = self._inflight.get(strategy_id)
+        if previous is None:
+            return False
+        if not previous.done():
+            self._count(strategy_id, 'skipped')
+            logger.warning(f"Strategy {strategy_id} is still running from a previous cycle, skipping this tick")
+            return True
+        del self._inflight[strategy_id]
+        return False
+
+    def _collect(self, futures: dict, done, pending, cancel_queued: bool):
+        """处理硬截止后仍未完成的任务并收集结果"""
+        for future in pending:
+            strategy_id = futures[future]
+            self._count(strategy_id, 'hard_overruns')
+            if cancel_queued and future.cancel():
+                # 还在排队，直接取消
+                logger.error(f"⏱ Strategy {strategy_id} exceeded hard deadline ({self.hard_timeout}s) before starting, cancelled")
+            else:
+                self._inflight[strategy_id] = future
+                logger.error(f"⏱ Strategy {strategy_id} exceeded hard deadline ({self.hard_timeout}s), will be skipped until it returns")
+
+        for future in done:
+            try:
+                future.result()
+            except Exception as e:
+                logger.error(f"Error in strategy {futures[future]} tick: {e}")
+        return len(done)
+
+    @staticmethod
+    def _run_queued(task, submitted: float):
+        """记录任务从提交到开始执行的排队时间（线程全忙时排在线程池队列中）后执行"""
+        worker_queue_seconds('thread').observe(time.perf_counter() - submitted)
+        return task()
+
+    @staticmethod
+    async def _run_queued_async(task, submitted: float):
+        worker_queue_seconds('async').observe(time.perf_counter() - submitted)
+        return await task()
+
+    def _report_soft_overruns(self, futures: dict, pending):
+        for future in pending:
+            self._count(futures[future], 'soft_overruns')
+        logger.warning(f"⏱ {len(pending)} strategies exceeded soft deadline ({self.soft_timeout}s): {sorted(futures[f] for f in pending)}")
+
+    def run(self, tasks: dict):
+        """
+        并发执行 {strategy_id: callable}，最多阻塞 hard_timeout 秒。
+        返回本轮实际完成的策略数。
+        """
+        submitted = time.perf_counter()
+        futures = {
+            self._executor.submit(self._run_queued, task, submitted): strategy_id
+            for strategy_id, task in tasks.items()
+            if not self._should_skip(strategy_id)
+        }
+        if not futures:
+            return 0
+
+        started = time.monotonic()
+        done, pending = wait(futures, timeout=self.soft_timeout)
+        if pending:
+            self._report_soft_overruns(futures, pending)
+            remaining = max(0.0, self.hard_timeout - (time.monotonic() - started))
+            more_done, pending = wait(pending, timeout=remaining)
+            done |= more_done
+        return self._collect(futures, done, pending, cancel_queued=True)
+
+    async def run_async(self, tasks: dict):
+        """
+        run() 的 asyncio 版本：{strategy_id: 返回协程的 callable}，在事件循环中并发执行。
+        超过硬截止的任务不取消，继续在后台运行，结束前跳过后续轮次。
+        """
+        submitted = time.perf_counter()
+        futures = {
+            asyncio.ensure_future(self._run_queued_async(task, submitted)): strategy_id
+            for strategy_id, task in tasks.items()
+            if not self._should_skip(strategy_id)
+        }
+        if not futures:
+            return 0
+
+        started = time.monotonic()
+        done, pending = await asyncio.wait(futures, timeout=self.soft_timeout)
+        if pending:
+            self._report_soft_overruns(futures, pending)
+            remaining = max(0.0, self.hard_timeout - (time.monotonic() - started))
+            more_done, pending = await asyncio.wait(pending, timeout=remaining)
+            done |= more_done
+        return self._collect(futures, done, pending, cancel_queued=False)
+
+    def get_overrun_stats(self):
+        """获取各策略的超时/跳过计数"""
+        with self._lock:
+            return {strategy_id: dict(counters) for strategy_id, counters in self.overruns.items()}
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)